@@ -2,6 +2,10 @@
 D_BJ_MANUSCRIPT = True
 DO_KYMOGRAPH_ANALYSIS = False
 
+import importlib
+import sys
+import types
+
 from .sanpyLogger import *
 
 from ._util import *
@@ -9,25 +13,76 @@ from .analysisUtil import *
 
 from .bAnalysis_ import bAnalysis
 # from .bAnalysis_ import MetaData  # Aug 2023
-from .analysisDir import *
-from .analysisPlot import *
 from .bAnalysisUtil import *
-from .atfStim import *
 from .bAnalysisResults import *
 
-from .bAbfText import bAbfText
-from .bExport import bExport
-
 from .version import analysisVersion
 from .version import interfaceVersion
 #from .version import __version__
 from ._version import __version__
 
 from .bDetection import bDetection
+from .streamDetection import spikeStream
 
-from .kymAnalysis import kymAnalysis
 from ._util import _loadLineScanHeader
 
 from .fileloaders import *
 
 from .metaData import MetaData
+
+# Submodules with heavy dependencies (requests, matplotlib/seaborn, scikit-image, tifffile)
+# are imported on first use, e.g. sanpy.analysisDir(path) imports sanpy.analysisDir.
+# Headless scripts that only use bAnalysis and bDetection never import them.
+_lazySubmodules = {
+    "analysisDir": ["analysisDir", "bAnalysisDirWeb", "getFileList", "stripSantanaTif"],
+    "analysisPlot": ["bAnalysisPlot"],
+    "atfStim": [
+        "getAtfHeader",
+        "padData",
+        "saveAtf",
+        "plotData",
+        "makeStim",
+        "getKernel",
+        "getSpikeTrain",
+        "integrateAndFire",
+    ],
+    "bAbfText": ["bAbfText"],
+    "bExport": ["bExport", "summarizeSpikes"],
+    "kymAnalysis": ["kymAnalysis"],
+}
+
+_lazyAttributes = {
+    _name: _module for _module, _names in _lazySubmodules.items() for _name in _names
+}
+
+
+def __getattr__(name):
+    """Import a lazy attribute (or submodule) on first use."""
+    if name in _lazyAttributes:
+        _module = importlib.import_module("." + _lazyAttributes[name], __name__)
+        value = getattr(_module, name)
+    elif name in _lazySubmodules:
+        value = importlib.import_module("." + name, __name__)
+    else:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+    globals()[name] = value
+    return value
+
+
+def __dir__():
+    return sorted(set(globals()) | set(_lazyAttributes) | set(_lazySubmodules))
+
+
+class _lazyModule(types.ModuleType):
+    def __setattr__(self, name, value):
+        # importing a submodule binds it to the package, keep the class (e.g. analysisDir)
+        if (
+            name in _lazyAttributes
+            and isinstance(value, types.ModuleType)
+            and value.__name__ == f"{__name__}.{name}"
+        ):
+            value = getattr(value, name)
+        super().__setattr__(name, value)
+
+
+sys.modules[__name__].__class__ = _lazyModule
@@ -3,7 +3,9 @@ import sys
 import importlib
 import pathlib
 import shutil
-from typing import List, Union
+import glob
+import threading
+from typing import Callable, List, Tuple, Union
 import uuid
 
 import numpy as np
@@ -45,6 +47,57 @@ def _module_from_file(module_name: str, file_path: str):
     return module
 
 
+def _getFolderSignature(folder: str, pattern: str = "*.py") -> Tuple[tuple, ...]:
+    """Get (file, size, mtime) of each file in a folder.
+
+    Changes when a file is added, removed or edited.
+    """
+    signature = []
+    for file in sorted(glob.glob(os.path.join(folder, pattern))):
+        try:
+            fileStat = os.stat(file)
+        except OSError:
+            # removed while we look
+            continue
+        signature.append((file, fileStat.st_size, fileStat.st_mtime))
+    return tuple(signature)
+
+
+class _folderCache:
+    """Process wide cache of a value built from the source files in a folder.
+
+    The value is built on first use and built again only when files in the folder change,
+    see _getFolderSignature(). Used for file loaders and user analysis, both exec user code.
+    """
+
+    def __init__(self, buildFn: Callable, getFolderFn: Callable[[], str]):
+        """
+        Args:
+            buildFn: Called with no arguments to build the value
+            getFolderFn: Called with no arguments to get the folder to watch
+        """
+        self._buildFn = buildFn
+        self._getFolderFn = getFolderFn
+        self._lock = threading.Lock()
+        self._signature = None
+        self._value = None
+
+    def get(self):
+        """Get the value, build it if the folder changed since it was built."""
+        signature = _getFolderSignature(self._getFolderFn())
+        with self._lock:
+            if self._value is None or signature != self._signature:
+                self._value = self._buildFn()
+                self._signature = signature
+            return self._value
+
+    def invalidate(self):
+        """Build the value again on next get()."""
+        with self._lock:
+            self._value = None
+            self._signature = None
+
+
 def addUserPath():
     """Make <user>/Documents/SanPy folder and add it to the Python sys.path
 
@@ -5,10 +5,12 @@
 import os
 import time
 import copy  # For copy.deepcopy() of bAnalysis
+import concurrent.futures
+import threading
 # import uuid  # to generate unique key on bAnalysis spike detect
 import pathlib  # ned to use this (introduced in Python 3.4) to maname paths on Windows, stop using os.path
 
-from typing import List, Optional
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
 
 import numpy as np
 
@@ -27,6 +29,7 @@ import io  # too load from the web
 
 import sanpy
 import sanpy.h5Util
+import sanpy.folderIndex
 
 from sanpy.sanpyLogger import get_logger
 logger = get_logger(__name__)
@@ -461,6 +464,13 @@ class analysisDir:
     sanpyColumns = _sanpyColumns
     # Dict of dict of column names and bookkeeping info.
 
+    _headerColumns = ["Dur(s)", "Channels", "Sweeps", "Epochs", "kHz", "Mode", "Acq Date", "Acq Time"]
+    # Columns from the file header, updated when a file changes.
+
+    compactFragmentation = 0.3
+    # Compact the h5 file in the background after a save once this fraction of it is unused,
+    # None to only compact with compactHdf().
+
     # 20231230, get this from sanpyapp fileloader keys
     # theseFileTypes = [".abf", ".atf", ".sanpy", ".tif"]  # .dat .czi
     # File types to load.
@@ -472,6 +482,9 @@ class analysisDir:
         fileLoaderDict : dict = None,
         autoLoad: bool = False,
         folderDepth: Optional[int] = None,
+        numWorkers: int = 1,
+        progressCallback: Callable = None,
+        useFolderIndex: bool = False,
     ):
         """Load and manage a list of files in a folder path.
 
@@ -491,6 +504,15 @@ class analysisDir:
             If True then 
         folderDepth (int):
             Folder depth to recurse if loading folder path.
+        numWorkers (int):
+            Number of files to read concurrently when loading a folder, None for the default pool size.
+        progressCallback (Callable):
+            Called with (numLoaded, numFiles, path, rowDict) as each file of the folder is loaded,
+            in file order. rowDict is None if the file did not load. Works without a SanPy window.
+        useFolderIndex (bool):
+            If True, cache file rows in 'sanpy_analysis/' of the folder (see sanpy.folderIndex),
+            only files that are new or changed are read again. Off by default so opening
+            a (shared) folder does not write to it.
 
         Notes
         -----
@@ -521,9 +543,20 @@ class analysisDir:
 
         self.folderDepth = folderDepth
 
+        self._numWorkers = numWorkers
+        self._progressCallback = progressCallback
+
+        self._folderIndex = None
+        if useFolderIndex:
+            self._folderIndex = sanpy.folderIndex.folderIndex(self.path)
+
         self._isDirty = False
         # keep track if analysis was changed and prompt on quit
 
+        self._hdfLock = threading.RLock()
+        self._compactThread = None
+        # h5 file is compacted in a background thread, see compactHdf()
+
         # self._poolDf = None
         """See pool_ functions"""
 
@@ -539,7 +572,9 @@ class analysisDir:
         self._df = self.loadHdf()
         if self._df is None:
             # did not load h5 file
-            self._df = self.loadFolder(loadData=autoLoad)
+            self._df = self.loadFolder(loadData=autoLoad,
+                                       numWorkers=self._numWorkers,
+                                       progressCallback=self._progressCallback)
             self._updateLoadedAnalyzed()
         elif self._fileLoaderDict is not None:
             logger.info(f'sync existing df with filePath: {self._filePath}')
@@ -744,54 +779,86 @@ class analysisDir:
         Important: Order matters
             (1) Save bAnalysis first, it updates uuid in file table.
             (2) Save file table with updated uuid
+
+        Only analysis that changed is written, the file is not rewritten.
+        When compactFragmentation of the file is unused it is compacted in the background.
         """
         start = time.time()
 
         df = self.getDataFrame()
 
-        # the compressed version from the last save
-        hdfFile = os.path.splitext(self.dbFile)[0] + ".h5"
-        hdfFilePath = pathlib.Path(self.path) / hdfFile
-
-        logger.info(f"Saving db (will be compressed) {hdfFilePath}")
+        hdfFilePath = self._getHdfFile()
 
-        # save each bAnalysis
-        for row in range(len(df)):
-            ba = df.at[row, "_ba"]
-            if ba is not None:
-                didSave = ba._saveHdf_pytables(hdfFilePath)
-                if didSave:
-                    # we are now saved into h5 file, remember uuid to load
-                    # print('xxx SETTING dir uuid')
-                    df.at[row, "uuid"] = ba.uuid
+        logger.info(f"Saving db {hdfFilePath}")
 
-        # rebuild (L, A, S) columns
-        self._updateLoadedAnalyzed()
+        with self._hdfLock:
+            # save each bAnalysis
+            for row in range(len(df)):
+                ba = df.at[row, "_ba"]
+                if ba is not None:
+                    didSave = ba._saveHdf_pytables(hdfFilePath)
+                    if didSave:
+                        # we are now saved into h5 file, remember uuid to load
+                        # print('xxx SETTING dir uuid')
+                        df.at[row, "uuid"] = ba.uuid
 
-        #
-        # save file database
-        logger.info(f"    saving file db with {len(df)} rows")
-        print(df)
+            # rebuild (L, A, S) columns
+            self._updateLoadedAnalyzed()
 
-        dbKey = os.path.splitext(self.dbFile)[0]
-        df = df.drop("_ba", axis=1)  # don't ever save _ba, use it for runtime
+            #
+            # save file database
+            logger.info(f"    saving file db with {len(df)} rows")
+            print(df)
 
-        # hdfStore[dbKey] = df  # save it
-        df.to_hdf(hdfFilePath, dbKey)
+            self._saveFileTable()
 
         #
         self._isDirty = False  # if true, prompt to save on quit
 
-        # rebuild the file to remove old changes and reduce size
-        # self._rebuildHdf()
-        sanpy.h5Util._repackHdf(hdfFilePath)
-
         # list the keys in the file
         # sanpy.h5Util.listKeys(hdfFilePath)
 
         stop = time.time()
         logger.info(f"Saving took {round(stop-start,2)} seconds")
 
+        if (
+            self.compactFragmentation is not None
+            and sanpy.h5Util.getFragmentation(hdfFilePath) > self.compactFragmentation
+        ):
+            self.compactHdf(background=True)
+
+    def _saveFileTable(self):
+        """Save the file table (not the analysis) into the h5 file.
+
+        Used by saveHdf() and by sanpy.batch, where analysis is saved one recording at a time.
+        """
+        hdfFilePath = self._getHdfFile()
+        dbKey = os.path.splitext(self.dbFile)[0]
+        df = self.getDataFrame().drop("_ba", axis=1)  # don't ever save _ba, use it for runtime
+        with self._hdfLock:
+            sanpy.h5Util.saveTable(hdfFilePath, dbKey, df)
+
+    def compactHdf(self, background: bool = False):
+        """Rewrite the h5 file without the space of replaced and deleted analysis.
+
+        Parameters
+        ----------
+        background : bool
+            If True, compact in a thread and return immediately.
+            Saves and loads wait until it is done.
+        """
+        hdfPath = self._getHdfFile()
+        if not os.path.isfile(hdfPath):
+            return
+        if not background:
+            with self._hdfLock:
+                sanpy.h5Util.compactHdf(hdfPath)
+            return
+        if self._compactThread is not None and self._compactThread.is_alive():
+            return
+        self._compactThread = threading.Thread(target=self.compactHdf, name="compactHdf")
+        self._compactThread.start()
+
     def loadHdf(self, path=None, verbose=False):
         """Load the database key from an h5 file.
 
@@ -814,7 +881,8 @@ class analysisDir:
         dbKey = os.path.splitext(self.dbFile)[0]
 
         try:
-            df = pd.read_hdf(hdfPath, dbKey)
+            with self._hdfLock:
+                df = pd.read_hdf(hdfPath, dbKey)
         except KeyError as e:
             # file is corrupt !!!
             logger.error(f'    Load h5 failed, did not find dbKey:"{dbKey}" {e}')
@@ -836,11 +904,15 @@ class analysisDir:
 
         return df
 
-    def loadOneAnalysis(self, path, uuid=None, allowAutoLoad=True, verbose=False):
+    def loadOneAnalysis(self, path, uuid=None, allowAutoLoad=True, verbose=False, loadData=True):
         """Load one bAnalysis either from original file path or uuid of h5 file.
 
         If from h5, we still need to reload sweeps !!!
         They are binary and fast, saving to h5 (in this case) is slow.
+
+        If not loadData, analysis from h5 only reads the header of the file,
+        raw data is loaded when a sweep is first used (for example when it is plotted).
+        Use this when only the detection, metadata and spikes are needed.
         """
         if verbose:
             logger.info(f'path:"{path}" uuid:"{uuid}" allowAutoLoad:"{allowAutoLoad}"')
@@ -861,10 +933,11 @@ class analysisDir:
                 logger.info(f"    Retreiving uuid from hdf file {uuid}")
 
             # load from abf
-            ba = sanpy.bAnalysis(path, fileLoaderDict=self._fileLoaderDict, verbose=verbose)
+            ba = sanpy.bAnalysis(path, loadData=loadData, fileLoaderDict=self._fileLoaderDict, verbose=verbose)
 
             # load analysis from h5 file, will fail if uuid is not in file
-            ba._loadHdf_pytables(hdfPath, uuid)
+            with self._hdfLock:
+                ba._loadHdf_pytables(hdfPath, uuid)
 
         if allowAutoLoad and ba is None:
             # load from path
@@ -879,6 +952,11 @@ class analysisDir:
         hdfPath = os.path.join(self.path, hdfFile)
         return hdfPath
 
+    def _getPoolFile(self):
+        """Get path to the h5 file with the pooled analysis, see pool_refresh()."""
+        poolFile = os.path.splitext(self.dbFile)[0] + "_pool.h5"
+        return os.path.join(self.path, poolFile)
+
     def _deleteFromHdf(self, uuid):
         """Delete uuid from h5 file.
 
@@ -893,26 +971,35 @@ class analysisDir:
 
         # tmpHdfPath = self._getTmpHdfFile()
 
-        removed = False
-        with pd.HDFStore(hdfPath) as hdfStore:
-            try:
-                hdfStore.remove(uuid)
-                removed = True
-            except KeyError:
-                logger.error(f"Did not find uuid {uuid} in h5 file {hdfPath}")
+        with self._hdfLock:
+            removed = sanpy.h5Util.removeRecording(str(hdfPath), uuid)
+        if not removed:
+            logger.error(f"Did not find uuid {uuid} in h5 file {hdfPath}")
 
         #
         if removed:
-            # will rebuild on next save
+            # space is counted as unused, compacted after a later save (see compactHdf)
             # self._rebuildHdf()
             self._updateLoadedAnalyzed()
             self._isDirty = True  # if true, prompt to save on quit
 
-    def loadFolder(self, path=None, loadData=False) -> pd.DataFrame:
+    def loadFolder(self,
+                   path=None,
+                   loadData=False,
+                   numWorkers: int = 1,
+                   progressCallback: Callable = None,
+                   ) -> pd.DataFrame:
         """Parse a folder and load all (abf, csv, ...).
         
         Only called if no h5 file.
 
+        Parameters
+        ----------
+        numWorkers : int
+            Number of files to read concurrently, see iterFileRows()
+        progressCallback : Callable
+            Called with (numLoaded, numFiles, path, rowDict) as each file is loaded, in file order
+
         TODO: get rid of loading database from .csv (it is replaced by .h5 file)
         TODO: extend the logic to load from cloud (after we were instantiated)
         """
@@ -932,16 +1019,14 @@ class analysisDir:
         start = time.time()
         # build new db dataframe
         listOfDict = []
-        for rowIdx, fullFilePath in enumerate(fileList):
+        fileRows = self.iterFileRows(fileList, loadData=loadData, numWorkers=numWorkers)
+        for rowIdx, (fullFilePath, ba, rowDict) in enumerate(fileRows):
             
             self.signalWindow(
-                f'Loading file {rowIdx+1} of {_numFilesToLoad} "{fullFilePath}"'
+                f'Loaded file {rowIdx+1} of {_numFilesToLoad} "{fullFilePath}"'
             )
-
-            # rowDict is what we are showing in the file table
-            # abb debug vue, set loadData=True
-            # loads bAnalysis
-            ba, rowDict = self.getFileRow(fullFilePath, loadData=loadData)
+            if progressCallback is not None:
+                progressCallback(rowIdx + 1, _numFilesToLoad, fullFilePath, rowDict)
 
             if rowDict is None:
                 logger.warning(f'error loading file {fullFilePath}')
@@ -1147,12 +1232,14 @@ class analysisDir:
         uuid = self._df.at[rowIdx, "uuid"]
         return len(uuid) > 0
 
-    def getAnalysis(self, rowIdx, allowAutoLoad=True, verbose=False) -> sanpy.bAnalysis:
+    def getAnalysis(self, rowIdx, allowAutoLoad=True, verbose=False, loadData=True) -> sanpy.bAnalysis:
         """Get bAnalysis object, will load if necc.
 
         Args:
             rowIdx (int): Row index from table, corresponds to row in self._df
             allowAutoLoad (bool)
+            loadData (bool): If False, saved analysis does not load raw data until it is used,
+                see loadOneAnalysis()
         Return:
             bAnalysis
         """
@@ -1171,7 +1258,7 @@ class analysisDir:
             filePath = self.getPathFromRelPath(relPath)
 
             ba = self.loadOneAnalysis(
-                filePath, uuid, allowAutoLoad=allowAutoLoad, verbose=verbose
+                filePath, uuid, allowAutoLoad=allowAutoLoad, verbose=verbose, loadData=loadData
             )
             # load
             """
@@ -1248,19 +1335,51 @@ class analysisDir:
         #
         return df
 
+    def _getDefaultRow(self) -> dict:
+        """Get a row of the file table with default values."""
+        # not sufficient to default everything to empty str ''
+        # sanpyColumns can only have type in ('float', 'str')
+        rowDict = dict.fromkeys(self.sanpyColumns.keys(), "")
+        for k in rowDict.keys():
+            if self.sanpyColumns[k]["type"] == str:
+                rowDict[k] = ""
+            elif self.sanpyColumns[k]["type"] == float:
+                rowDict[k] = np.nan
+        return rowDict
+
+    def _getRelPath(self, path: str) -> str:
+        """Get path of a file relative to the folder we have loaded."""
+        # remove the path to the folder we have loaded
+        relPath = path.replace(self.path, "")
+        
+        # logger.info(f'xxx self.path: "{self.path}"')
+        # logger.info(f'xxx path: "{path}"')
+        # logger.info(f'xxx relPath: "{relPath}"')
+        
+        if relPath.startswith("/"):
+            # so we can use os.path.join()
+            relPath = relPath[1:]
+        # added 20230505 working with johnson in 1313 to fix windows bug ???
+        if relPath.startswith("\\"):
+            # so we can use os.path.join()
+            relPath = relPath[1:]
+        return relPath
+
     def getFileRow(self, path, loadData=False):
-        """Get dict representing one file (row in table). Loads bAnalysis to get headers.
+        """Get dict representing one file (row in table).
 
-        On load error of proper file type (abf, csv), ba.loadError==True
+        If loadData, loads bAnalysis to get headers.
+        Otherwise only reads the header with the file loader (see fileLoader_base.readHeader),
+        raw data is not loaded.
 
         Args:
             path (Str): Full path to file.
-            #rowIdx (int): Optional row index to assign in column 'Idx'
+            loadData (bool): If True, load bAnalysis.
 
         Return:
             (tuple): tuple containing:
 
-            - ba (bAnalysis): [sanpy.bAnalysis](/api/bAnalysis).
+            - ba (bAnalysis): [sanpy.bAnalysis](/api/bAnalysis), None if not loadData.
             - rowDict (dict): On success, otherwise None.
                     fails when path does not lead to valid bAnalysis file.
         """
@@ -1281,55 +1400,36 @@ class analysisDir:
         # else:
         #     _fileLoaderDict = None
 
-        # load bAnalysis
-        # logger.info(f'Loading bAnalysis "{path}"')
-        # loadData is false, load header
-        ba = sanpy.bAnalysis(path,
-                             loadData=loadData,
-                             fileLoaderDict=self._fileLoaderDict)
-
-        if ba.loadError:
-            logger.error(f'Error loading bAnalysis file "{path}"')
-            # return None, None
-
-        # not sufficient to default everything to empty str ''
-        # sanpyColumns can only have type in ('float', 'str')
-        rowDict = dict.fromkeys(self.sanpyColumns.keys(), "")
-        for k in rowDict.keys():
-            if self.sanpyColumns[k]["type"] == str:
-                rowDict[k] = ""
-            elif self.sanpyColumns[k]["type"] == float:
-                rowDict[k] = np.nan
-
-        # if rowIdx is not None:
-        #    rowDict['Idx'] = rowIdx
-
-        """
-        if ba.loadError:
-            rowDict['I'] = 0
+        ba = None
+        if loadData:
+            # load bAnalysis
+            # logger.info(f'Loading bAnalysis "{path}"')
+            ba = sanpy.bAnalysis(path,
+                                loadData=loadData,
+                                fileLoaderDict=self._fileLoaderDict)
+
+            if ba.loadError:
+                logger.error(f'Error loading bAnalysis file "{path}"')
+                return None, None
+            header = ba.fileLoader.getHeader()
         else:
-            rowDict['I'] = 2 # need 2 because checkbox value is in (0,2)
-        """
-
-        if ba.loadError:
-            return None, None
-        
-        rowDict["File"] = ba.fileLoader.filename  # os.path.split(ba.path)[1]
-        rowDict["Dur(s)"] = ba.fileLoader.recordingDur
-
-        rowDict["Channels"] = ba.fileLoader.numChannels  # Theanne
+            # header only, does not read raw data
+            fileLoaderClass = self._fileLoaderDict[fileType]["constructor"]
+            header = fileLoaderClass.readHeader(path)
+            if header is None:
+                logger.error(f'Error loading header of file "{path}"')
+                return None, None
 
-        rowDict["Sweeps"] = ba.fileLoader.numSweeps
+        rowDict = self._getDefaultRow()
 
-        # TODO: here, we do not get an epoch table until the file is loaded !!!
-        rowDict["Epochs"] = ba.fileLoader.numEpochs  # Theanne, data has to be loaded
-
-        rowDict["kHz"] = ba.fileLoader.recordingFrequency
-        rowDict["Mode"] = ba.fileLoader.recordingMode.value
+        # File, Dur(s), Channels, Sweeps, Epochs, kHz, Mode
+        # aug 2023,  adding bAnalysis metadata columns
+        for k,v in header.items():
+            rowDict[k] = v
 
         # rowDict['dvdtThreshold'] = 20
         # rowDict['mvThreshold'] = -20
-        if ba.isAnalyzed():
+        if ba is not None and ba.isAnalyzed():
             dDict = ba.getDetectionDict()
             # rowDict['I'] = dDict.getValue('include')
             rowDict["dvdtThreshold"] = dDict.getValue("dvdtThreshold")
@@ -1345,27 +1445,8 @@ class analysisDir:
         rowDict['parent1'] = _parent1
         rowDict['parent2'] = _parent2
         rowDict['parent3'] = _parent3
-        
-        # aug 2023,  adding bAnalysis metadata columns
-        for k,v in ba.metaData.items():
-            rowDict[k] = v
 
-        # remove the path to the folder we have loaded
-        relPath = path.replace(self.path, "")
-        
-        # logger.info(f'xxx self.path: "{self.path}"')
-        # logger.info(f'xxx path: "{path}"')
-        # logger.info(f'xxx relPath: "{relPath}"')
-        
-        if relPath.startswith("/"):
-            # so we can use os.path.join()
-            relPath = relPath[1:]
-        # added 20230505 working with johnson in 1313 to fix windows bug ???
-        if relPath.startswith("\\"):
-            # so we can use os.path.join()
-            relPath = relPath[1:]
-
-        rowDict["relPath"] = relPath
+        rowDict["relPath"] = self._getRelPath(path)
 
         #logger.info(f'2) xxx relPath: "{relPath}"')
         # logger.info('qqq')
@@ -1373,6 +1454,71 @@ class analysisDir:
 
         return ba, rowDict
 
+    def iterFileRows(self,
+                     fileList: List[str],
+                     loadData: bool = False,
+                     numWorkers: int = 1,
+                     ) -> Iterator[Tuple[str, "sanpy.bAnalysis", Optional[dict]]]:
+        """Read files with getFileRow() and yield (path, ba, rowDict) in the order of fileList.
+
+        Files are read on a pool of numWorkers threads (headers are mostly waiting on disk or network),
+        each row is yielded as soon as it and all rows before it are read.
+        If not loadData, rows of files that did not change are from the folder index
+        (see sanpy.folderIndex) and new rows are saved in it.
+
+        Parameters
+        ----------
+        fileList : list of str
+            Full paths to files
+        loadData : bool
+            Passed to getFileRow()
+        numWorkers : int
+            Number of files to read concurrently, 1 to read one after another,
+            None for the default of concurrent.futures.ThreadPoolExecutor
+        """
+        # rows of files that did not change since they were indexed
+        fileStats = {}
+        cachedRows = {}
+        if self._folderIndex is not None and not loadData:
+            for path in fileList:
+                fileStat = sanpy.folderIndex.getFileStat(path)
+                if fileStat is not None:
+                    fileStats[self._getRelPath(path)] = fileStat
+            cachedRows = self._folderIndex.getRows(fileStats)
+        readList = [path for path in fileList if self._getRelPath(path) not in cachedRows]
+
+        executor = None
+        if numWorkers is None or numWorkers > 1:
+            executor = concurrent.futures.ThreadPoolExecutor(max_workers=numWorkers)
+            futures = {path: executor.submit(self.getFileRow, path, loadData) for path in readList}
+
+        newRows = []
+        try:
+            for path in fileList:
+                relPath = self._getRelPath(path)
+                if relPath in cachedRows:
+                    rowDict = self._getDefaultRow()
+                    rowDict.update(cachedRows[relPath])
+                    yield path, None, rowDict
+                    continue
+
+                if executor is None:
+                    ba, rowDict = self.getFileRow(path, loadData=loadData)
+                else:
+                    ba, rowDict = futures[path].result()
+                if rowDict is not None and relPath in fileStats:
+                    indexRow = {k: v for k, v in rowDict.items() if k != "_ba"}
+                    newRows.append((relPath, fileStats[relPath], indexRow))
+                yield path, ba, rowDict
+        finally:
+            if executor is not None:
+                # stopped early, do not read the rest
+                for future in futures.values():
+                    future.cancel()
+                executor.shutdown(wait=True)
+            if self._folderIndex is not None:
+                self._folderIndex.setRows(newRows)
+
     def getFileList(self,
                     path: str = None,
                     santanaTif=False
@@ -1609,32 +1755,70 @@ class analysisDir:
         addedToDf = False
 
         # look for files in path not in df
+        newFileList = []
         for pathFile in pathFileList:
             fileName = os.path.split(pathFile)[1]
             if fileName not in dfFileList:
                 logger.info(f'   Found file in path "{fileName}" not in df')
+                newFileList.append(pathFile)
+
+        # files in df that changed since they were indexed, update their header columns
+        changedFileList = []
+        if self._folderIndex is not None:
+            fileStats = {}
+            for pathFile in pathFileList:
+                fileStat = sanpy.folderIndex.getFileStat(pathFile)
+                if fileStat is not None:
+                    fileStats[self._getRelPath(pathFile)] = fileStat
+            cachedRows = self._folderIndex.getRows(fileStats)
+            changedFileList = [pathFile for pathFile in pathFileList
+                               if pathFile not in newFileList
+                               and self._getRelPath(pathFile) not in cachedRows]
+
+        # read file headers and get df column values
+        readFileList = newFileList + changedFileList
+        fileRows = self.iterFileRows(readFileList, numWorkers=self._numWorkers)
+        for rowIdx, (pathFile, ba, rowDict) in enumerate(fileRows):
+            if self._progressCallback is not None:
+                self._progressCallback(rowIdx + 1, len(readFileList), pathFile, rowDict)
 
-                # load bAnalysis and get df column values
-                addedToDf = True
+            if rowDict is None:
+                continue
+
+            if pathFile in changedFileList:
+                fileName = os.path.split(pathFile)[1]
+                dfRowIdx = self.findFileRow(fileName)
+                if dfRowIdx is not None:
+                    for col in self._headerColumns:
+                        if col in rowDict:
+                            self._df.at[dfRowIdx, col] = rowDict[col]
+                continue
+
+            addedToDf = True
 
-                ba, rowDict = self.getFileRow(pathFile)  # loads bAnalysis
+            # listOfDict.append(rowDict)
 
-                if rowDict is not None:
-                    # listOfDict.append(rowDict)
+            # TODO: get this into getFileROw()
+            # logger.warning("bug 20220718, not sure we need this ???")
+            # print(rowDict)
 
-                    # TODO: get this into getFileROw()
-                    # logger.warning("bug 20220718, not sure we need this ???")
-                    # print(rowDict)
+            # rowDict['relPath'] = pathFile
+            rowDict["_ba"] = None
 
-                    # rowDict['relPath'] = pathFile
-                    rowDict["_ba"] = None
+            self.appendRow(rowDict=rowDict, ba=None)
 
-                    self.appendRow(rowDict=rowDict, ba=None)
+        # look for files in df not in path (deleted), only when we have the whole folder
+        if self._filePath is None:
+            pathFileNames = [os.path.split(pathFile)[1] for pathFile in pathFileList]
+            for dfFile in dfFileList:
+                if not dfFile in pathFileNames:
+                    logger.warning(f'Found file in df "{dfFile}" not in path')
 
-        # look for files in df not in path
-        # for dfFile in dfFileList:
-        #     if not dfFile in pathFileList:
-        #         logger.info(f'Found file in df "{dfFile}" not in path')
+        if self._filePath is None and self._folderIndex is not None:
+            pathRelPaths = set(self._getRelPath(pathFile) for pathFile in pathFileList)
+            deletedRelPaths = [relPath for relPath in self._folderIndex.getRelPaths()
+                               if relPath not in pathRelPaths]
+            self._folderIndex.removeRows(deletedRelPaths)
 
         if addedToDf:
             df = self._df
@@ -1646,100 +1830,271 @@ class analysisDir:
 
         self._updateLoadedAnalyzed()
 
-    def pool_build(self, uniqueColumn=None, allowAutoLoad=False, includeNo=True, verbose=False):
-        """Build one df with all analysis. Use this in plot tool plugin.
-        
+    def _poolAddColumns(self, rowIdx, rowDict, oneDf, uniqueColumn=None):
+        """Add file columns to the analysis df of one file for the pool."""
+        filePath = self.getPathFromRelPath(rowDict["relPath"])
+
+        oneDf["File Number"] = int(rowIdx)
+
+        # 20240114
+        oneDf['File Path'] = filePath
+
+        uniqueName = os.path.splitext(os.path.split(filePath)[1])[0]
+        if uniqueColumn is not None:
+            uniqueName = rowDict[uniqueColumn] + '-' + uniqueName
+        oneDf["Unique Name"] = uniqueName
+
+        # logger.warning('TEMPORARY WHILE WORKING ON KYM POOLING !!!!!!!!!!!!!!!!!!!!!!!!!')
+        # logger.warning('randomly assigning sex to male, female, unknown')
+        # sexList = ['male', 'female', 'unknown']
+        # oneDf['Sex'] = random.choice(sexList)
+        oneDf_thresholdVal = oneDf['thresholdVal'].to_numpy()  # take off potential
+        oneDf_thresholdVal_mean = np.nanmean(oneDf_thresholdVal)
+        if oneDf_thresholdVal_mean > 0.5685522031727147:  # mean of all thresholdVal
+            oneDf['Sex'] ='male'  # pandas dataframe columns are Capitalized !!!!!
+        else:
+            oneDf['Sex'] = 'female'
+
+        return oneDf
+
+    def _poolOneFile(self, rowIdx, rowDict, ba, uniqueColumn=None, allowAutoLoad=False):
+        """Load one file (if necc.) and get its analysis df for the pool.
+
+        Does not change self._df so it can run on a worker thread, see pool_iter().
+
+        Returns
+        -------
+        ba : sanpy.bAnalysis
+            None if not loaded
+        oneDf : pd.DataFrame
+            None if not analyzed
+        """
+        if ba is None or ba == "":
+            filePath = self.getPathFromRelPath(rowDict["relPath"])
+            # only the analysis is needed, raw data is loaded if it is plotted
+            ba = self.loadOneAnalysis(filePath, rowDict["uuid"], allowAutoLoad=allowAutoLoad,
+                                      loadData=False)
+            if ba is None:
+                return None, None
+
+        if not ba.isAnalyzed():
+            return ba, None
+
+        oneDf = ba.asDataFrame(regenerateAnalysisDataFrame=True)
+        if oneDf is None:
+            return ba, None
+
+        return ba, self._poolAddColumns(rowIdx, rowDict, oneDf, uniqueColumn)
+
+    def _poolFromHdf(self, hdfPath, uuid) -> Optional[pd.DataFrame]:
+        """Get the analysis df of one saved recording without loading the recording.
+
+        Same as bAnalysis.asDataFrame() after loading it, None if it has no spikes.
+        """
+        with self._hdfLock:
+            loadedRecording = sanpy.h5Util.loadRecording(hdfPath, uuid)
+        _, loadedMetaDataDict, dfAnalysis = loadedRecording
+        if len(dfAnalysis) == 0:
+            return None
+
+        spikeDict = sanpy.bAnalysisResults.analysisResultList()
+        spikeDict.setFromDataFrame(dfAnalysis)
+
+        # saved file may not have all current keys, see bAnalysis._loadHdf_pytables()
+        metaDataDict = sanpy.MetaData.getMetaDataDict()
+        for k, v in loadedMetaDataDict.items():
+            if k in metaDataDict.keys():
+                metaDataDict[k] = v
+        return sanpy.bAnalysis.getAnalysisDataFrame(spikeDict, metaDataDict)
+
+    def pool_refresh(self, rowList=None) -> Dict[str, Optional[pd.DataFrame]]:
+        """Update the pooled analysis saved next to the h5 file and get it.
+
+        The analysis df of each saved recording is kept in _getPoolFile() with the time
+        its analysis was saved (see sanpy.h5Util.getAnalysisStamps).
+        Only recordings saved since the last refresh are read from the h5 file,
+        recordings are never loaded.
+
+        Parameters
+        ----------
+        rowList : list of (rowIdx, rowDict)
+            Rows of the file table, None for all
+
+        Returns
+        -------
+        dict
+            Keys are uuid, the df is None if the recording has no spikes.
+            Rows with analysis that is not saved (or changed since) are not included.
+        """
+        if rowList is None:
+            rowList = list(self._df.iterrows())
+
+        hdfPath = self._getHdfFile()
+        poolPath = self._getPoolFile()
+        with self._hdfLock:
+            hdfStamps = sanpy.h5Util.getAnalysisStamps(hdfPath)
+        poolStamps = sanpy.h5Util.getAnalysisStamps(poolPath)
+
+        uuidList = []
+        for _rowIdx, rowDict in rowList:
+            uuid = rowDict["uuid"]
+            if not isinstance(uuid, str) or uuid not in hdfStamps:
+                continue
+            ba = rowDict["_ba"]
+            if ba is not None and ba != "" and ba.detectionDirty:
+                # changed since it was saved
+                continue
+            uuidList.append(uuid)
+
+        newFrames = {}
+        for uuid in uuidList:
+            if poolStamps.get(uuid) != hdfStamps[uuid]:
+                newFrames[uuid] = (hdfStamps[uuid], self._poolFromHdf(hdfPath, uuid))
+        removeUuids = [uuid for uuid in poolStamps if uuid not in hdfStamps]
+
+        if newFrames or removeUuids:
+            logger.info(f"updating {len(newFrames)} and removing {len(removeUuids)} recordings in {poolPath}")
+            sanpy.h5Util.savePoolFrames(poolPath, newFrames, removeUuids)
+            if (
+                self.compactFragmentation is not None
+                and sanpy.h5Util.getFragmentation(poolPath) > self.compactFragmentation
+            ):
+                sanpy.h5Util.compactHdf(poolPath)
+
+        return sanpy.h5Util.loadPoolFrames(poolPath, uuidList)
+
+    def pool_iter(self,
+                  uniqueColumn=None,
+                  allowAutoLoad=False,
+                  includeNo=True,
+                  numWorkers: int = 1,
+                  usePoolFile: bool = True,
+                  verbose=False,
+                  ) -> Iterator[Tuple[int, pd.DataFrame]]:
+        """Yield (rowIdx, oneDf) with the analysis of each analyzed file, in file order.
+
+        Files are loaded and converted on a pool of numWorkers threads,
+        each df is yielded as soon as it and all files before it are done.
+        Use this to show the pool while it is loading, pool_build() collects all of them.
+
+        If usePoolFile, saved analysis is from the pool file (see pool_refresh())
+        and only files that are not saved are loaded.
+
         Parameters
         ----------
         uniqueColumn : str
-            Name of column to prepend to File column to make a unique name.
-            Use 'parant2' for Kymograph tif files exported from Olympus.
+            See pool_build()
+        allowAutoLoad : bool
+            If True then load files that were not analyzed or saved
         includeNo : boolean
             if True then include files with metadata 'Include' of no.
+        numWorkers : int
+            Number of files to load concurrently, 1 to load one after another,
+            None for the default of concurrent.futures.ThreadPoolExecutor
+        usePoolFile : bool
+            If False, always load the analysis of each file
         """
-        if verbose:
-            logger.info("")
-        
-        masterDf = None
-        
-        # for row in range(self.numFiles):
+        rowList = []
         for rowIdx, rowDict in self._df.iterrows():
             if (not includeNo) and (rowDict['Include'] == 'no'):
                 if verbose:
                     logger.info(f'  rowIdx:{rowIdx} Include is "no"')
                 continue
+            rowList.append((rowIdx, rowDict))
+
+        poolFrames = self.pool_refresh(rowList) if usePoolFile else {}
+        loadList = [(rowIdx, rowDict) for rowIdx, rowDict in rowList
+                    if rowDict["uuid"] not in poolFrames]
+
+        executor = None
+        if numWorkers is None or numWorkers > 1:
+            executor = concurrent.futures.ThreadPoolExecutor(max_workers=numWorkers)
+            futures = {
+                rowIdx: executor.submit(self._poolOneFile, rowIdx, rowDict, rowDict["_ba"],
+                                        uniqueColumn, allowAutoLoad)
+                for rowIdx, rowDict in loadList
+            }
+
+        loadedNew = False
+        try:
+            for rowIdx, rowDict in rowList:
+                if rowDict["uuid"] in poolFrames:
+                    oneDf = poolFrames[rowDict["uuid"]]
+                    if oneDf is not None:
+                        self.signalWindow(f'Adding "{rowDict["File"]}"', verbose=verbose)
+                        yield rowIdx, self._poolAddColumns(rowIdx, rowDict, oneDf, uniqueColumn)
+                    continue
+
+                if executor is None:
+                    ba, oneDf = self._poolOneFile(rowIdx, rowDict, rowDict["_ba"],
+                                                  uniqueColumn, allowAutoLoad)
+                else:
+                    ba, oneDf = futures[rowIdx].result()
 
-            ba = self.getAnalysis(rowIdx, allowAutoLoad=allowAutoLoad)
-            if ba is None:
-                continue
-            
-            if not ba.isAnalyzed():
-                if verbose:
-                    logger.info(f"  rowIdx:{rowIdx} not analyzed")
-                continue
-                
-            oneDf = ba.asDataFrame(regenerateAnalysisDataFrame=True)
-            
-            if oneDf is not None:
+                if ba is None:
+                    if allowAutoLoad:
+                        logger.warning(f'Did not load row {rowIdx} "{rowDict["File"]}"')
+                    continue
+
+                if self._df.at[rowIdx, "_ba"] is not ba:
+                    # keep loaded analysis like getAnalysis()
+                    self._df.at[rowIdx, "_ba"] = ba
+                    loadedNew = True
+
+                if oneDf is None:
+                    if verbose:
+                        logger.info(f"  rowIdx:{rowIdx} not analyzed")
+                    continue
 
                 self.signalWindow(f'Adding "{ba.fileLoader.filename}"', verbose=verbose)
-                
-                oneDf["File Number"] = int(rowIdx)
-                
-                # 20240114
-                oneDf['File Path'] = ba.fileLoader.filepath
-
-                uniqueName = os.path.splitext(ba.fileLoader.filename)[0]
-                if uniqueColumn is not None:
-                    uniqueName = rowDict[uniqueColumn] + '-' + uniqueName
-                oneDf["Unique Name"] = uniqueName
-
-                # logger.warning('TEMPORARY WHILE WORKING ON KYM POOLING !!!!!!!!!!!!!!!!!!!!!!!!!')
-                # logger.warning('randomly assigning sex to male, female, unknown')
-                # sexList = ['male', 'female', 'unknown']
-                # oneDf['Sex'] = random.choice(sexList)
-                oneDf_thresholdVal = oneDf['thresholdVal'].to_numpy()  # take off potential
-                oneDf_thresholdVal_mean = np.nanmean(oneDf_thresholdVal)
-                if oneDf_thresholdVal_mean > 0.5685522031727147:  # mean of all thresholdVal
-                    # print(f'oneDf_thresholdVal_mean:{oneDf_thresholdVal_mean} male')
-                    oneDf['Sex'] ='male'  # pandas dataframe columns are Capitalized !!!!!
-                else:
-                    oneDf['Sex'] = 'female'
-                    # print(f'oneDf_thresholdVal_mean:{oneDf_thresholdVal_mean} female')
-
-                # print('FINAL SEX IS !!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!!')
-                # print(oneDf['sex'])
-                # drop some redundant analysis results (not in file metadata)
-                
-                if masterDf is None:
-                    masterDf = oneDf
-                else:
-                    masterDf = pd.concat([masterDf, oneDf], ignore_index=True)
-        #
-        if masterDf is None:
+                yield rowIdx, oneDf
+        finally:
+            if executor is not None:
+                # stopped early, do not load the rest
+                for future in futures.values():
+                    future.cancel()
+                executor.shutdown(wait=True)
+            if loadedNew:
+                self._updateLoadedAnalyzed()
+
+    def pool_build(self, uniqueColumn=None, allowAutoLoad=False, includeNo=True, verbose=False,
+                   numWorkers: int = 1, usePoolFile: bool = True):
+        """Build one df with all analysis. Use this in plot tool plugin.
+        
+        Parameters
+        ----------
+        uniqueColumn : str
+            Name of column to prepend to File column to make a unique name.
+            Use 'parant2' for Kymograph tif files exported from Olympus.
+        includeNo : boolean
+            if True then include files with metadata 'Include' of no.
+        numWorkers : int
+            Number of files to load concurrently, see pool_iter()
+        usePoolFile : bool
+            If True, saved analysis is from the pool file, see pool_refresh()
+        """
+        if verbose:
+            logger.info("")
+        
+        # concat once, growing one df per file is quadratic in the number of files
+        dfList = [oneDf for _rowIdx, oneDf in self.pool_iter(uniqueColumn=uniqueColumn,
+                                                              allowAutoLoad=allowAutoLoad,
+                                                              includeNo=includeNo,
+                                                              numWorkers=numWorkers,
+                                                              usePoolFile=usePoolFile,
+                                                              verbose=verbose)]
+        if not dfList:
             if verbose:
                 logger.error("Did not find any analysis.")
-        else:
-            # add an index column (for plotting)
-            masterDf['index'] = [x for x in range(len(masterDf))]
-            if verbose:
-                logger.info(f"final num spikes {len(masterDf)}")
-        
-            # # randomly assign sex based on mena +/- STD of take of potential
-            # _thresholdVal = masterDf['thresholdVal'].to_numpy()  # take off potential
-            # _thresholdVal_mean = np.nanmean(_thresholdVal)
-            # # _thresholdVal_mean: 0.5685522031727147
-            # logger.error(f'  remember, setting rows based on takeoff potential _thresholdVal_mean: {_thresholdVal_mean}')
-            # for _idx, _row in masterDf.iterrows():
-            #     logger.error(f' _idx:{_idx} thresholdVal:{_row["thresholdVal"]}')
-            #     if _row['thresholdVal'] > _thresholdVal_mean:
-            #         print('  -->> male')
-            #         masterDf.at[_idx, 'sex'] = 'male'
-            #     else:
-            #         masterDf.at[_idx, 'sex'] = 'female'
-            #         print('  -->> male')
+            return None
+
+        masterDf = pd.concat(dfList, ignore_index=True)
+
+        # add an index column (for plotting)
+        masterDf['index'] = np.arange(len(masterDf))
+        if verbose:
+            logger.info(f"final num spikes {len(masterDf)}")
 
-        # print(masterDf.head())
         #self._poolDf = masterDf
 
         return masterDf
@@ -7,6 +7,262 @@ from sanpy.sanpyLogger import get_logger
 
 logger = get_logger(__name__)
 
+# maximum number of (spike x point) elements gathered at once by iterWindows()
+_maxWindowElements = 2**22
+
+
+def _iterRows(numRows, width):
+    """Yield slices of rows so (rows x width) stays below _maxWindowElements."""
+    rowsPerChunk = max(1, _maxWindowElements // max(width, 1))
+    for firstRow in range(0, numRows, rowsPerChunk):
+        yield slice(firstRow, firstRow + rowsPerChunk)
+
+
+def _gatherWindows(x, starts, lengths, width, step=1, fill=np.nan):
+    """Gather windows of x as a 2D (len(starts), width) array and its valid mask."""
+    offsets = np.arange(max(width, 1), dtype=np.int64)
+    valid = offsets[np.newaxis, :] < lengths[:, np.newaxis]
+    idx = starts[:, np.newaxis] + step * offsets[np.newaxis, :]
+    windows = x[np.where(valid, idx, 0)]
+    if fill is not None:
+        windows = np.where(valid, windows, fill)
+    return windows, valid
+
+
+def iterWindows(x, starts, lengths, width, step=1, fill=np.nan):
+    """Gather one window of `x` per spike into a 2D array.
+
+    Row i holds x[starts[i] + step*k] for k < lengths[i], remaining columns are `fill`.
+    Rows are yielded in chunks so memory is bounded by _maxWindowElements.
+
+    Args:
+        x (np.ndarray): 1D trace, usually filtered Vm or dV/dt
+        starts (np.ndarray): Start point of each window
+        lengths (np.ndarray): Number of valid points in each window, clipped to [0, width]
+        width (int): Number of columns
+        step (int): 1 to walk forward from start, -1 to walk backward
+        fill: Value for padding, None to leave padding as x[0]
+
+    Yields:
+        rows (slice): Rows (spikes) in this chunk
+        windows (np.ndarray): Shape (rows, width)
+        valid (np.ndarray): Boolean mask, False for padding
+    """
+    starts = np.asarray(starts, dtype=np.int64)
+    width = max(int(width), 0)
+    lengths = np.clip(np.asarray(lengths, dtype=np.int64), 0, width)
+    for rows in _iterRows(len(starts), width):
+        windows, valid = _gatherWindows(
+            x, starts[rows], lengths[rows], width, step=step, fill=fill
+        )
+        yield rows, windows, valid
+
+
+def windowArgMin(x, starts, lengths, width):
+    """Argmin of x[start:start+length] for each window, -1 for empty windows."""
+    return _windowArg(x, starts, lengths, width, np.argmin, np.inf)
+
+
+def windowArgMax(x, starts, lengths, width):
+    """Argmax of x[start:start+length] for each window, -1 for empty windows."""
+    return _windowArg(x, starts, lengths, width, np.argmax, -np.inf)
+
+
+def _windowArg(x, starts, lengths, width, argFn, fill):
+    theRet = np.full(len(starts), -1, dtype=np.int64)
+    for rows, windows, valid in iterWindows(x, starts, lengths, width, fill=fill):
+        idx = argFn(windows, axis=1)
+        theRet[rows] = np.where(valid[:, 0], idx, -1)
+    return theRet
+
+
+def windowFirst(x, starts, lengths, width, values, compare, step=1):
+    """First k with compare(x[start + step*k], value) in each window.
+
+    Args:
+        values (np.ndarray): One value per window to compare against
+        compare (np.ufunc): Like np.less or np.greater
+
+    Returns:
+        np.ndarray: Offset k into each window, -1 if not found
+    """
+    values = np.asarray(values)
+    theRet = np.full(len(starts), -1, dtype=np.int64)
+    for rows, windows, valid in iterWindows(
+        x, starts, lengths, width, step=step, fill=None
+    ):
+        hit = compare(windows, values[rows, np.newaxis]) & valid
+        found = hit.any(axis=1)
+        theRet[rows] = np.where(found, np.argmax(hit, axis=1), -1)
+    return theRet
+
+
+def windowMean(x, starts, width, lengths=None):
+    """Mean of x[start:start+length] for each window, nan for empty windows.
+
+    If lengths is None, all windows are full length (width).
+    """
+    theRet = np.full(len(starts), np.nan)
+    if lengths is None:
+        lengths = np.full(len(starts), width)
+        for rows, windows, valid in iterWindows(x, starts, lengths, width):
+            theRet[rows] = np.mean(windows, axis=1)
+    else:
+        for rows, windows, valid in iterWindows(x, starts, lengths, width, fill=0.0):
+            numValid = valid.sum(axis=1)
+            with np.errstate(invalid="ignore", divide="ignore"):
+                theRet[rows] = np.where(
+                    numValid > 0, windows.sum(axis=1) / numValid, np.nan
+                )
+    return theRet
+
+
+def windowMax(x, starts, width):
+    """Max of x[start:start+width] for each window, nan for empty windows.
+
+    Windows are clipped at the end of x, like a slice.
+    Full windows are strided views of x (see np.lib.stride_tricks.sliding_window_view).
+    """
+    starts = np.asarray(starts, dtype=np.int64)
+    width = max(int(width), 0)
+    theRet = np.full(len(starts), np.nan)
+    if width == 0:
+        return theRet
+
+    isFull = starts + width <= len(x)
+    fullIdx = np.flatnonzero(isFull)
+    if len(fullIdx) > 0:
+        strided = np.lib.stride_tricks.sliding_window_view(x, width)
+        for rows in _iterRows(len(fullIdx), width):
+            theRet[fullIdx[rows]] = strided[starts[fullIdx[rows]]].max(axis=1)
+
+    # windows clipped at the end of x
+    clippedIdx = np.flatnonzero(~isFull)
+    lengths = len(x) - starts[clippedIdx]
+    for rows, windows, valid in iterWindows(
+        x, starts[clippedIdx], lengths, width, fill=-np.inf
+    ):
+        theRet[clippedIdx[rows]] = np.where(valid[:, 0], windows.max(axis=1), np.nan)
+    return theRet
+
+
+def rollingMeanStd(x, width):
+    """Mean and standard deviation of every window x[i:i+width].
+
+    Computed in chunks over strided windows with np.mean/np.std,
+    so results are identical to np.mean(x[i:i+width]) and np.std(x[i:i+width]).
+
+    Returns:
+        rollingMean (np.ndarray): Length len(x)-width+1, empty if width is 0 or longer than x
+        rollingStd (np.ndarray): Same length as rollingMean
+    """
+    width = int(width)
+    if width < 1 or width > len(x):
+        return np.zeros(0), np.zeros(0)
+    strided = np.lib.stride_tricks.sliding_window_view(x, width)
+    rollingMean = np.empty(len(strided))
+    rollingStd = np.empty(len(strided))
+    for rows in _iterRows(len(strided), width):
+        rollingMean[rows] = np.mean(strided[rows], axis=1)
+        rollingStd[rows] = np.std(strided[rows], axis=1)
+    return rollingMean, rollingStd
+
+
+def windowSlope(x, y, starts, lengths, width):
+    """Slope of a linear fit of y versus x in each window.
+
+    Same as m from 'm,b = np.polyfit(x, y, 1)', nan for windows with less than 2 points.
+    Sums are sequential over the valid points of each window so the slope of one window
+    does not depend on width (the other windows).
+    """
+    starts = np.asarray(starts, dtype=np.int64)
+    width = max(int(width), 0)
+    lengths = np.clip(np.asarray(lengths, dtype=np.int64), 0, width)
+    theRet = np.full(len(starts), np.nan)
+
+    def _rowSum(windows, n):
+        lastIdx = np.clip(n - 1, 0, None)[:, np.newaxis]
+        return np.take_along_axis(np.cumsum(windows, axis=1), lastIdx, axis=1)[:, 0]
+
+    for rows in _iterRows(len(starts), width):
+        xWin, valid = _gatherWindows(x, starts[rows], lengths[rows], width, fill=0.0)
+        yWin, _ = _gatherWindows(y, starts[rows], lengths[rows], width, fill=0.0)
+        n = lengths[rows]
+        with np.errstate(invalid="ignore", divide="ignore"):
+            xDiff = np.where(valid, xWin - (_rowSum(xWin, n) / n)[:, np.newaxis], 0)
+            yDiff = np.where(valid, yWin - (_rowSum(yWin, n) / n)[:, np.newaxis], 0)
+            m = _rowSum(xDiff * yDiff, n) / _rowSum(xDiff * xDiff, n)
+        theRet[rows] = np.where(n > 1, m, np.nan)
+    return theRet
+
+
+def halfWidths(vm, thresholdPnts, peakPnts, halfHeights, windowPnts):
+    """Rising and falling points at each half-height, for all spikes and heights in one pass.
+
+    For each half-height h, search forward from the peak (up to windowPnts) for the first point
+    below Vm = threshold + h% of spike height (falling), then search forward from threshold to
+    peak for the first point above Vm at the falling point (rising).
+
+    Args:
+        vm (np.ndarray): 1D filtered Vm
+        thresholdPnts (np.ndarray): Threshold point of each spike
+        peakPnts (np.ndarray): Peak point of each spike
+        halfHeights (list): Percent of spike height, like [10, 20, 50, 80, 90]
+        windowPnts (int): Points after the peak to search for the falling point
+
+    Returns:
+        risingPnt (np.ndarray): Shape (nSpikes, nHeights), -1 if not found
+        fallingPnt (np.ndarray): Shape (nSpikes, nHeights), -1 if not found
+        thisVm (np.ndarray): Shape (nSpikes, nHeights), Vm searched for
+        errorMask (np.ndarray): Shape (nSpikes, nHeights), True if there is no width
+    """
+    t = np.asarray(thresholdPnts, dtype=np.int64)
+    peakPnts = np.asarray(peakPnts, dtype=np.int64)
+    numSpikes = len(t)
+    numHeights = len(halfHeights)
+
+    thresholdVal = vm[t]
+    spikeHeight = vm[peakPnts] - thresholdVal
+    heights = np.asarray(halfHeights, dtype=np.float64) * 0.01
+    thisVm = thresholdVal[:, np.newaxis] + spikeHeight[:, np.newaxis] * heights[np.newaxis, :]
+
+    windowPnts = max(int(windowPnts), 0)
+    fallingLen = np.clip(len(vm) - peakPnts, 0, windowPnts)
+    risingLen = np.clip(peakPnts - t, 0, None)
+    risingWidth = int(risingLen.max(initial=0))
+
+    risingPnt = np.full((numSpikes, numHeights), -1, dtype=np.int64)
+    fallingPnt = np.full((numSpikes, numHeights), -1, dtype=np.int64)
+    for rows in _iterRows(numSpikes, numHeights * max(windowPnts, risingWidth, 1)):
+        rowVm = thisVm[rows, :, np.newaxis]
+
+        # falling, first point below thisVm after the peak
+        windows, valid = _gatherWindows(
+            vm, peakPnts[rows], fallingLen[rows], windowPnts, fill=None
+        )
+        hit = (windows[:, np.newaxis, :] < rowVm) & valid[:, np.newaxis, :]
+        hasFalling = hit.any(axis=2)
+        fallingIdx = np.argmax(hit, axis=2)
+        rowFalling = np.where(hasFalling, peakPnts[rows, np.newaxis] + fallingIdx, -1)
+        fallingPnt[rows] = rowFalling
+
+        # rising, first point above Vm at the falling point (from threshold to peak)
+        fallingVal = vm[np.where(hasFalling, rowFalling, 0)]
+        windows, valid = _gatherWindows(
+            vm, t[rows], risingLen[rows], risingWidth, fill=None
+        )
+        hit = (
+            (windows[:, np.newaxis, :] > fallingVal[:, :, np.newaxis])
+            & valid[:, np.newaxis, :]
+            & hasFalling[:, :, np.newaxis]
+        )
+        hasRising = hit.any(axis=2)
+        risingIdx = np.argmax(hit, axis=2)
+        risingPnt[rows] = np.where(hasRising, t[rows, np.newaxis] + risingIdx, -1)
+
+    errorMask = risingPnt < 0
+    return risingPnt, fallingPnt, thisVm, errorMask
+
 
 def throwOutAboveBelow(
     vm,
@@ -307,6 +307,7 @@ analysisResultDict[key] = getDefaultDict()
 analysisResultDict[key]["type"] = "float"
 analysisResultDict[key]["default"] = defaultVal
 analysisResultDict[key]["units"] = "sec"
+analysisResultDict[key]["depends on detection"] = "fastAhpWindow_ms"
 analysisResultDict[key]["description"] = "fast AHP seconds."
 
 key = "fastAhpValue"
@@ -314,6 +315,7 @@ analysisResultDict[key] = getDefaultDict()
 analysisResultDict[key]["type"] = "float"
 analysisResultDict[key]["default"] = defaultVal
 analysisResultDict[key]["units"] = "mV"  # voltage-clamp'
+analysisResultDict[key]["depends on detection"] = "fastAhpWindow_ms"
 analysisResultDict[key]["description"] = "Value of Vm at fast AHP point."
 
 key = "preMinPnt"
@@ -321,7 +323,7 @@ analysisResultDict[key] = getDefaultDict()
 analysisResultDict[key]["type"] = "int"
 analysisResultDict[key]["default"] = defaultVal
 analysisResultDict[key]["units"] = "point"  # voltage-clamp
-analysisResultDict[key]["depends on detection"] = "mdp_ms"
+analysisResultDict[key]["depends on detection"] = "(mdp_ms, avgWindow_ms)"
 analysisResultDict[key][
     "description"
 ] = "Minimum before an AP taken from predefined window."
@@ -331,6 +333,7 @@ analysisResultDict[key] = getDefaultDict()
 analysisResultDict[key]["type"] = "float"
 analysisResultDict[key]["default"] = defaultVal
 analysisResultDict[key]["units"] = "mV"  # voltage-clamp
+analysisResultDict[key]["depends on detection"] = "(mdp_ms, avgWindow_ms)"
 analysisResultDict[key][
     "description"
 ] = "Minimum before an AP taken from predefined window."
@@ -340,6 +343,7 @@ analysisResultDict[key] = getDefaultDict()
 analysisResultDict[key]["type"] = "int"
 analysisResultDict[key]["default"] = defaultVal
 analysisResultDict[key]["units"] = "point"  # voltage-clamp
+analysisResultDict[key]["depends on detection"] = "(mdp_ms, avgWindow_ms)"
 analysisResultDict[key][
     "description"
 ] = "Point where pre linear fit starts. Used for EDD Rate"
@@ -349,6 +353,7 @@ analysisResultDict[key] = getDefaultDict()
 analysisResultDict[key]["type"] = "int"
 analysisResultDict[key]["default"] = defaultVal
 analysisResultDict[key]["units"] = "point"  # voltage-clamp
+analysisResultDict[key]["depends on detection"] = "(mdp_ms, avgWindow_ms)"
 analysisResultDict[key][
     "description"
 ] = "Point where pre linear fit stops. Used for EDD Rate"
@@ -358,6 +363,7 @@ analysisResultDict[key] = getDefaultDict()
 analysisResultDict[key]["type"] = "float"
 analysisResultDict[key]["default"] = defaultVal
 analysisResultDict[key]["units"] = "ms"  # voltage-clamp
+analysisResultDict[key]["depends on detection"] = "(mdp_ms, avgWindow_ms)"
 analysisResultDict[key]["description"] = "Time (ms) between start/stop of EDD."
 
 key = "preLinearFitVal0"
@@ -365,6 +371,7 @@ analysisResultDict[key] = getDefaultDict()
 analysisResultDict[key]["type"] = "float"
 analysisResultDict[key]["default"] = defaultVal
 analysisResultDict[key]["units"] = "mv"  # voltage-clamp
+analysisResultDict[key]["depends on detection"] = "(mdp_ms, avgWindow_ms)"
 analysisResultDict[key]["description"] = ""
 
 key = "preLinearFitVal1"
@@ -372,6 +379,7 @@ analysisResultDict[key] = getDefaultDict()
 analysisResultDict[key]["type"] = "float"
 analysisResultDict[key]["default"] = defaultVal
 analysisResultDict[key]["units"] = "mv"
+analysisResultDict[key]["depends on detection"] = "(mdp_ms, avgWindow_ms)"
 analysisResultDict[key]["description"] = ""
 
 key = "earlyDiastolicDurationRate"
@@ -379,6 +387,7 @@ analysisResultDict[key] = getDefaultDict()
 analysisResultDict[key]["type"] = "float"
 analysisResultDict[key]["default"] = defaultVal
 analysisResultDict[key]["units"] = "mv/S"
+analysisResultDict[key]["depends on detection"] = "(mdp_ms, avgWindow_ms, lowEddRate_warning)"
 analysisResultDict[key][
     "description"
 ] = "Early diastolic duration rate, the slope of the linear fit between start/stop of EDD."
@@ -428,6 +437,7 @@ analysisResultDict[key] = getDefaultDict()
 analysisResultDict[key]["type"] = "float"
 analysisResultDict[key]["default"] = defaultVal
 analysisResultDict[key]["units"] = "mV"
+analysisResultDict[key]["depends on detection"] = "dvdtPostWindow_ms"
 analysisResultDict[key]["description"] = "Value of Vm at minimum of dv/dt after an AP."
 
 key = "postSpike_dvdt_min_val2"
@@ -435,6 +445,7 @@ analysisResultDict[key] = getDefaultDict()
 analysisResultDict[key]["type"] = "float"
 analysisResultDict[key]["default"] = defaultVal
 analysisResultDict[key]["units"] = "dvdt"
+analysisResultDict[key]["depends on detection"] = "dvdtPostWindow_ms"
 analysisResultDict[key][
     "description"
 ] = "Value of dv/dt at minimum of dv/dt after an AP."
@@ -454,6 +465,7 @@ analysisResultDict[key] = getDefaultDict()
 analysisResultDict[key]["type"] = "float"
 analysisResultDict[key]["default"] = defaultVal
 analysisResultDict[key]["units"] = "ms"
+analysisResultDict[key]["depends on detection"] = "refractory_ms"
 analysisResultDict[key][
     "description"
 ] = "Inter-Spike-Interval (ms) with respect to previous AP."
@@ -463,6 +475,7 @@ analysisResultDict[key] = getDefaultDict()
 analysisResultDict[key]["type"] = "float"
 analysisResultDict[key]["default"] = defaultVal
 analysisResultDict[key]["units"] = "Hz"
+analysisResultDict[key]["depends on detection"] = "refractory_ms"
 analysisResultDict[key]["description"] = "AP frequency with respect to previous AP."
 
 key = "cycleLength_pnts"
@@ -470,15 +483,17 @@ analysisResultDict[key] = getDefaultDict()
 analysisResultDict[key]["type"] = "int"
 analysisResultDict[key]["default"] = defaultVal
 analysisResultDict[key]["units"] = "point"
+analysisResultDict[key]["depends on detection"] = "(mdp_ms, avgWindow_ms)"
 analysisResultDict[key][
     "description"
 ] = "Points between APs with respect to previous AP."
 
 key = "cycleLength_ms"
 analysisResultDict[key] = getDefaultDict()
-analysisResultDict[key]["type"] = "int"
+analysisResultDict[key]["type"] = "float"
 analysisResultDict[key]["default"] = defaultVal
 analysisResultDict[key]["units"] = "point"
+analysisResultDict[key]["depends on detection"] = "(mdp_ms, avgWindow_ms)"
 analysisResultDict[key][
     "description"
 ] = "Time (ms) between APs with respect to previous AP."
@@ -488,6 +503,7 @@ analysisResultDict[key] = getDefaultDict()
 analysisResultDict[key]["type"] = "float"
 analysisResultDict[key]["default"] = defaultVal
 analysisResultDict[key]["units"] = "ms"
+analysisResultDict[key]["depends on detection"] = "(mdp_ms, avgWindow_ms)"
 analysisResultDict[key][
     "description"
 ] = "Time (ms) between minimum before AP (preMinPnt) and AP time (thresholdPnt)."
@@ -497,6 +513,7 @@ analysisResultDict[key] = getDefaultDict()
 analysisResultDict[key]["type"] = "list"
 analysisResultDict[key]["default"] = []
 analysisResultDict[key]["units"] = ""
+analysisResultDict[key]["depends on detection"] = "(halfHeights, halfWidthWindow_ms)"
 analysisResultDict[key][
     "description"
 ] = "A list of dict to hold half-height information for each half-height in detection halfHeights."
@@ -505,15 +522,39 @@ analysisResultDict[key][
 for i in [10, 20, 50, 80, 90]:
     key = "widths_" + str(i)
     analysisResultDict[key] = getDefaultDict()
-    analysisResultDict[key]["type"] = "int"
+    analysisResultDict[key]["type"] = "float"
     analysisResultDict[key]["default"] = defaultVal
     analysisResultDict[key]["units"] = "percent"
-    analysisResultDict[key]["depends on detection"] = "halfWidthWindow_ms"
+    analysisResultDict[key]["depends on detection"] = "(halfHeights, halfWidthWindow_ms)"
     analysisResultDict[key]["description"] = f"Width (ms) at half-height {i} %."
 
 # now we have (AP threshold, AP peak), derive stats about each AP
 
 
+def getDetectionDependencies() -> Dict[str, List[str]]:
+    """Get a dependency graph from detection parameters to analysis results.
+
+    Built from the "depends on detection" of each key in analysisResultDict,
+    either one detection parameter or a tuple str like "(mdp_ms, avgWindow_ms)".
+
+    Returns
+    -------
+    dict
+        Keys are detection parameters (see sanpy.bDetection), values are a list of analysis results.
+    """
+    dependencies = {}
+    for column, columnDict in analysisResultDict.items():
+        dependsOn = columnDict["depends on detection"]
+        for detectionKey in dependsOn.strip("()").split(","):
+            detectionKey = detectionKey.strip()
+            if not detectionKey:
+                continue
+            if detectionKey not in dependencies:
+                dependencies[detectionKey] = []
+            dependencies[detectionKey].append(column)
+    return dependencies
+
+
 def printDocs():
     """Print out human readable detection parameters and convert to markdown table.
 
@@ -578,12 +619,47 @@ class NumpyEncoder(json.JSONEncoder):
         return json.JSONEncoder.default(self, obj)
 
 
+def _getColumnKind(theType: str, theDefault) -> str:
+    """Get the storage kind of a column from its analysisResultDict type and default.
+
+    Returns one of ('int', 'float', 'bool', 'object').
+    """
+    if theType == "int":
+        return "int"
+    elif theType == "float":
+        return "float"
+    elif theType == "bool":
+        return "bool"
+    elif theType in ("str", "list", ""):
+        return "object"
+    # user keys, infer from the default value
+    if isinstance(theDefault, (bool, np.bool_)):
+        return "bool"
+    elif isinstance(theDefault, (int, np.integer)):
+        return "int"
+    elif theDefault is None or isinstance(theDefault, (float, np.floating)):
+        return "float"
+    return "object"
+
+
+def _isNull(value) -> bool:
+    """True if value is None or float nan."""
+    return value is None or (isinstance(value, (float, np.floating)) and np.isnan(value))
+
+
 class analysisResultList:
     """Class encapsulating a list of analysis results.
-    
+
     Each row is an analysisResultDict for one spike.
 
     These are keys in bAnalysis_ spike dict and columns in output reports
+
+    Results are stored by column (struct of arrays), one typed np.ndarray per key.
+    Int columns have a null mask so they can hold a default of None or nan.
+    List values like 'errors' and 'widths' are in a ragged (object) column with one list per spike.
+
+    Indexing with self[i] returns an analysisResult, a light weight view of row i
+    that behaves like a dict, e.g. self[i]['thresholdSec'].
     """
 
     def __init__(self):
@@ -592,10 +668,235 @@ class analysisResultList:
         # TODO: put xxx in a function getAnalysisResltDict()
         self._dDict = analysisResultDict
 
-        # list of analysisResultDict
-        self._myList = []
+        self._numRows = 0
+        self._capacity = 0
+
+        # one np.ndarray per key, arrays have length self._capacity
+        self._columns: Dict[str, np.ndarray] = {}
+        self._kinds: Dict[str, str] = {}
+        self._defaults: Dict[str, object] = {}
+        # for 'int' columns, True where value is the (None or nan) default
+        self._nulls: Dict[str, np.ndarray] = {}
+
+        for k, v in analysisResultDict.items():
+            self._addColumn(k, _getColumnKind(v["type"], v["default"]), v["default"])
+
+    def _addColumn(self, theKey: str, kind: str, theDefault):
+        self._kinds[theKey] = kind
+        self._defaults[theKey] = theDefault
+        if kind == "int":
+            self._columns[theKey] = np.zeros(self._capacity, dtype=np.int64)
+            self._nulls[theKey] = np.ones(self._capacity, dtype=bool)
+        elif kind == "float":
+            self._columns[theKey] = np.full(self._capacity, np.nan)
+        elif kind == "bool":
+            self._columns[theKey] = np.zeros(self._capacity, dtype=bool)
+        else:
+            self._columns[theKey] = np.empty(self._capacity, dtype=object)
+        self._fillDefault(theKey, 0, self._numRows)
+
+    def _fillDefault(self, theKey: str, start: int, stop: int):
+        """Fill rows [start, stop) of one column with its default."""
+        kind = self._kinds[theKey]
+        theDefault = self._defaults[theKey]
+        if kind == "int":
+            isNull = _isNull(theDefault)
+            self._nulls[theKey][start:stop] = isNull
+            self._columns[theKey][start:stop] = 0 if isNull else theDefault
+        elif kind == "object" and isinstance(theDefault, list):
+            # each spike gets its own list
+            for row in range(start, stop):
+                self._columns[theKey][row] = list(theDefault)
+        else:
+            self._columns[theKey][start:stop] = (
+                np.nan if theDefault is None and kind == "float" else theDefault
+            )
+
+    def _appendRows(self, numRows: int):
+        """Append numRows with default values, grow capacity by doubling."""
+        start = self._numRows
+        stop = start + numRows
+        if stop > self._capacity:
+            newCapacity = max(stop, 2 * self._capacity, 16)
+            for k, col in self._columns.items():
+                newCol = np.empty(newCapacity, dtype=col.dtype)
+                newCol[: self._numRows] = col[: self._numRows]
+                self._columns[k] = newCol
+            for k, nulls in self._nulls.items():
+                newNulls = np.ones(newCapacity, dtype=bool)
+                newNulls[: self._numRows] = nulls[: self._numRows]
+                self._nulls[k] = newNulls
+            self._capacity = newCapacity
+        self._numRows = stop
+        for k in self._columns.keys():
+            self._fillDefault(k, start, stop)
+
+    def _convertColumn(self, theKey: str, kind: str):
+        """Convert a column to a more general kind, ('int' -> 'float') or (any -> 'object')."""
+        n = self._numRows
+        oldKind = self._kinds[theKey]
+        if oldKind == "int" and kind == "float":
+            newCol = self._columns[theKey].astype(np.float64)
+            newCol[self._nulls[theKey]] = np.nan
+        else:
+            newCol = np.empty(self._capacity, dtype=object)
+            newCol[:n] = [self._getValue(theKey, row) for row in range(n)]
+        self._columns[theKey] = newCol
+        self._nulls.pop(theKey, None)
+        self._kinds[theKey] = kind
+
+    def _getValue(self, theKey: str, row: int):
+        """Get one value, raises KeyError if theKey is not a column."""
+        kind = self._kinds[theKey]
+        if kind == "int" and self._nulls[theKey][row]:
+            return self._defaults[theKey]
+        value = self._columns[theKey][row]
+        if kind == "bool":
+            value = bool(value)
+        return value
+
+    def _setValue(self, theKey: str, row: int, value):
+        """Set one value, converting the column kind if value does not fit."""
+        if theKey not in self._columns:
+            self._addColumn(theKey, _getColumnKind("", value), float("nan"))
+
+        kind = self._kinds[theKey]
+        isBool = isinstance(value, (bool, np.bool_))
+        isInt = isinstance(value, (int, np.integer)) and not isBool
+        isFloat = isinstance(value, (float, np.floating))
+
+        if kind == "int":
+            if _isNull(value):
+                self._nulls[theKey][row] = True
+                return
+            elif isInt:
+                self._columns[theKey][row] = value
+                self._nulls[theKey][row] = False
+                return
+            self._convertColumn(theKey, "float" if isFloat else "object")
+        elif kind == "float":
+            if value is None or isInt or isFloat:
+                self._columns[theKey][row] = np.nan if value is None else value
+                return
+            self._convertColumn(theKey, "object")
+        elif kind == "bool":
+            if isBool:
+                self._columns[theKey][row] = value
+                return
+            self._convertColumn(theKey, "object")
+
+        # float or object
+        self._columns[theKey][row] = value
+
+    def getColumn(self, theKey: str, rows=None, asList: bool = False):
+        """Get values of one key for all spikes (or rows).
+
+        Parameters
+        ----------
+        theKey : str
+            Analysis result key like 'thresholdSec'
+        rows : np.ndarray or None
+            Boolean mask or integer index of rows, None for all rows
+        asList : bool
+            If True return a list, int values are int and missing values are nan
+
+        Returns
+        -------
+        np.ndarray
+            A read only view when rows is None (no copy).
+            Int columns with missing values are returned as float with nan.
+
+        Raises
+        ------
+        KeyError
+            If theKey is not a column.
+        """
+        kind = self._kinds[theKey]
+        col = self._columns[theKey][: self._numRows]
+        if rows is not None:
+            col = col[rows]
+        else:
+            col = col.view()
+            col.flags.writeable = False
+
+        if kind == "int":
+            nulls = self._nulls[theKey][: self._numRows]
+            if rows is not None:
+                nulls = nulls[rows]
+            if nulls.any():
+                if asList:
+                    theDefault = self._defaults[theKey]
+                    return [
+                        theDefault if isNull else v
+                        for v, isNull in zip(col.tolist(), nulls.tolist())
+                    ]
+                col = col.astype(np.float64)
+                col[nulls] = np.nan
+
+        if asList:
+            return col.tolist()
+        return col
+
+    def setColumn(self, theKey: str, values):
+        """Set values of one key for all spikes.
+
+        Parameters
+        ----------
+        theKey : str
+        values : np.ndarray or list
+            One value per spike. Use fillColumn() to set one value for all spikes.
+        """
+        if len(values) != self._numRows:
+            logger.error(
+                f'Got {len(values)} values for "{theKey}" but have {self._numRows} spikes'
+            )
+            return
+
+        if (
+            not isinstance(values, np.ndarray)
+            or values.dtype == object
+            or theKey not in self._columns
+        ):
+            # list values like 'errors' must not be made into a 2D array
+            for row, value in enumerate(values):
+                self._setValue(theKey, row, value)
+            return
+
+        n = self._numRows
+        kind = self._kinds[theKey]
+        isFloat = np.issubdtype(values.dtype, np.floating)
+        isInt = np.issubdtype(values.dtype, np.integer)
+        isBool = values.dtype == bool
+
+        if kind == "int" and isFloat:
+            nulls = np.isnan(values)
+            if np.all(values[~nulls] == np.round(values[~nulls])):
+                self._columns[theKey][:n] = np.where(nulls, 0, values)
+                self._nulls[theKey][:n] = nulls
+                return
+            self._convertColumn(theKey, "float")
+            kind = "float"
+        elif kind == "int" and isInt:
+            self._columns[theKey][:n] = values
+            self._nulls[theKey][:n] = False
+            return
 
-        self._iterIdx = -1
+        if (kind == "float" and (isFloat or isInt)) or (kind == "bool" and isBool):
+            self._columns[theKey][:n] = values
+        else:
+            for row, value in enumerate(values.tolist()):
+                self._setValue(theKey, row, value)
+
+    def fillColumn(self, theKey: str, value):
+        """Set one value of a key for all spikes."""
+        n = self._numRows
+        if n == 0:
+            return
+        # first row converts the column kind if value does not fit, then broadcast it
+        self._setValue(theKey, 0, value)
+        self._columns[theKey][:n].fill(self._columns[theKey][0])
+        if self._kinds[theKey] == "int":
+            self._nulls[theKey][:n] = self._nulls[theKey][0]
 
     def setFromListDict(self, listOfDict: List[dict]):
         """Set analysis results from a list of dict.
@@ -607,148 +908,141 @@ class analysisResultList:
 
         This is assuming we re-create self every time we do spike detection
         """
+        self.__init__()
+        self._appendRows(len(listOfDict))
+        for row, oneDict in enumerate(listOfDict):
+            for k, v in oneDict.items():
+                self._setValue(k, row, v)
+
+    def setFromDataFrame(self, df: pd.DataFrame):
+        """Set analysis results from a DataFrame, one column at a time.
+
+        Used when loading sanpy.bAnalysis from h5 file.
+        """
+        self.setFromColumns({k: df[k].to_numpy() for k in df.columns}, len(df))
 
-        # do not do this, we are an analysisResultList as a list of analysisResult
-        # self._myList = listOfDict
+    def setFromColumns(self, columns: Dict[str, object], numRows: int):
+        """Set analysis results from one list (or np.ndarray) of values per key.
+
+        Used when loading sanpy.bAnalysis from h5 file, see sanpy.h5Util.loadRecording().
+        """
+        self.__init__()
+        self._appendRows(numRows)
+        for k, values in columns.items():
+            self.setColumn(k, values)
 
-        self._myList = []
-        for oneDict in listOfDict:
-            oneAnalysisResult = analysisResult(theDict=oneDict)
-            self._myList.append(oneAnalysisResult)
+    def getColumnKind(self, theKey: str) -> str:
+        """Get the storage kind of one column, one of ('int', 'float', 'bool', 'object')."""
+        return self._kinds[theKey]
 
     def analysisDate(self):
         if len(self) > 0:
-            return self._myList[0]["analysisDate"]
+            return self._getValue("analysisDate", 0)
         else:
             return None
 
     def analysisTime(self):
         if len(self) > 0:
-            return self._myList[0]["analysisTime"]
+            return self._getValue("analysisTime", 0)
         else:
             return None
 
-    def _old_save(self, saveBase):
-        savePath = saveBase + "-analysis.json"
-
-        analysisList = self.asList()
-
-        # print(analysisList[0].print())
-        print(self._myList[0])
-
-        with open(savePath, "w") as f:
-            json.dump(analysisList, f, cls=NumpyEncoder, indent=4)
-
-    def _old_load(self, loadBase):
-        loadPath = loadBase + "-analysis.json"
-
-        if not os.path.isfile(loadPath):
-            logger.error(f"Did not find file: {loadPath}")
-            return
-
-        with open(loadPath, "r") as f:
-            self._myList = json.load(f)
-
-    def appendDefault(self):
-        """Append a spike to analysis.
+    def appendDefault(self, numSpikes: int = 1):
+        """Append spike(s) to analysis.
 
         Used in bAnalysis spike detection.
         """
-        oneResult = analysisResult()
-        self._myList.append(oneResult)
-
-    def appendAnalysis(self, analysisResultList):
-        for analysisResult in analysisResultList:
-            # analysisResult is for one spike
-            self._myList.append(analysisResult)
+        self._appendRows(numSpikes)
+
+    def appendAnalysis(self, analysisResultList: "analysisResultList"):
+        """Append all spikes in another analysisResultList, column by column."""
+        start = self._numRows
+        numRows = len(analysisResultList)
+        self._appendRows(numRows)
+        stop = self._numRows
+        for k in analysisResultList.keys():
+            otherKind = analysisResultList._kinds[k]
+            if k not in self._columns:
+                self._addColumn(k, otherKind, analysisResultList._defaults[k])
+            kind = self._kinds[k]
+            if kind != otherKind:
+                if {kind, otherKind} == {"int", "float"}:
+                    newKind = "float"
+                else:
+                    newKind = "object"
+                if kind != newKind:
+                    self._convertColumn(k, newKind)
+                    kind = newKind
+            if kind == otherKind:
+                self._columns[k][start:stop] = analysisResultList._columns[k][:numRows]
+                if kind == "int":
+                    self._nulls[k][start:stop] = analysisResultList._nulls[k][:numRows]
+            else:
+                for row in range(numRows):
+                    self._columns[k][start + row] = analysisResultList._getValue(k, row)
 
     def addAnalysisResult(self, theKey, theDefault=None):
-        # go through list and add to each [i] dict
-        for spike in self:
-            spike.addNewKey(theKey, theDefault=theDefault)
+        """Add a new key (column) to all spikes, existing keys are not modified."""
+        if theKey in self._columns:
+            return
+        if theDefault is None:
+            # theType = 'float'
+            theDefault = float("nan")
+        self._addColumn(theKey, _getColumnKind("", theDefault), theDefault)
+
+    def keys(self):
+        """Names of all columns."""
+        return self._columns.keys()
 
     def asList(self):
         """
-        Return underlying list.
+        Return analysis as a list of dict, one dict per spike.
         """
-        # return [spike.asDict() for spike in self._myList]
-        return [x.asDict() for x in self._myList]
+        return [x.asDict() for x in self]
 
     def asDataFrame(self):
+        """Get all analysis results as a DataFrame.
+
+        Columns are copied so the DataFrame can be edited, use getColumn() for a read only view.
         """
-        Note: underlying _myList is a list of analysisResult
-        """
-        return pd.DataFrame(self.asList())
+        theDict = {k: self.getColumn(k) for k in self._columns.keys()}
+        return pd.DataFrame(theDict, copy=True)
 
     def __getitem__(self, key):
         """
         Allow [] indexing with self[int].
         """
-        try:
-            # return self._dDict[key]['currentValue']
-            return self._myList[key]
-        except IndexError as e:
-            logger.error(f"{e}")
-            # logger.error(f'possible keys are: {self._myList.keys()}')
+        if key < 0:
+            key += self._numRows
+        if key < 0 or key >= self._numRows:
+            logger.error(f"list index {key} out of range")
+            return
+        return analysisResult(self, key)
 
     def __len__(self):
         """Allow len() with len(this)"""
-        return len(self._myList)
+        return self._numRows
 
     def __iter__(self):
         """Allow iteration with "for item in self"
         """
-        _iterIdx = -1
-        return self
-
-    def __next__(self):
-        """Allow iteration with "for item in self"
-        """
-        self._iterIdx += 1
-        if self._iterIdx >= len(self._myList):
-            self._iterIdx = -1  # reset to initial value
-            raise StopIteration
-        else:
-            return self._myList[self._iterIdx]
+        for row in range(self._numRows):
+            yield analysisResult(self, row)
 
 
 class analysisResult:
-    def __init__(self, theDict=None):
-        """Create an anlysis item (for one spike)
+    """A view into one spike (row) of an analysisResultList.
 
-        Args:
-            theDict: Pre-existing dict when we load form h5 file
-        """
-        # this is the raw definition of analysis results (See above)
-        # pull from this to create key/value self.rDict
-        # self._dDict = analysisResultDict
-        defaultDict = analysisResultDict
-        # this is simple key/value pairs as we will in detection
-        self._rDict = {}
-        for k, v in defaultDict.items():
-            default = v["default"]
-            self._rDict[k] = default
-
-        if theDict is not None:
-            for k, v in theDict.items():
-                self[k] = v  # calls __setitem__()
-
-    # this was interfering with converting to DataFrame ???
-    """
-    def __str__(self):
-        printList = []
-        for k,v in self._rDict.items():
-            if isinstance(v, dict):
-                for k2,v2 in v.items():
-                    printList.append(f'  {k2} : {v2} {type(v2)}')
-            else:
-                printList.append(f'{k} : {v} {type(v)}')
-        return '\n'.join(printList)
+    Mimics a dict, values are get/set in the columns of the list.
     """
 
+    def __init__(self, theList: analysisResultList, row: int):
+        self._list = theList
+        self._row = row
+
     def print(self):
         printList = []
-        for k, v in self._rDict.items():
+        for k, v in self.items():
             if isinstance(v, list):
                 for item in v:
                     for k2, v2 in item.items():
@@ -759,62 +1053,41 @@ class analysisResult:
 
     def addNewKey(self, theKey, theDefault=None):
         """
-        Add a new key to this spike.
+        Add a new key to all spikes in the list.
 
         Returns: (bool) True if new key added, false if key already exists.
         """
-        if theDefault is None:
-            # theType = 'float'
-            theDefault = float("nan")
-
-        # check if key exists
-        keyExists = theKey in self._rDict.keys()
-        addedKey = False
-        if keyExists:
-            # key exists, don't modify
-            # logger.warning(f'The key "{theKey}" already exists and has value "{self._rDict[theKey]}"')
-            pass
-        else:
-            self._rDict[theKey] = theDefault
-            addedKey = True
-
-        #
-        return addedKey
+        if theKey in self._list.keys():
+            return False
+        self._list.addAnalysisResult(theKey, theDefault=theDefault)
+        return True
 
     def asDict(self):
         """
-        Returns underlying dictionary
+        Returns a (new) dictionary of key/value for this spike
         """
-        return self._rDict
+        return dict(self.items())
 
     def __getitem__(self, key):
         # to mimic a dictionary
-        ret = None
         try:
-            # return self._dDict[key]['currentValue']
-            ret = self._rDict[key]
+            return self._list._getValue(key, self._row)
         except KeyError as e:
             logger.error(f'Error getting key "{key}"')
-            logger.error(f'possible keys are: {self._rDict.keys()}')
+            logger.error(f"possible keys are: {self._list.keys()}")
             raise
-        #
-        return ret
 
     def __setitem__(self, key, value):
         # to mimic a dictionary
-        try:
-            # self._dDict[key]['currentValue'] = value
-            self._rDict[key] = value
-        except KeyError as e:
-            logger.error(f"{e}")
+        self._list._setValue(key, self._row, value)
 
     def items(self):
         # to mimic a dictionary
-        return self._rDict.items()
+        return [(k, self._list._getValue(k, self._row)) for k in self._list.keys()]
 
     def keys(self):
         # to mimic a dictionary
-        return self._rDict.keys()
+        return self._list.keys()
 
 
 def test():
@@ -5,6 +5,7 @@ import time
 import datetime
 import copy
 import json
+import concurrent.futures
 from collections import OrderedDict
 import warnings  # to catch np.polyfit -->> RankWarning: Polyfit may be poorly conditioned
 
@@ -26,6 +27,9 @@ import sanpy.user_analysis.baseUserAnalysis  # to stop circular imports
 import sanpy.h5Util
 import sanpy.fileloaders
 import sanpy.bAnalysisResults
+import sanpy.spikeFeatures
+import sanpy.detectionUtils
+import sanpy.detectionBlocks
 import sanpy._util
 
 from sanpy.fileloaders import recordingModes
@@ -35,6 +39,18 @@ from sanpy.fileloaders import recordingModes
 from sanpy.sanpyLogger import get_logger
 logger = get_logger(__name__)
 
+# bAnalysis in each worker process, see bAnalysis.spikeDetect(useProcesses=True)
+_workerAnalysis = None
+
+def _initSweepWorker(ba):
+    """Initialize one worker process with a bAnalysis (with filtered recording)."""
+    global _workerAnalysis
+    _workerAnalysis = ba
+
+def _detectSweepWorker(sweepNumber: int, chunkPnts: int = None):
+    """Detect spikes in one sweep of the worker process bAnalysis."""
+    return _workerAnalysis._detectSweep(sweepNumber, chunkPnts)
+
 class bAnalysis:
     """
     The bAnalysis class represents a whole-cell recording and provides functions for analysis.
@@ -69,17 +85,22 @@ class bAnalysis:
         fileLoaderDict: dict = None,
         stimulusFileFolder: str = None,
         verbose: bool = False,
+        fileLoader: "sanpy.fileloaders.fileLoader_base" = None,
     ):
         """
         Args:
             filepath (str): Path to either .abf or .csv with time/mV columns.
             byteStream (io.BytesIO): Binary stream for use in the cloud.
-            loadData: If true, load raw data, otherwise just load header
+            loadData: If true, load raw data, otherwise just load header.
+                Raw data is then loaded when sweeps are first used, use this
+                with _loadHdf_pytables() when only the analysis is needed.
             fileLoaderDict (dict)
                 If None then fetch from sanpy.fileloaders.getFileLoaders()
                 Do this if running in a script.
                 If running an SanPy app, we pass the dict
             stimulusFileFolder:
+            fileLoader: Use an existing file loader (for example holding data from memory),
+                filepath is ignored. See sanpy.streamDetection.
         """
 
         """
@@ -89,6 +110,9 @@ class bAnalysis:
 
         self._detectionDict: dict = None  # corresponds to an item in sanpy.bDetection
 
+        # copy of detection dict at the time of last detection, see spikeDetect(incremental=True)
+        self._analyzedDetectionDict: dict = None
+
         # sept 9, moving this to file loader
         # fileloader holds meta data
         #self._metaData = MetaData(self)  #self.getMetaDataDict()
@@ -138,7 +162,11 @@ class bAnalysis:
         # TODO (cudmore) need to parse folder of file loaders in fileloders/ and determine
         # class to use to load file (using fileLoader.filetype
         self._fileLoader = None
-        if filepath is not None and not os.path.isfile(filepath):
+        self._kymAnalysis : "sanpy.kymAnalysis" = None
+        if fileLoader is not None:
+            self._fileLoader = fileLoader
+            self.fileLoader.metadata._ba = self
+        elif filepath is not None and not os.path.isfile(filepath):
             logger.error(f'File does not exist: "{filepath}"')
             self.loadError = True
         else:
@@ -146,7 +174,7 @@ class bAnalysis:
             if fileLoaderDict is None:
                 fileLoaderDict = (
                     sanpy.fileloaders.getFileLoaders()
-                )  # EXPENSIVE, to do, pass in from app
+                )  # cached per process
             # print('2 fileLoaderDict:', fileLoaderDict)
 
             # print('1 fileLoaderDict:')
@@ -159,7 +187,7 @@ class bAnalysis:
                 if verbose:
                     logger.info(f"Loading file with extension: {_ext}")
                 constructorObject = fileLoaderDict[_ext]["constructor"]
-                self._fileLoader = constructorObject(filepath)
+                self._fileLoader = constructorObject(filepath, loadData=loadData)
                 # may 2, 2023
                 if self._fileLoader._loadError:
                     logger.error(f'load error in file loader for ext: "{_ext}"')
@@ -169,7 +197,7 @@ class bAnalysis:
                 logger.error(f'did not find a file loader for extension "{_ext}", available loaders are: {fileLoaderDict.keys()}')
                 self.loadError = True
             
-            self._kymAnalysis : sanpy.kymAnalysis = None
+            self._kymAnalysis : "sanpy.kymAnalysis" = None
             if (self.fileLoader is not None) and (self.fileLoader.recordingMode == recordingModes.kymograph):
                 if verbose:
                     logger.info('creating kymAnalysis')
@@ -207,6 +235,9 @@ class bAnalysis:
         # get default derivative
         if loadData and not self.loadError:
             self._rebuildFiltered()
+        elif not self.loadError:
+            # sweeps are filtered when first used, do not load raw data
+            self.fileLoader._getDerivative()
 
         self._detectionDirty = False
 
@@ -284,41 +315,16 @@ class bAnalysis:
         # always save as csv
         self.saveAnalysis_tocsv()
 
-        # when making df from dict, need to pass it a list
-        # o.w. key values that are lists get expanded into rows
-        if self._detectionDict is not None:
-            dfDetection = pd.DataFrame([self._detectionDict])
-
-        dfMetaData = pd.DataFrame([self.metaData])
-
-        # convert spikeList (list of dict) to json
-        # spikeList = self.spikeDict.asList()
-        # dataJson = json.dumps(spikeList, cls=NumpyEncoder)  # list of dict
-        # dfAnalysis = pd.DataFrame(spikeList)
-        if len(self.spikeDict) > 0:
-            dfAnalysis = self.spikeDict.asDataFrame()
-
         uuid = self.uuid
 
         logger.info(
             f"    Saving {self.numSpikes} spikes to uuid {uuid} in h5 file {hdfPath}"
         )
 
-        with pd.HDFStore(hdfPath) as hdfStore:
-            if self._detectionDict is not None:
-                key = uuid + "/" + "detectionDict"
-                dfDetection.to_hdf(hdfStore, key)  # default mode='a'
-
-            # always save meta data
-            key = uuid + "/" + "metaDataDict"
-            dfMetaData.to_hdf(hdfStore, key)  # default mode='a'
-            
-            # logger.warning('=== saving dfMetaData')
-            # print(dfMetaData)
-
-            if len(self.spikeDict) > 0:
-                key = uuid + "/" + "analysisList"
-                dfAnalysis.to_hdf(hdfStore, key)
+        # typed columns, replaces only this recording in the h5 file
+        sanpy.h5Util.saveRecording(
+            hdfPath, uuid, self._detectionDict, self.metaData, self.spikeDict
+        )
 
         # we saved, detection is not dirty
         self._detectionDirty = False
@@ -346,6 +352,43 @@ class bAnalysis:
 
         return uuid
     
+    def _loadHdf_legacy(self, hdfPath, uuid):
+        """Load analysis saved as pandas DataFrame(s) under 'uuid' (before sanpy.h5Util.saveRecording).
+
+        Returns
+        -------
+        (detectionDict, metaDataDict, dfAnalysis)
+            Each is None if it was not in the h5 file
+        """
+        detectionDict = None
+        metaDataDict = None
+        dfAnalysis = None
+        try:
+            detectionDictKey = uuid + "/" + "detectionDict"  # group
+            dfDetection = pd.read_hdf(hdfPath, detectionDictKey)
+            detectionDict = dfDetection.to_dict("records", into=OrderedDict)[
+                0
+            ]  # one dict
+        except KeyError as e:
+            logger.error(f'detectionDict: {e}')
+            
+        try:
+            metaDataDictKey = uuid + "/" + "metaDataDict"  # group
+            dfMetaData = pd.read_hdf(hdfPath, metaDataDictKey)
+            metaDataDict = dfMetaData.to_dict("records", into=OrderedDict)[
+                0
+            ]  # one dict
+        except KeyError as e:
+            logger.error(f'metaDataDict: {e}')
+
+        try:
+            analysisListKey = uuid + "/" + "analysisList"
+            dfAnalysis = pd.read_hdf(hdfPath, analysisListKey)
+        except KeyError as e:
+            logger.error(f'analysisList: {e}')
+
+        return detectionDict, metaDataDict, dfAnalysis
+
     def _loadHdf_pytables(self, hdfPath, uuid = None):
         """Load analysis from an h5 file using key 'uuid'.
 
@@ -376,33 +419,18 @@ class bAnalysis:
             
         # logger.info(f"loading {uuid} from {hdfPath}")
 
-        # load pandas dataframe(s) from h5 file
-        loadedDetection = False
-        loadedMetaData = False
-        loadedAnalysis = False
-        try:
-            detectionDictKey = uuid + "/" + "detectionDict"  # group
-            dfDetection = pd.read_hdf(hdfPath, detectionDictKey)
-            loadedDetection = True
-        except KeyError as e:
-            logger.error(f'detectionDict: {e}')
-            # didLoad = False
-            
-        try:
-            metaDataDictKey = uuid + "/" + "metaDataDict"  # group
-            dfMetaData = pd.read_hdf(hdfPath, metaDataDictKey)
+        loadedRecording = sanpy.h5Util.loadRecording(hdfPath, uuid)
+        if loadedRecording is not None:
+            detectionDict, loadedMetaDataDict, dfAnalysis = loadedRecording
+            loadedDetection = detectionDict is not None
             loadedMetaData = True
-        except KeyError as e:
-            logger.error(f'metaDataDict: {e}')
-            # didLoad = False
-
-        try:
-            analysisListKey = uuid + "/" + "analysisList"
-            dfAnalysis = pd.read_hdf(hdfPath, analysisListKey)
-            loadedAnalysis = True
-        except KeyError as e:
-            logger.error(f'analysisList: {e}')
-            # didLoad = False
+            loadedAnalysis = len(dfAnalysis) > 0
+        else:
+            # legacy, pandas dataframe(s) from h5 file
+            detectionDict, loadedMetaDataDict, dfAnalysis = self._loadHdf_legacy(hdfPath, uuid)
+            loadedDetection = detectionDict is not None
+            loadedMetaData = loadedMetaDataDict is not None
+            loadedAnalysis = dfAnalysis is not None
 
         # if didLoad:
         if 1:
@@ -411,10 +439,8 @@ class bAnalysis:
 
             # convert to a dict
             if loadedDetection:
-                detectionDict = dfDetection.to_dict("records", into=OrderedDict)[
-                    0
-                ]  # one dict
                 self._detectionDict = detectionDict
+                self._analyzedDetectionDict = copy.deepcopy(detectionDict)
 
             if loadedMetaData:
                 # create a child MEtaData object
@@ -425,9 +451,6 @@ class bAnalysis:
                 #metaDataDict = self.metaData.getMetaDataDict()  # default
                 metaDataDict = sanpy.MetaData.getMetaDataDict()
                 
-                loadedMetaDataDict = dfMetaData.to_dict("records", into=OrderedDict)[
-                    0
-                ]  # one dict
                 # we need to load current meta data dict with all current keys
                 # saved file may be out of date
 
@@ -450,10 +473,7 @@ class bAnalysis:
 
             # convert to a list of dict
             if loadedAnalysis:
-                analysisList = dfAnalysis.to_dict(
-                    "records", into=OrderedDict
-                )  # list of dict
-                self.spikeDict.setFromListDict(analysisList)
+                self.spikeDict.setFromDataFrame(dfAnalysis)
                 # pprint(analysisList[0])
 
                 # recreate spike analysis dataframe
@@ -565,21 +585,13 @@ class bAnalysis:
         if len(spikeList) == 0:
             return None
 
-        # logger.info(f'spikeList: {spikeList} stat:{stat}')
-        
-        retList = []
-        # count = 0
-        for idx, spike in enumerate(self.spikeDict):
-            # logger.info(f'  idx:{idx}')
-            if idx in spikeList:
-                try:
-                    val = spike[stat]
-                    retList.append(val)
-                    # count += 1
-                except KeyError as e:
-                    logger.error(e)
-        # logger.info(f'  retList: {retList}')
-        return retList
+        # in spike order, like iterating through all spikes
+        rows = sorted(set(idx for idx in spikeList if 0 <= idx < self.numSpikes))
+        try:
+            return self.spikeDict.getColumn(stat, rows=rows, asList=True)
+        except KeyError as e:
+            logger.error(e)
+            return []
 
     def setSpikeStat_time(self, startSec: int, stopSec: int, stat: str, value):
         """Set a spike stat for spikes in a range of time."""
@@ -738,23 +750,16 @@ class bAnalysis:
             Returns a np.array is asArray is True
         """
 
-        def clean(val):
-            """Convert None to float('nan')"""
-            if val is None:
-                val = float("nan")
-            return val
-
         x = []  # None
         y = []  # None
         error = False
         if len(self.spikeDict) == 0:
             # logger.error(f'Did not find any spikes in spikeDict')
             error = True
-        elif statName1 not in self.spikeDict[0].keys():
+        elif statName1 not in self.spikeDict.keys():
             logger.error(f'Did not find statName1: "{statName1}" in spikeDict')
-            # print('available stat names are:', self.spikeDict[0].keys())
             error = True
-        elif statName2 is not None and statName2 not in self.spikeDict[0].keys():
+        elif statName2 is not None and statName2 not in self.spikeDict.keys():
             logger.error(f'Did not find statName2: "{statName2}" in spikeDict')
             error = True
 
@@ -765,51 +770,40 @@ class bAnalysis:
             epochNumber = "All"
 
         if not error:
-            # original
-            # x = [clean(spike[statName1]) for spike in self.spikeDict]
-            
+            # select spikes with a mask on (sweep, epoch) columns
+            sweepMask = np.ones(len(self.spikeDict), dtype=bool)
+            if sweepNumber != "All":
+                sweepMask &= self.spikeDict.getColumn("sweep") == sweepNumber
+            mask = sweepMask
+            if epochNumber != "All":
+                mask = sweepMask & (self.spikeDict.getColumn("epoch") == epochNumber)
+
+            # as a list, int stats stay int (can be used as index), None becomes nan
+            asList = not asArray
+
             if getFullList:
                 # April 15, 2023, trying to fix bug in scatter plugin when we are
                 # using sweep and epoch
-                # strategy is to return all spikes, just nan out the ones we 
+                # strategy is to return all spikes, just nan out the ones we
                 # are not interested in
-                x = []
-                for spike in self.spikeDict:
-                    _include = \
-                        (sweepNumber == "All" or spike["sweep"] == sweepNumber) \
-                            and (epochNumber == "All" or spike["epoch"] == epochNumber)
-                    if _include:
-                        x.append(clean(spike[statName1]))
+                x = self._cleanStat(self.spikeDict.getColumn(statName1, asList=asList))
+                if not mask.all():
+                    if asList:
+                        x = [v if m else float("nan") for v, m in zip(x, mask)]
                     else:
-                        x.append(float("nan"))
-            
+                        x = x.astype(np.float64) if x.dtype.kind in "iub" else x.copy()
+                        x[~mask] = float("nan")
             else:
                 # only current sweep and epoch
-                # (1) was this
-                # was causing errors with kym diam analysis
-                x = [
-                    clean(spike[statName1])
-                    for spike in self.spikeDict
-                    if (sweepNumber == "All" or spike["sweep"] == sweepNumber)
-                    and (epochNumber == "All" or spike["epoch"] == epochNumber)
-                ]
-                # for _idx, spike in enumerate(self.spikeDict):
-                #     if (sweepNumber == "All" or spike["sweep"] == sweepNumber) and (epochNumber == "All" or spike["epoch"] == epochNumber):
-                #         try:
-                #             val = spike[statName1]
-                #         except (KeyError) as e:
-                #             logger.error(f'did not find key "{statName1}" at spike {_idx}')
-                #         clean(val)
+                x = self._cleanStat(
+                    self.spikeDict.getColumn(statName1, rows=mask, asList=asList)
+                )
 
             if statName2 is not None:
-                # original
-                # y = [clean(spike[statName2]) for spike in self.spikeDict]
-                # only current spweek
-                y = [
-                    clean(spike[statName2])
-                    for spike in self.spikeDict
-                    if sweepNumber == "All" or spike["sweep"] == sweepNumber
-                ]
+                # only current sweep
+                y = self._cleanStat(
+                    self.spikeDict.getColumn(statName2, rows=sweepMask, asList=asList)
+                )
 
         if asArray:
             x = np.array(x)
@@ -821,6 +815,17 @@ class bAnalysis:
         else:
             return x
 
+    def _cleanStat(self, values):
+        """Convert None to float('nan') in values from getStat()."""
+        if isinstance(values, list):
+            if None in values:
+                values = [float("nan") if v is None else v for v in values]
+        elif values.dtype == object:
+            values = np.array(
+                [float("nan") if v is None else v for v in values], dtype=object
+            )
+        return values
+
     def getSpikeTimes(self, sweepNumber=None, epochNumber='All'):
         """Get spike times (points) for current sweep"""
         # theRet = [spike['thresholdPnt'] for spike in self.spikeDict if spike['sweep']==self.currentSweep]
@@ -850,9 +855,9 @@ class bAnalysis:
         return self.spikeDict[spikeNumber]
 
     def _rebuildFiltered(self):
-        if self.fileLoader.sweepX is None:
+        if not self.fileLoader.isRawDataLoaded():
             # no data
-            logger.warning("not getting derivative ... sweepX was none?")
+            logger.warning("not getting derivative ... sweepY was none?")
             return
 
         self.fileLoader._getDerivative()
@@ -905,126 +910,117 @@ class bAnalysis:
         # else:
         #     self._filteredVm = self.sweepY
 
-    def _backupSpikeVm(self, spikeTimes, sweepNumber, medianFilter=None):
+    def _backupSpikeVm(self, spikeTimes, sweepNumber, medianFilter=None, block=None):
         """
         Backup spike time using deminishing SD and diff b/w vm at pnt[i]-pnt[i-1]
         Used when detecting with just mV threshold (not dv/dt)
 
+        For each spike, step back one bin at a time (up to maxNumPntsToBackup bins)
+        until the difference in mean between adjacent bins is less than sdMult * SD.
+        The mean and SD of every bin come from rolling statistics of the (cached)
+        median filtered sweep, all spikes and steps are evaluated at once.
+
         Args:
             spikeTimes (list of float):
             medianFilter (int): bin width
+            block (sanpy.detectionBlocks.detectionBlock): If not None, spikeTimes are in this block
         """
-        # realSpikeTimePnts = [np.nan] * self.numSpikes
-        realSpikeTimePnts = [np.nan] * len(spikeTimes)
-
         medianFilter = 5
-        sweepY = self.fileLoader.sweepY
-        if medianFilter > 0:
-            myVm = scipy.signal.medfilt(sweepY, medianFilter)
+        if block is not None:
+            myVm = block.getMedianFiltered(medianFilter) if medianFilter > 0 else block.sweepY
+        elif medianFilter > 0:
+            myVm = self.fileLoader.getMedianFilteredSweep(sweepNumber, medianFilter)
         else:
-            myVm = sweepY
+            myVm = self.fileLoader.getSweepY(sweepNumber)
 
-        #
-        # TODO: this is going to fail if spike is at start/stop of recorrding
-        #
+        spikeTimes = np.asarray(spikeTimes, dtype=np.int64)
 
         maxNumPntsToBackup = 20  # todo: add _ms
         bin_ms = 1
         bin_pnts = round(bin_ms * self.fileLoader.dataPointsPerMs)
         half_bin_pnts = math.floor(bin_pnts / 2)
-        for idx, spikeTimePnts in enumerate(spikeTimes):
-            foundRealThresh = False
-            thisMean = None
-            thisSD = None
-            backupNumPnts = 0
-            atBinPnt = spikeTimePnts
-            while not foundRealThresh:
-                thisWin = myVm[atBinPnt - half_bin_pnts : atBinPnt + half_bin_pnts]
-                if thisMean is None:
-                    thisMean = np.mean(thisWin)
-                    thisSD = np.std(thisWin)
-
-                nextStart = atBinPnt - 1 - bin_pnts - half_bin_pnts
-                nextStop = atBinPnt - 1 - bin_pnts + half_bin_pnts
-                nextWin = myVm[nextStart:nextStop]
-                nextMean = np.mean(nextWin)
-                nextSD = np.std(nextWin)
-
-                meanDiff = thisMean - nextMean
-                # logic
-                sdMult = 0.7  # 2
-                if (meanDiff < nextSD * sdMult) or (
-                    backupNumPnts == maxNumPntsToBackup
-                ):
-                    # second clause will force us to terminate (this recording has a very slow rise time)
-                    # bingo!
-                    foundRealThresh = True
-                    # not this xxx but the previous
-                    moveForwardPnts = 4
-                    backupNumPnts = backupNumPnts - 1  # the prev is thresh
-                    if backupNumPnts < moveForwardPnts:
-                        logger.warning(
-                            f"spike {idx} backupNumPnts:{backupNumPnts} < moveForwardPnts:{moveForwardPnts}"
-                        )
-                        # print('  -->> not adjusting spike time')
-                        realBackupPnts = backupNumPnts - 0
-                        realPnt = spikeTimePnts - (realBackupPnts * bin_pnts)
-
-                    else:
-                        realBackupPnts = backupNumPnts - moveForwardPnts
-                        realPnt = spikeTimePnts - (realBackupPnts * bin_pnts)
-                    #
-                    realSpikeTimePnts[idx] = realPnt
-
-                # increment
-                thisMean = nextMean
-                thisSD = nextSD
-
-                atBinPnt -= bin_pnts
-                backupNumPnts += 1
-                """
-                if backupNumPnts>maxNumPntsToBackup:
-                    print(f'  WARNING: _backupSpikeVm() exiting spike {idx} ... reached maxNumPntsToBackup:{maxNumPntsToBackup}')
-                    print('  -->> not adjusting spike time')
-                    foundRealThresh = True # set this so we exit the loop
-                    realSpikeTimePnts[idx] = spikeTimePnts
-                """
+        sdMult = 0.7  # 2
+        moveForwardPnts = 4
+
+        # rolling statistics of every bin myVm[i:i+2*half_bin_pnts], once per sweep
+        numPnts = len(myVm)
+        binWidth = 2 * half_bin_pnts
+        rollingMean, rollingSD = sanpy.analysisUtil.rollingMeanStd(myVm, binWidth)
+
+        def _binStats(startPnt):
+            """Mean and SD of myVm[startPnt:startPnt+binWidth], nan if not a full bin."""
+            if len(rollingMean) == 0:
+                return np.full(startPnt.shape, np.nan), np.full(startPnt.shape, np.nan)
+            isValid = (startPnt >= 0) & (startPnt < len(rollingMean))
+            startPnt = np.where(isValid, startPnt, 0)
+            binMean = np.where(isValid, rollingMean[startPnt], np.nan)
+            binSD = np.where(isValid, rollingSD[startPnt], np.nan)
+            return binMean, binSD
+
+        # (spikes, steps), step k compares bin k with the bin before it
+        steps = np.arange(maxNumPntsToBackup + 1)
+        atBinPnt = spikeTimes[:, np.newaxis] - steps[np.newaxis, :] * bin_pnts
+        nextStart = atBinPnt - 1 - bin_pnts - half_bin_pnts
+        nextMean, nextSD = _binStats(nextStart)
+
+        firstMean, _firstSD = _binStats(spikeTimes - half_bin_pnts)
+        # first bin is centered on the spike and can run past the end of the sweep
+        for idx in np.flatnonzero(spikeTimes + half_bin_pnts > numPnts):
+            with warnings.catch_warnings():
+                warnings.simplefilter("ignore", category=RuntimeWarning)
+                firstMean[idx] = np.mean(
+                    myVm[max(spikeTimes[idx] - half_bin_pnts, 0) : numPnts]
+                )
+        thisMean = np.concatenate((firstMean[:, np.newaxis], nextMean[:, :-1]), axis=1)
+
+        meanDiff = thisMean - nextMean
+        # last step will force us to terminate (this recording has a very slow rise time)
+        isThresh = meanDiff < nextSD * sdMult
+        isThresh[:, -1] = True
+        backupNumPnts = np.argmax(isThresh, axis=1)
+
+        # not this xxx but the previous
+        backupNumPnts = backupNumPnts - 1  # the prev is thresh
+        tooFew = backupNumPnts < moveForwardPnts
+        for idx in np.flatnonzero(tooFew):
+            logger.warning(
+                f"spike {idx} backupNumPnts:{backupNumPnts[idx]} < moveForwardPnts:{moveForwardPnts}"
+            )
+        realBackupPnts = np.where(tooFew, backupNumPnts, backupNumPnts - moveForwardPnts)
+        realSpikeTimePnts = spikeTimes - (realBackupPnts * bin_pnts)
 
         #
-        return realSpikeTimePnts
+        return list(realSpikeTimePnts)
 
-    def _throwOutRefractory(self, spikeTimes0, goodSpikeErrors, refractory_ms=20):
+    def _throwOutRefractory(
+        self, spikeTimes0, goodSpikeErrors, refractory_ms=20, block=None
+    ):
         """
         spikeTimes0: spike times to consider
         goodSpikeErrors: list of errors per spike, can be None
         refractory_ms:
+        block: If not None, continue from the last good spike in the blocks before
         """
         before = len(spikeTimes0)
 
         # if there are doubles, throw-out the second one
-        # refractory_ms = 20 #10 # remove spike [i] if it occurs within refractory_ms of spike [i-1]
-        lastGood = 0  # first spike [0] will always be good, there is no spike [i-1]
-        for i in range(len(spikeTimes0)):
-            if i == 0:
-                # first spike is always good
-                continue
-            dPoints = spikeTimes0[i] - spikeTimes0[lastGood]
-            if dPoints < self.fileLoader.dataPointsPerMs * refractory_ms:
-                # remove spike time [i]
-                spikeTimes0[i] = 0
-            else:
-                # spike time [i] was good
-                lastGood = i
-        # regenerate spikeTimes0 by throwing out any spike time that does not pass 'if spikeTime'
-        # spikeTimes[i] that were set to 0 above (they were too close to the previous spike)
-        # will not pass 'if spikeTime', as 'if 0' evaluates to False
+        # remove spike [i] if it occurs within refractory_ms of the last good spike
+        refractoryPnts = self.fileLoader.dataPointsPerMs * refractory_ms
+        if block is None:
+            goodMask = sanpy.detectionUtils.getRefractoryMask(
+                spikeTimes0, refractoryPnts
+            )
+        else:
+            goodMask = block.getRefractoryMask(
+                "refractory", spikeTimes0, refractoryPnts
+            )
         if goodSpikeErrors is not None:
             goodSpikeErrors = [
-                goodSpikeErrors[idx]
-                for idx, spikeTime in enumerate(spikeTimes0)
-                if spikeTime
+                spikeError
+                for spikeError, isGood in zip(goodSpikeErrors, goodMask)
+                if isGood
             ]
-        spikeTimes0 = [spikeTime for spikeTime in spikeTimes0 if spikeTime]
+        spikeTimes0 = list(np.asarray(spikeTimes0, dtype=np.int64)[goodMask])
 
         # TODO: put back in and log if detection ['verbose']
         after = len(spikeTimes0)
@@ -1035,141 +1031,6 @@ class bAnalysis:
 
         return spikeTimes0, goodSpikeErrors
 
-    def _getHalfWidth(
-        self,
-        vm,
-        iIdx,
-        spikeDict,
-        thresholdPnt,
-        peakPnt,
-        hwWindowPnts,
-        dataPointsPerMs,
-        halfHeightList,
-        verbose=False,
-    ):
-        """
-        Get half-widhts for one spike.
-
-        Note: Want to make this standalone function outside of class but we need self._getErrorDict()
-
-        Args:
-            vm ():
-            iIdx (int):
-            spikeDict (): new 20210928
-            #dictNumber (int):
-            thresholdPnt (int): AP threshold crossing
-            peakPnt (int): AP peak
-            hwWindowPnts (int): Window to look after peakPnt for falling vm
-            dataPointsPerMs (int):
-            halfHeightList (list): List of half-height [10,20,50,80,90]
-        """
-
-        halfWidthWindow_ms = hwWindowPnts / dataPointsPerMs
-
-        thresholdVal = vm[thresholdPnt]
-        peakVal = vm[peakPnt]
-        spikeHeight = peakVal - thresholdVal
-
-        spikeSecond = thresholdPnt / dataPointsPerMs / 1000
-        peakSec = peakPnt / dataPointsPerMs / 1000
-
-        widthDictList = []
-        errorList = []
-
-        # clear out any existing list
-        spikeDict[iIdx]["widths"] = []
-
-        tmpErrorType = None
-        for j, halfHeight in enumerate(halfHeightList):
-            # halfHeight in [20, 50, 80]
-
-            # search rising/falling phae of vm for this vm
-            thisVm = thresholdVal + spikeHeight * (halfHeight * 0.01)
-
-            # todo: logic is broken, this get over-written in following try
-            widthDict = {
-                "halfHeight": halfHeight,
-                "risingPnt": None,
-                #'risingVal': defaultVal,
-                "fallingPnt": None,
-                #'fallingVal': defaultVal,
-                "widthPnts": None,
-                "widthMs": float("nan"),
-            }
-            widthMs = float("nan")
-            try:
-                postRange = vm[peakPnt : peakPnt + hwWindowPnts]
-                fallingPnt = np.where(postRange < thisVm)[0]  # less than
-                if len(fallingPnt) == 0:
-                    # no falling pnts found within hwWindowPnts
-                    tmpErrorType = "falling point"
-                    raise IndexError
-                fallingPnt = fallingPnt[0]  # first falling point
-                fallingPnt += peakPnt
-                fallingVal = vm[fallingPnt]
-
-                # use the post/falling to find pre/rising
-                preRange = vm[thresholdPnt:peakPnt]
-                risingPnt = np.where(preRange > fallingVal)[0]  # greater than
-                if len(risingPnt) == 0:
-                    tmpErrorType = "rising point"
-                    raise IndexError
-                risingPnt = risingPnt[0]  # first rising point
-                risingPnt += thresholdPnt
-                # risingVal = vm[risingPnt]
-
-                # width (pnts)
-                widthPnts = fallingPnt - risingPnt
-                widthMs = widthPnts / dataPointsPerMs
-                # 20210825 may want to add this to analysis
-                # widthPnts2 = fallingPnt - thresholdPnt
-                # assign
-                widthDict["halfHeight"] = halfHeight
-                widthDict["risingPnt"] = risingPnt
-                # widthDict['risingVal'] = risingVal
-                widthDict["fallingPnt"] = fallingPnt
-                # widthDict['fallingVal'] = fallingVal
-                widthDict["widthPnts"] = widthPnts
-                widthDict["widthMs"] = widthMs
-                # widthMs = widthPnts / dataPointsPerMs # abb 20210125
-
-                # may want to add this
-                # widthDict['widthPnts2'] = widthPnts2
-                # widthDict['widthMs2'] = widthPnts2 / dataPointsPerMs
-
-            except IndexError as e:
-                errorType = "Spike Width"
-                errorStr = (
-                    f'Half width {halfHeight} error in "{tmpErrorType}" '
-                    f"with halfWidthWindow_ms:{halfWidthWindow_ms} "
-                    f"searching for Vm:{round(thisVm,2)} from peak sec {round(peakSec,2)}"
-                )
-
-                # was this
-                # eDict = self._getErrorDict(spikeNumber, thresholdPnt, errorType, errorStr) # spikeTime is in pnts
-                eDict = self._getErrorDict(
-                    iIdx, thresholdPnt, errorType, errorStr
-                )  # spikeTime is in pnts
-                # self.spikeDict[dictNumber]['errors'].append(eDict)
-                spikeDict[iIdx]["errors"].append(eDict)
-                if verbose:
-                    print(
-                        f"_getHalfWidth() error iIdx:{iIdx} j:{j} halfHeight:{halfHeight} eDict:{eDict}"
-                    )
-            #
-            # self.spikeDict[dictNumber]['widths_'+str(halfHeight)] = widthMs
-            # self.spikeDict[dictNumber]['widths'][j] = widthDict
-
-            # logger.info('================')
-            # print(f'len(spikeDict):{len(spikeDict)} iIdx:{iIdx} j:{j} widthDict:{widthDict}')
-
-            spikeDict[iIdx]["widths_" + str(halfHeight)] = widthMs
-            # spikeDict[iIdx]['widths'][j] = widthDict
-            spikeDict[iIdx]["widths"].append(widthDict)
-
-        #
-        # return widthDictList, errorList
-
     def _getErrorDict(self, spikeNumber, pnt, _type : str, detailStr) -> dict:
         """Get error dict for one spike
         
@@ -1178,77 +1039,80 @@ class bAnalysis:
         Can't use self.getSpikeStat() because it is not created yet.
             We are in the middle of analysis
         """
-        sec = self.fileLoader.pnt2Sec_(pnt)  # pnt / self.dataPointsPerMs / 1000
-        sec = round(sec, 4)
+        return sanpy.spikeFeatures.getErrorDict(
+            spikeNumber, pnt, _type, detailStr, self.fileLoader.dataPointsPerMs
+        )
 
-        # print(f'  spikeNumber: {spikeNumber} {type(spikeNumber)}')
-        # print('    sweep:', self.getSpikeStat([spikeNumber], 'sweep'))
+    def _reduceByStartStop(self, spikeTimes: np.ndarray, dDict: dict) -> np.ndarray:
+        """Keep spike times between detection startSeconds and stopSeconds.
 
-        eDict = {
-            "Spike": spikeNumber,
-            "Seconds": sec,
-            "Sweep": '',  # self.getSpikeStat([spikeNumber], 'sweep')[0],
-            "Epoch": '',  # self.getSpikeStat([spikeNumber], 'epoch')[0],
-            "Type": _type,
-            "Details": detailStr,
-        }
-        return eDict
+        Both startSeconds and stopSeconds need to be specified, otherwise keep all spike times.
+        """
+        # logger.error('THIS IS a BUg if start sec is none then set to 0 !!!')
+        if dDict["startSeconds"] is not None and dDict["stopSeconds"] is not None:
+            startPnt = self.fileLoader.dataPointsPerMs * (
+                dDict["startSeconds"] * 1000
+            )  # seconds to pnt
+            stopPnt = self.fileLoader.dataPointsPerMs * (
+                dDict["stopSeconds"] * 1000
+            )  # seconds to pnt
+            goodMask = sanpy.detectionUtils.getTimeWindowMask(
+                spikeTimes, startPnt, stopPnt
+            )
+            spikeTimes = spikeTimes[goodMask]
+        return spikeTimes
 
-    def _spikeDetect_dvdt(self, dDict: dict, sweepNumber: int, verbose: bool = False):
+    def _spikeDetect_dvdt(
+        self, dDict: dict, sweepNumber: int, verbose: bool = False, block=None
+    ):
         """
         Search for threshold crossings (dvdtThreshold) in first derivative (dV/dt) of membrane potential (Vm)
         append each threshold crossing (e.g. a spike) in self.spikeTimes list
 
+        Args:
+            block (sanpy.detectionBlocks.detectionBlock): If not None, detect threshold crossings
+                in the core of this block, spike times are local to the block
+
         Returns:
             self.spikeTimes (pnts): the time before each threshold crossing when dv/dt crosses 15% of its max
             self.filteredVm:
             self.filtereddVdt:
         """
 
-        #
-        # analyze full recording
-        filteredDeriv = self.fileLoader.filteredDeriv
-        Is = np.where(filteredDeriv > dDict["dvdtThreshold"])[0]
-        Is = np.concatenate(([0], Is))
-        Ds = Is[:-1] - Is[1:] + 1
-        spikeTimes0 = Is[np.where(Ds)[0] + 1]
+        if block is None:
+            # analyze full recording
+            filteredDeriv = self.fileLoader.getFilteredDeriv(sweepNumber)
+            sweepY = self.fileLoader.getSweepY(sweepNumber)
+            startPnt = 0
+            spikeOffset = 0
+        else:
+            filteredDeriv = block.filteredDeriv
+            sweepY = block.sweepY
+            startPnt = block.startPnt
+            spikeOffset = block.state["numCrossings"]
+
+        spikeTimes0 = sanpy.detectionUtils.getThreshold_firstDerivative(
+            None, dDict["dvdtThreshold"], firstDerivative=filteredDeriv
+        )
+        if block is not None:
+            spikeTimes0 = spikeTimes0[block.getCoreMask(spikeTimes0)]
 
         #
         # reduce spike times based on start/stop
-        # logger.error('THIS IS a BUg if start sec is none then set to 0 !!!')
-        # THIS IS ABUG ... FIX
-        if dDict["startSeconds"] is not None and dDict["stopSeconds"] is not None:
-            startPnt = self.fileLoader.dataPointsPerMs * (
-                dDict["startSeconds"] * 1000
-            )  # seconds to pnt
-            stopPnt = self.fileLoader.dataPointsPerMs * (
-                dDict["stopSeconds"] * 1000
-            )  # seconds to pnt
-            tmpSpikeTimes = [
-                spikeTime
-                for spikeTime in spikeTimes0
-                if (spikeTime >= startPnt and spikeTime <= stopPnt)
-            ]
-            spikeTimes0 = tmpSpikeTimes
+        spikeTimes0 = self._reduceByStartStop(spikeTimes0 + startPnt, dDict) - startPnt
 
         #
         # throw out all spikes that are below a threshold Vm (usually below -20 mV)
         peakWindow_pnts = self.fileLoader.ms2Pnt_(dDict["peakWindow_ms"])
-        # peakWindow_pnts = self.dataPointsPerMs * dDict['peakWindow_ms']
-        # peakWindow_pnts = round(peakWindow_pnts)
-        goodSpikeTimes = []
-        sweepY = self.fileLoader.sweepY
-        for spikeTime in spikeTimes0:
+        peakVals = sanpy.analysisUtil.windowMax(sweepY, spikeTimes0, peakWindow_pnts)
+        emptyWindow = (spikeTimes0 >= len(sweepY)) | (peakWindow_pnts <= 0)
+        if emptyWindow.any():
             # wu-lab-stanford data
-            try:
-                peakVal = np.max(sweepY[spikeTime : spikeTime + peakWindow_pnts])
-                if peakVal > dDict["mvThreshold"]:
-                    goodSpikeTimes.append(spikeTime)
-            except (ValueError) as e:
-                logger.error(e)
-                logger.error(f'   spikeTime:{spikeTime} peakWindow_pnts:{peakWindow_pnts}')
-                logger.error(f'   _dataPointsPerMs: {self.fileLoader._dataPointsPerMs}')
-        spikeTimes0 = goodSpikeTimes
+            logger.error(
+                f"   {emptyWindow.sum()} empty peak windows, spikeTimes:{spikeTimes0[emptyWindow]} peakWindow_pnts:{peakWindow_pnts}"
+            )
+            logger.error(f'   _dataPointsPerMs: {self.fileLoader._dataPointsPerMs}')
+        spikeTimes0 = spikeTimes0[peakVals > dDict["mvThreshold"]]
 
         #
         # throw out spike that are not upward deflections of Vm
@@ -1268,7 +1132,10 @@ class bAnalysis:
         # if there are doubles, throw-out the second one
         spikeTimeErrors = None
         spikeTimes0, ignoreSpikeErrors = self._throwOutRefractory(
-            spikeTimes0, spikeTimeErrors, refractory_ms=dDict["refractory_ms"]
+            spikeTimes0,
+            spikeTimeErrors,
+            refractory_ms=dDict["refractory_ms"],
+            block=block,
         )
 
         # logger.warning('REMOVED SPIKE TOP AS % OF DVDT')
@@ -1283,7 +1150,6 @@ class bAnalysis:
         window_pnts = round(window_pnts)
         spikeTimes1 = []
         spikeErrorList1 = []
-        filteredDeriv = self.fileLoader.filteredDeriv
         for i, spikeTime in enumerate(spikeTimes0):
             # get max in derivative
 
@@ -1336,7 +1202,7 @@ class bAnalysis:
                     errorType = "dvdt Percent"
                     errStr = f"Did not find dvdt_percentOfMax: {dDict['dvdt_percentOfMax']} peak dV/dt is {round(peakVal,2)}"
                     eDict = self._getErrorDict(
-                        i, spikeTime, errorType, errStr
+                        i + spikeOffset, spikeTime + startPnt, errorType, errStr
                     )  # spikeTime is in pnts
                     spikeErrorList1.append(eDict)
                     # always append, do not REJECT spike if we can't find % in dv/dt
@@ -1353,38 +1219,41 @@ class bAnalysis:
 
         return spikeTimes1, spikeErrorList1
 
-    def _spikeDetect_vm(self, dDict: dict, sweepNumber: int, verbose: bool = False):
+    def _spikeDetect_vm(
+        self, dDict: dict, sweepNumber: int, verbose: bool = False, block=None
+    ):
         """
         spike detect using Vm threshold and NOT dvdt
         append each threshold crossing (e.g. a spike) in self.spikeTimes list
 
+        Args:
+            block (sanpy.detectionBlocks.detectionBlock): If not None, detect threshold crossings
+                in the core of this block, spike times are local to the block
+
         Returns:
             self.spikeTimes (pnts): the time before each threshold crossing when dv/dt crosses 15% of its max
             self.filteredVm:
             self.filtereddVdt:
         """
 
-        filteredVm = self.fileLoader.sweepY_filtered
-        Is = np.where(filteredVm > dDict["mvThreshold"])[0]  # returns boolean array
-        Is = np.concatenate(([0], Is))
-        Ds = Is[:-1] - Is[1:] + 1
-        spikeTimes0 = Is[np.where(Ds)[0] + 1]
+        if block is None:
+            filteredVm = self.fileLoader.getSweepY_filtered(sweepNumber)
+            sweepY = self.fileLoader.getSweepY(sweepNumber)
+            startPnt = 0
+        else:
+            filteredVm = block.filteredVm
+            sweepY = block.sweepY
+            startPnt = block.startPnt
+
+        spikeTimes0 = sanpy.detectionUtils.getThreshold_vm(
+            filteredVm, dDict["mvThreshold"]
+        )
+        if block is not None:
+            spikeTimes0 = spikeTimes0[block.getCoreMask(spikeTimes0)]
 
         #
         # reduce spike times based on start/stop
-        if dDict["startSeconds"] is not None and dDict["stopSeconds"] is not None:
-            startPnt = self.fileLoader.dataPointsPerMs * (
-                dDict["startSeconds"] * 1000
-            )  # seconds to pnt
-            stopPnt = self.fileLoader.dataPointsPerMs * (
-                dDict["stopSeconds"] * 1000
-            )  # seconds to pnt
-            tmpSpikeTimes = [
-                spikeTime
-                for spikeTime in spikeTimes0
-                if (spikeTime >= startPnt and spikeTime <= stopPnt)
-            ]
-            spikeTimes0 = tmpSpikeTimes
+        spikeTimes0 = self._reduceByStartStop(spikeTimes0 + startPnt, dDict) - startPnt
 
         spikeErrorList = [None] * len(spikeTimes0)
 
@@ -1405,40 +1274,43 @@ class bAnalysis:
 
         #
         # throw out spike that are NOT upward deflections of Vm
-        tmpLastGoodSpike_pnts = None
         # minISI_pnts = 5000 # at 20 kHz this is 0.25 sec
         minISI_ms = 75  # 250
         minISI_pnts = self.fileLoader.ms2Pnt_(minISI_ms)
 
         prePntUp = 10  # pnts
-        goodSpikeTimes = []
-        goodSpikeErrors = []
-        sweepY = self.fileLoader.sweepY
-        for tmpIdx, spikeTime in enumerate(spikeTimes0):
-            tmpFuckPreClip = sweepY[
-                spikeTime - prePntUp : spikeTime
-            ]  # not including the stop index
-            tmpFuckPostClip = sweepY[
-                spikeTime + 1 : spikeTime + prePntUp + 1
-            ]  # not including the stop index
-            preAvg = np.average(tmpFuckPreClip)
-            postAvg = np.average(tmpFuckPostClip)
-            if postAvg > preAvg:
-                # tmpSpikeTimeSec = self.fileLoader.pnt2Sec_(spikeTime)
-                if (
-                    tmpLastGoodSpike_pnts is not None
-                    and (spikeTime - tmpLastGoodSpike_pnts) < minISI_pnts
-                ):
-                    continue
-                goodSpikeTimes.append(spikeTime)
-                goodSpikeErrors.append(spikeErrorList[tmpIdx])
-                tmpLastGoodSpike_pnts = spikeTime
-            else:
-                tmpSpikeTimeSec = self.fileLoader.pnt2Sec_(spikeTime)
+
+        # average of prePntUp before (not including) and after each spike
+        preAvg = np.full(len(spikeTimes0), np.nan)
+        hasPre = spikeTimes0 >= prePntUp
+        preAvg[hasPre] = sanpy.analysisUtil.windowMean(
+            sweepY, spikeTimes0[hasPre] - prePntUp, prePntUp
+        )
+        postAvg = sanpy.analysisUtil.windowMean(
+            sweepY, spikeTimes0 + 1, prePntUp, lengths=len(sweepY) - spikeTimes0 - 1
+        )
+        isUp = postAvg > preAvg
+
+        # of the upward deflections, keep spikes at least minISI_pnts after the last good spike
+        goodIdx = np.flatnonzero(isUp)
+        if block is None:
+            minIsiMask = sanpy.detectionUtils.getRefractoryMask(
+                spikeTimes0[goodIdx], minISI_pnts
+            )
+        else:
+            minIsiMask = block.getRefractoryMask(
+                "minISI", spikeTimes0[goodIdx], minISI_pnts
+            )
+        goodIdx = goodIdx[minIsiMask]
+        goodSpikeTimes = list(spikeTimes0[goodIdx])
+        goodSpikeErrors = [spikeErrorList[idx] for idx in goodIdx]
 
         # todo: add this to spikeDetect_dvdt()
         goodSpikeTimes, goodSpikeErrors = self._throwOutRefractory(
-            goodSpikeTimes, goodSpikeErrors, refractory_ms=dDict["refractory_ms"]
+            goodSpikeTimes,
+            goodSpikeErrors,
+            refractory_ms=dDict["refractory_ms"],
+            block=block,
         )
         spikeTimes0 = goodSpikeTimes
         spikeErrorList = goodSpikeErrors
@@ -1446,14 +1318,41 @@ class bAnalysis:
         #
         return spikeTimes0, spikeErrorList
 
-    def spikeDetect(self, detectionDict: dict):
+    def spikeDetect(
+        self,
+        detectionDict: dict,
+        numWorkers: int = 1,
+        useProcesses: bool = False,
+        incremental: bool = False,
+        chunkSeconds: float = None,
+    ):
         """Run spike detection for all sweeps.
 
         Each spike is a row and has 'sweep'
 
         Args:
             detectionDict: From sanpy.bDetection
-        """
+            numWorkers: Number of sweeps to detect concurrently.
+                Use 1 to detect one sweep after another, None for one worker per cpu.
+            useProcesses: If True use a process pool, otherwise a thread pool.
+                Only used when numWorkers is not 1.
+            incremental: If True and only feature parameters changed since the last detection
+                (like halfHeights or mdp_ms), only recompute the features that depend on them
+                for the existing spikes. See sanpy.spikeFeatures.getInvalidFeatureGroups().
+            chunkSeconds: If not None, detect each sweep in overlapping blocks of chunkSeconds
+                so filtered traces are never held for the whole sweep (for very long gap-free recordings).
+                Results are the same as detecting the whole sweep, see sanpy.detectionBlocks.
+        """
+
+        if incremental and self._isAnalyzed and self._analyzedDetectionDict is not None:
+            groups = sanpy.spikeFeatures.getInvalidFeatureGroups(
+                self._analyzedDetectionDict, detectionDict
+            )
+            if groups is not None:
+                self._detectionDict = detectionDict
+                self._analyzedDetectionDict = copy.deepcopy(detectionDict)
+                self._updateFeatures(groups)
+                return
 
         rememberSweep = (
             self.fileLoader.currentSweep
@@ -1466,6 +1365,7 @@ class bAnalysis:
         #
 
         self._detectionDict = detectionDict
+        self._analyzedDetectionDict = copy.deepcopy(detectionDict)
 
         if detectionDict["verbose"]:
             logger.info("=== detectionDict is:")
@@ -1481,9 +1381,65 @@ class bAnalysis:
 
         # self._spikesPerSweep = [0] * self.fileLoader.numSweeps
 
-        for sweepNumber in self.fileLoader.sweepList:
-            # self.setSweep(sweep)
-            self._spikeDetect2(sweepNumber)
+        now = datetime.datetime.now()
+        self.dateAnalyzed = now.strftime("%Y%m%d")
+
+        # filter all sweeps once, each sweep then uses fileLoader.getSweepY(sweep) etc.
+        self._getFilteredRecording()
+
+        chunkPnts = None
+        if chunkSeconds is not None:
+            chunkPnts = round(chunkSeconds * 1000 * self.fileLoader.dataPointsPerMs)
+
+        sweepList = list(self.fileLoader.sweepList)
+        chunkList = [chunkPnts] * len(sweepList)
+        if numWorkers is None or numWorkers > 1:
+            if useProcesses:
+                with concurrent.futures.ProcessPoolExecutor(
+                    max_workers=numWorkers,
+                    initializer=_initSweepWorker,
+                    initargs=(self,),
+                ) as executor:
+                    sweepResults = list(
+                        executor.map(_detectSweepWorker, sweepList, chunkList)
+                    )
+            else:
+                with concurrent.futures.ThreadPoolExecutor(
+                    max_workers=numWorkers
+                ) as executor:
+                    sweepResults = list(
+                        executor.map(self._detectSweep, sweepList, chunkList)
+                    )
+        else:
+            sweepResults = [
+                self._detectSweep(sweepNumber, chunkPnts) for sweepNumber in sweepList
+            ]
+
+        # merge in sweep order
+        for sweepResult in sweepResults:
+            if sweepResult is not None:
+                self.spikeDict.appendAnalysis(sweepResult)
+
+        # keep track of total spike number across sweeps
+        self.spikeDict.setColumn("spikeNumber", np.arange(len(self.spikeDict)))
+
+        #
+        # spike clips
+        self.spikeClips = None
+        self.spikeClips_x = None
+        self.spikeClips_x2 = None
+
+        # run all user analysis ... what if this fails ???
+        sanpy.user_analysis.baseUserAnalysis.runAllUserAnalysis(self)
+
+        # generate a df holding stats (used by scatterplotwidget)
+        self.regenerateAnalysisDataFrame()
+
+        # generate error report
+        self.dfError = self.getErrorReport()
+
+        # bAnalysis needs to be saved
+        self._detectionDirty = True
 
         #
         self.fileLoader.setSweep(rememberSweep)
@@ -1495,10 +1451,168 @@ class bAnalysis:
                 f"Detected {len(self.spikeDict)} spikes in {round(stopTime-startTime,3)} seconds"
             )
 
-    def _spikeDetect2(self, sweepNumber: int):
+    def _updateFeatures(self, groups: List[str]):
+        """Recompute feature groups for the existing spikes, keep spike times and peaks.
+
+        Parameters
+        ----------
+        groups : list of str
+            Feature groups from sanpy.spikeFeatures.featureGroups
+        """
+        startTime = time.time()
+
+        dDict = self._detectionDict
+        numSpikes = self.numSpikes
+
+        if groups and numSpikes > 0:
+            # filtered sweeps are cached, filter params did not change
+            self._getFilteredRecording()
+
+            sweeps = self.spikeDict.getColumn("sweep")
+            thresholdPnt = self.spikeDict.getColumn("thresholdPnt")
+            peakPnt = self.spikeDict.getColumn("peakPnt")
+            peakVal = self.spikeDict.getColumn("peakVal")
+            errors = self.spikeDict.getColumn("errors", asList=True)
+
+            features = {}
+            for sweepNumber in self.fileLoader.sweepList:
+                rows = np.flatnonzero(sweeps == sweepNumber)
+                if len(rows) == 0:
+                    continue
+                sweepFeatures, sweepErrors = sanpy.spikeFeatures.getSpikeFeatures(
+                    self.fileLoader.getSweepX(sweepNumber),
+                    self.fileLoader.getSweepY_filtered(sweepNumber),
+                    self.fileLoader.getFilteredDeriv(sweepNumber),
+                    thresholdPnt[rows],
+                    peakPnt[rows],
+                    peakVal[rows],
+                    dDict,
+                    self.fileLoader.dataPointsPerMs,
+                    verbose=dDict["verbose"],
+                    groups=groups,
+                )
+                for key, values in sweepFeatures.items():
+                    if key not in features:
+                        features[key] = (
+                            [None] * numSpikes
+                            if isinstance(values, list)
+                            else np.full(numSpikes, np.nan)
+                        )
+                    if isinstance(values, list):
+                        for row, value in zip(rows, values):
+                            features[key][row] = value
+                    else:
+                        features[key][rows] = values
+                for row, rowErrors in zip(rows, sweepErrors):
+                    errors[row] = sanpy.spikeFeatures.mergeErrors(
+                        errors[row], rowErrors, groups
+                    )
+
+            # half-heights that were removed go back to the default
+            if "halfWidths" in groups:
+                for key in self.spikeDict.keys():
+                    if key.startswith("widths_") and key not in features:
+                        self.spikeDict.fillColumn(key, np.nan)
+
+            for key, values in features.items():
+                self.spikeDict.setColumn(key, values)
+            self.spikeDict.setColumn("errors", errors)
+
+        now = datetime.datetime.now()
+        self.dateAnalyzed = now.strftime("%Y%m%d")
+        if numSpikes > 0:
+            self.spikeDict.fillColumn("analysisDate", now.strftime("%Y%m%d"))
+            self.spikeDict.fillColumn("analysisTime", now.strftime("%H:%M:%S"))
+            self.spikeDict.fillColumn("halfHeights", dDict["halfHeights"])
+
+        # run all user analysis ... what if this fails ???
+        sanpy.user_analysis.baseUserAnalysis.runAllUserAnalysis(self)
+
+        self.regenerateAnalysisDataFrame()
+        self.dfError = self.getErrorReport()
+        self._detectionDirty = True
+
+        if dDict["verbose"]:
+            stopTime = time.time()
+            logger.info(
+                f"Updated {groups} for {numSpikes} spikes in {round(stopTime-startTime,3)} seconds"
+            )
+
+    def _detectSweep(self, sweepNumber: int, chunkPnts: int = None):
+        """Detect all spikes in one sweep, in blocks of chunkPnts if not None."""
+        if chunkPnts is None:
+            return self._spikeDetect2(sweepNumber)
+        return self._spikeDetectChunked(sweepNumber, chunkPnts)
+
+    def _spikeDetectChunked(self, sweepNumber: int, chunkPnts: int):
+        """Detect all spikes in one sweep, one overlapping block at a time.
+
+        Only one block of the sweep is read and filtered at a time, see sanpy.detectionBlocks.
+        Results are the same as `_spikeDetect2(sweepNumber)`.
+
+        Parameters
+        ----------
+        sweepNumber : int
+        chunkPnts : int
+            Number of points in the core of each block
+
+        Returns
+        -------
+        sanpy.bAnalysisResults.analysisResultList
+            Results for this sweep, None if detection type is unknown.
+        """
+        dataPointsPerMs = self.fileLoader.dataPointsPerMs
+        prePnts, postPnts = sanpy.detectionBlocks.getBlockMargins(
+            self._detectionDict, dataPointsPerMs
+        )
+
+        # never read the full sweep, only one block at a time
+        self.fileLoader.loadRawData()
+        numPnts = self.fileLoader._sweepY.shape[0]
+
+        spikeDict = sanpy.bAnalysisResults.analysisResultList()
+        state = sanpy.detectionBlocks.detectionBlock.newState()
+        for startPnt, stopPnt, coreStart, coreStop in sanpy.detectionBlocks.iterBlocks(
+            numPnts, chunkPnts, prePnts, postPnts
+        ):
+            sweepX, sweepY = self.fileLoader.getSweepBlock(
+                sweepNumber, startPnt, stopPnt
+            )
+            filteredVm, filteredDeriv = self.fileLoader.getFilteredBlock(
+                sweepNumber, startPnt, stopPnt
+            )
+            block = sanpy.detectionBlocks.detectionBlock(
+                sweepX,
+                sweepY,
+                filteredVm,
+                filteredDeriv,
+                startPnt,
+                coreStart,
+                coreStop,
+                state,
+            )
+            blockResults = self._spikeDetect2(sweepNumber, block=block)
+            if blockResults is None:
+                return None
+            spikeDict.appendAnalysis(blockResults)
+
+        # first spike in each block needs the last spike of the block before for (isi, cycle length)
+        if len(spikeDict) > 0:
+            features = {
+                "thresholdPnt": spikeDict.getColumn("thresholdPnt"),
+                "preMinPnt": spikeDict.getColumn("preMinPnt"),
+            }
+            sanpy.spikeFeatures.stitchIntervals(features, dataPointsPerMs)
+            for key, values in features.items():
+                spikeDict.setColumn(key, values)
+
+        return spikeDict
+
+    def _spikeDetect2(self, sweepNumber: int, block=None):
         """Detect all spikes in one sweep.
 
-         Populate bAnalysisResult.py.
+        Does not change any state, sweeps can be detected concurrently.
+        Requires the filtered recording from `_getFilteredRecording()`.
 
         Notes
         -----
@@ -1507,6 +1621,15 @@ class bAnalysis:
         Parameters
         ----------
         sweepNumber : int
+        block : sanpy.detectionBlocks.detectionBlock
+            If not None, only detect spikes in the core of this block of the sweep.
+            Results are shifted to points in the sweep and the block state is updated.
+
+        Returns
+        -------
+        sanpy.bAnalysisResults.analysisResultList
+            Results for this sweep, spikeNumber is assigned when sweeps are merged.
+            None if detection type is unknown.
         """
         dDict = self._detectionDict
 
@@ -1515,13 +1638,6 @@ class bAnalysis:
 
         verbose = dDict["verbose"]
 
-        #
-        self.fileLoader.setSweep(sweepNumber)
-        #
-
-        # in case dDict has new filter values
-        self._getFilteredRecording()
-
         #
         # spike detect
         detectionType = dDict["detectionType"]
@@ -1529,20 +1645,24 @@ class bAnalysis:
         # detect all spikes either with dvdt or mv
         if detectionType == sanpy.bDetection.detectionTypes["mv"].value:
             # detect using mV threshold
-            spikeTimes, spikeErrorList = self._spikeDetect_vm(dDict, sweepNumber)
+            spikeTimes, spikeErrorList = self._spikeDetect_vm(
+                dDict, sweepNumber, block=block
+            )
 
             # TODO: get rid of this and replace with foot
             # backup childish vm threshold
             if dDict["doBackupSpikeVm"]:
                 spikeTimes = self._backupSpikeVm(
-                    spikeTimes, sweepNumber, dDict["medianFilter"]
+                    spikeTimes, sweepNumber, dDict["medianFilter"], block=block
                 )
         elif detectionType == sanpy.bDetection.detectionTypes["dvdt"].value:
             # detect using dv/dt threshold AND min mV
-            spikeTimes, spikeErrorList = self._spikeDetect_dvdt(dDict, sweepNumber)
+            spikeTimes, spikeErrorList = self._spikeDetect_dvdt(
+                dDict, sweepNumber, block=block
+            )
         else:
             logger.error(f'Unknown detection type "{detectionType}"')
-            return
+            return None
 
         #
         # backup thrshold to zero crossing in dvdt
@@ -1553,16 +1673,25 @@ class bAnalysis:
 
         #
         # set up
-        sweepX = self.fileLoader.sweepX  # sweepNumber is not optional
-        filteredVm = self.fileLoader.sweepY_filtered  # sweepNumber is not optional
-        filteredDeriv = self.fileLoader.filteredDeriv
-        # sweepC = self.fileLoader.sweepC
+        if block is None:
+            sweepX = self.fileLoader.getSweepX(sweepNumber)
+            filteredVm = self.fileLoader.getSweepY_filtered(sweepNumber)
+            filteredDeriv = self.fileLoader.getFilteredDeriv(sweepNumber)
+            pntOffset = 0
+            spikeOffset = 0
+        else:
+            block.state["numCrossings"] += len(spikeTimes)
+            sweepX = block.sweepX
+            filteredVm = block.filteredVm
+            filteredDeriv = block.filteredDeriv
+            pntOffset = block.startPnt
+            spikeOffset = block.state["numSpikes"]
+        # sweepC = self.fileLoader.getSweepC(sweepNumber)
 
         #
         now = datetime.datetime.now()
         dateStr = now.strftime("%Y%m%d")
         timeStr = now.strftime("%H:%M:%S")
-        self.dateAnalyzed = dateStr
 
         #
         # look in a window after each threshold crossing to get AP peak
@@ -1592,541 +1721,112 @@ class bAnalysis:
         )
 
         #
-        # small window to average Vm to calculate MDP (itself in a window before spike)
-        avgWindow_pnts = self.fileLoader.ms2Pnt_(dDict["avgWindow_ms"])
-        avgWindow_pnts = math.floor(avgWindow_pnts / 2)  # can be 0 !!!
-
-        #
-        # for each spike
-        # numSpikes = len(spikeTimes)
-        for i, spikeTime in enumerate(spikeTimes):
-            # spikeTime units is ALWAYS points
-
-            # new, add a spike dict for this spike time
-            spikeDict.appendDefault()
-
-            # get the AP peak
-            peakPnt = newSpikePeakPnt[i]
-            peakVal = newSpikePeakVal[i]
-            peakSec = (newSpikePeakPnt[i] / self.fileLoader.dataPointsPerMs) / 1000
+        # compute all per spike features for this sweep (vectorized, no loop over spikes)
+        features, featureErrors = sanpy.spikeFeatures.getSpikeFeatures(
+            sweepX,
+            filteredVm,
+            filteredDeriv,
+            spikeTimes,
+            newSpikePeakPnt,
+            newSpikePeakVal,
+            dDict,
+            self.fileLoader.dataPointsPerMs,
+            verbose=verbose,
+            pntOffset=pntOffset,
+            spikeOffset=spikeOffset,
+        )
 
-            # create one spike dictionary
-            # spikeDict = OrderedDict() # use OrderedDict so Pandas output is in the correct order
+        numSpikes = len(spikeTimes)
+        if block is not None:
+            # back to points in the sweep
+            spikeTimes = [spikeTime + pntOffset for spikeTime in spikeTimes]
+            block.state["numSpikes"] += numSpikes
 
-            # spikeDict[i]['isBad'] = False
-            spikeDict[i]["analysisDate"] = dateStr
-            spikeDict[i]["analysisTime"] = timeStr
-            spikeDict[i]["analysisVersion"] = sanpy.analysisVersion
-            spikeDict[i]["interfaceVersion"] = sanpy.interfaceVersion
-            spikeDict[i]["file"] = self.fileLoader.filename
+        spikeDict.appendDefault(numSpikes)
 
-            spikeDict[i]["detectionType"] = detectionType
+        spikeDict.fillColumn("analysisDate", dateStr)
+        spikeDict.fillColumn("analysisTime", timeStr)
+        spikeDict.fillColumn("analysisVersion", sanpy.analysisVersion)
+        spikeDict.fillColumn("interfaceVersion", sanpy.interfaceVersion)
+        spikeDict.fillColumn("file", self.fileLoader.filename)
 
-            spikeDict[i]["cellType"] = dDict["cellType"]
-            spikeDict[i]["sex"] = dDict["sex"]
-            spikeDict[i]["condition"] = dDict["condition"]
+        spikeDict.fillColumn("detectionType", detectionType)
 
-            spikeDict[i]["sweep"] = sweepNumber
+        spikeDict.fillColumn("cellType", dDict["cellType"])
+        spikeDict.fillColumn("sex", dDict["sex"])
+        spikeDict.fillColumn("condition", dDict["condition"])
 
-            epoch = float("nan")
-            epochLevel = float("nan")
-            epochTable = self.fileLoader.getEpochTable(sweepNumber)
-            if epochTable is not None:
-                epoch = epochTable.findEpoch(spikeTime)
-                epochLevel = epochTable.getLevel(epoch)
-            spikeDict[i]["epoch"] = epoch
-            spikeDict[i]["epochLevel"] = epochLevel
+        spikeDict.fillColumn("sweep", sweepNumber)
 
-            # keep track of per sweep spike and total spike
-            spikeDict[i]["sweepSpikeNumber"] = i
-            spikeDict[i]["spikeNumber"] = self.numSpikes + i
+        epochTable = self.fileLoader.getEpochTable(sweepNumber)
+        if epochTable is not None:
+            epochs = [epochTable.findEpoch(spikeTime) for spikeTime in spikeTimes]
+            spikeDict.setColumn("epoch", epochs)
+            spikeDict.setColumn(
+                "epochLevel", [epochTable.getLevel(epoch) for epoch in epochs]
+            )
 
-            spikeDict[i]["include"] = True
+        # keep track of per sweep spike and total spike
+        spikeDict.setColumn("sweepSpikeNumber", spikeOffset + np.arange(numSpikes))
 
-            # todo: make this a byte encoding so we can have multiple user tyes per spike
-            spikeDict[i]["userType"] = 0  # One userType (int) that can have values
+        spikeDict.fillColumn("include", True)
 
-            # using bAnalysisResults will already be []
-            spikeDict[i]["errors"] = []
+        # todo: make this a byte encoding so we can have multiple user tyes per spike
+        spikeDict.fillColumn("userType", 0)  # One userType (int) that can have values
 
-            # append existing spikeErrorList from spikeDetect_dvdt() or spikeDetect_mv()
-            tmpError = spikeErrorList[i]
+        # prepend existing spikeErrorList from spikeDetect_dvdt() or spikeDetect_mv()
+        for i, tmpError in enumerate(spikeErrorList):
             if tmpError is not None and tmpError != np.nan:
-                spikeDict[i]["errors"].append(tmpError)  # tmpError is from:
+                featureErrors[i].insert(0, tmpError)
                 if verbose:
                     print(f"  spike:{i} error:{tmpError}")
-            #
-            # detection params
-            spikeDict[i]["dvdtThreshold"] = dDict["dvdtThreshold"]
-            spikeDict[i]["mvThreshold"] = dDict["mvThreshold"]
-            spikeDict[i]["medianFilter"] = dDict["medianFilter"]
-            spikeDict[i]["halfHeights"] = dDict["halfHeights"]
-
-            spikeDict[i]["thresholdPnt"] = spikeTime
-            spikeDict[i]["thresholdSec"] = (
-                spikeTime / self.fileLoader.dataPointsPerMs
-            ) / 1000
-            spikeDict[i]["thresholdVal"] = filteredVm[spikeTime]  # in vm
-            spikeDict[i]["thresholdVal_dvdt"] = filteredDeriv[
-                spikeTime
-            ]  # in dvdt, spikeTime is points
-
-            # TODO: revamp this for 'Plot FI' plugin
-            # spikeTime falls into wrong epoch for first fast spike
-            # DAC command at the precise spike point
-            # spikeDict[i]['dacCommand'] = sweepC[spikeTime]  # spikeTime is in points
-            # spikeDict[i]['dacCommand'] = sweepC[peakPnt]  # spikeTime is in points
-
-            spikeDict[i]["peakPnt"] = peakPnt
-            spikeDict[i]["peakSec"] = peakSec
-            spikeDict[i]["peakVal"] = peakVal
-
-            spikeDict[i]["peakHeight"] = (
-                spikeDict[i]["peakVal"] - spikeDict[i]["thresholdVal"]
-            )
-
-            tmpThresholdSec = spikeDict[i]["thresholdSec"]
-            spikeDict[i]["timeToPeak_ms"] = (peakSec - tmpThresholdSec) * 1000
-
-            # only append to spikeDict after we are done (accounting for spikes within a sweep)
-            # self.spikeDict.append(spikeDict)
-            # iIdx = len(self.spikeDict) - 1
-
-            iIdx = i
-
-            # fast ahp, fastAhpWindow_pnts
-            if peakPnt+fastAhpWindow_pnts < len(sweepX):
-                fastAhpClip = filteredVm[peakPnt : peakPnt+fastAhpWindow_pnts]
-                fastAhpPnt = np.argmin(fastAhpClip)
-                
-                fastAhpError = fastAhpPnt == len(fastAhpClip)-1
-                
-                fastAhpPnt += peakPnt
-                fastAhpSec = self.fileLoader.pnt2Sec_(fastAhpPnt)
-                fastAhpValue = filteredVm[fastAhpPnt]
-
-                spikeDict[i]["fastAhpPnt"] = fastAhpPnt
-                spikeDict[i]["fastAhpSec"] = fastAhpSec
-                spikeDict[i]["fastAhpValue"] = fastAhpValue
-
-                # log error
-                if fastAhpError:
-                    errorType = "Fast AHP was detected at end of fast AHP window"
-                    errorStr = "Consider increasing the fast AHP window with fastAhpWindow_ms"
-                    eDict = self._getErrorDict(
-                        i, spikeTimes[i], errorType, errorStr
-                    )  # spikeTime is in pnts
-                    spikeDict[iIdx]["errors"].append(eDict)
-
-            # todo: get rid of this
-            defaultVal = float("nan")
-
-            """
-            # get pre/post spike minima
-            self.spikeDict[iIdx]['preMinPnt'] = None
-            self.spikeDict[iIdx]['preMinVal'] = defaultVal
-
-            # early diastolic duration
-            # 0.1 to 0.5 of time between pre spike min and spike time
-            self.spikeDict[iIdx]['preLinearFitPnt0'] = None
-            self.spikeDict[iIdx]['preLinearFitPnt1'] = None
-            self.spikeDict[iIdx]['earlyDiastolicDuration_ms'] = defaultVal # seconds between preLinearFitPnt0 and preLinearFitPnt1
-            self.spikeDict[iIdx]['preLinearFitVal0'] = defaultVal
-            self.spikeDict[iIdx]['preLinearFitVal1'] = defaultVal
-            # m,b = np.polyfit(x, y, 1)
-            self.spikeDict[iIdx]['earlyDiastolicDurationRate'] = defaultVal # fit of y=preLinearFitVal 0/1 versus x=preLinearFitPnt 0/1
-            self.spikeDict[iIdx]['lateDiastolicDuration'] = defaultVal #
-
-            self.spikeDict[iIdx]['preSpike_dvdt_max_pnt'] = None
-            self.spikeDict[iIdx]['preSpike_dvdt_max_val'] = defaultVal # in units mV
-            self.spikeDict[iIdx]['preSpike_dvdt_max_val2'] = defaultVal # in units dv/dt
-            self.spikeDict[iIdx]['postSpike_dvdt_min_pnt'] = None
-            self.spikeDict[iIdx]['postSpike_dvdt_min_val'] = defaultVal # in units mV
-            self.spikeDict[iIdx]['postSpike_dvdt_min_val2'] = defaultVal # in units dv/dt
-
-            self.spikeDict[iIdx]['isi_pnts'] = defaultVal # time between successive AP thresholds (thresholdSec)
-            self.spikeDict[iIdx]['isi_ms'] = defaultVal # time between successive AP thresholds (thresholdSec)
-            self.spikeDict[iIdx]['spikeFreq_hz'] = defaultVal # time between successive AP thresholds (thresholdSec)
-            self.spikeDict[iIdx]['cycleLength_pnts'] = defaultVal # time between successive MDPs
-            self.spikeDict[iIdx]['cycleLength_ms'] = defaultVal # time between successive MDPs
-
-            # Action potential duration (APD) was defined as the interval between the TOP and the subsequent MDP
-            #self.spikeDict[iIdx]['apDuration_ms'] = defaultVal
-            self.spikeDict[iIdx]['diastolicDuration_ms'] = defaultVal
-
-            # any number of spike widths
-            #print('spikeDetect__() appending widths list to spike iIdx:', iIdx)
-            # was this
-            #self.spikeDict[iIdx]['widths'] = []
-            # debug 20210929, self._getHalfWidth() will assign spikeDict[iIdx]['widths'] = []
-            for halfHeight in dDict['halfHeights']:
-                widthDict = {
-                    'halfHeight': halfHeight,
-                    'risingPnt': None,
-                    'risingVal': defaultVal,
-                    'fallingPnt': None,
-                    'fallingVal': defaultVal,
-                    'widthPnts': None,
-                    'widthMs': defaultVal
-                }
-                # was this
-                #spikeDict[iIdx]['widths_' + str(halfHeight)] = defaultVal
-                spikeDict[iIdx]['widths'].append(widthDict)
-            """
-
-            #
-            mdp_ms = dDict["mdp_ms"]
-            mdp_pnts = self.fileLoader.ms2Pnt_(mdp_ms)  # mdp_ms * self.dataPointsPerMs
-            mdp_pnts = int(mdp_pnts)
-
-            # pre spike min
-            # other algorithms look between spike[i-1] and spike[i]
-            # here we are looking in a predefined window
-            startPnt = spikeTimes[i] - mdp_pnts
-            if startPnt < 0:
-                # logger.info('TODO: add an official warning, we went past 0 for pre spike mdp ms window')
-                startPnt = 0
-                # log error
-                errorType = "Pre spike min under-run (mdp)"
-                errorStr = "Went past startPnt 0 searching for pre-spike min"
-                eDict = self._getErrorDict(
-                    i, spikeTimes[i], errorType, errorStr
-                )  # spikeTime is in pnts
-                spikeDict[iIdx]["errors"].append(eDict)
-                if verbose:
-                    logger.error(f"  spike:{iIdx} error:{eDict}")
-                    logger.error(f'  going to index vmFiltered {startPnt} to spike time i {i} with value {spikeTimes[i]}')
-
-            preRange = filteredVm[startPnt : spikeTimes[i]]  # EXCEPTION
-            try:
-                preMinPnt = np.argmin(preRange)
-            except ValueError as e:
-                # 20220926, happend when we have no scale and mdp_pnts=0
-                # print(f'xxx i:{i} mdp_pnts:{mdp_pnts} len:{len(filteredVm)} startPnt:{startPnt} spikeTimes[i]:{spikeTimes[i]}')
-                # 20220926, we really just want ot bail on this error
-                # lots of code below relies on this
-                # TODO: fix this mess
-                preMinPnt = startPnt
-                errorType = "Pre spike min 0 (mdp)"
-                errorStr = f"Did not find preMinPnt mdp_pnts:{mdp_pnts} startPnt:{startPnt} spikeTimes[i]:{spikeTimes[i]}"
-                eDict = self._getErrorDict(
-                    i, spikeTimes[i], errorType, errorStr
-                )  # spikeTime is in pnts
-                spikeDict[iIdx]["errors"].append(eDict)
-                if verbose:
-                    print(f"  spike:{iIdx} error:{eDict}")
-            if preMinPnt is not None:
-                # 20230924, avgMinPnts is coming up zero now that we have sampling dt for kymographs that are slow !!!
-                if avgWindow_pnts < 1:
-                    # error
-                    errorType = "mdp error"
-                    errorStr = "avgWindow_pnts"
-                    eDict = self._getErrorDict(
-                        i, spikeTimes[i], errorType, errorStr
-                    )  # spikeTime is in pnts
-                    spikeDict[iIdx]["errors"].append(eDict)
-                    if verbose:
-                        print(f"  spike:{iIdx} error:{eDict}")
-                
-                else:
-                    preMinPnt += startPnt
-                    # the pre min is actually an average around the real minima
-                    avgRange = filteredVm[
-                        preMinPnt - avgWindow_pnts : preMinPnt + avgWindow_pnts
-                    ]
-                    # print('  avgRange is:' , avgRange)
-                    preMinVal = np.average(avgRange)
-
-                    # search backward from spike to find when vm reaches preMinVal (avg)
-                    preRange = filteredVm[preMinPnt : spikeTimes[i]]
-                    preRange = np.flip(preRange)  # we want to search backwards from peak
-                    try:
-                        preMinPnt2 = np.where(preRange < preMinVal)[0][0]
-                        preMinPnt = spikeTimes[i] - preMinPnt2
-                        spikeDict[iIdx]["preMinPnt"] = preMinPnt
-                        spikeDict[iIdx]["preMinVal"] = preMinVal
-
-                    except IndexError as e:
-                        errorType = "Pre spike min (mdp)"
-                        errorStr = "Did not find preMinVal: " + str(
-                            round(preMinVal, 3)
-                        )  # + ' postRange min:' + str(np.min(postRange)) + ' max ' + str(np.max(postRange))
-                        eDict = self._getErrorDict(
-                            i, spikeTimes[i], errorType, errorStr
-                        )  # spikeTime is in pnts
-                        spikeDict[iIdx]["errors"].append(eDict)
-                        if verbose:
-                            print(f"  spike:{iIdx} error:{eDict}")
-
-            #
-            # The nonlinear late diastolic depolarization phase was
-            # estimated as the duration between 1% and 10% dV/dt
-            # linear fit on 10% - 50% of the time from preMinPnt to self.spikeTimes[i]
-            startLinearFit = 0.1  # percent of time between pre spike min and AP peak
-            stopLinearFit = 0.5  #
-            timeInterval_pnts = spikeTimes[i] - preMinPnt
-            # taking round() so we always get an integer # points
-            preLinearFitPnt0 = preMinPnt + round(timeInterval_pnts * startLinearFit)
-            preLinearFitPnt1 = preMinPnt + round(timeInterval_pnts * stopLinearFit)
-            preLinearFitVal0 = filteredVm[preLinearFitPnt0]
-            preLinearFitVal1 = filteredVm[preLinearFitPnt1]
-
-            # linear fit before spike
-            spikeDict[iIdx]["preLinearFitPnt0"] = preLinearFitPnt0
-            spikeDict[iIdx]["preLinearFitPnt1"] = preLinearFitPnt1
-            spikeDict[iIdx]["earlyDiastolicDuration_ms"] = self.fileLoader.pnt2Ms_(
-                preLinearFitPnt1 - preLinearFitPnt0
-            )
-            spikeDict[iIdx]["preLinearFitVal0"] = preLinearFitVal0
-            spikeDict[iIdx]["preLinearFitVal1"] = preLinearFitVal1
-
-            # a linear fit where 'm,b = np.polyfit(x, y, 1)'
-            # m*x+b"
-            xFit = sweepX[preLinearFitPnt0:preLinearFitPnt1]  # abb added +1
-            yFit = filteredVm[preLinearFitPnt0:preLinearFitPnt1]
-
-            # sometimes xFit/yFit have 0 length -->> TypeError
-            # print(f' {iIdx} preLinearFitPnt0:{preLinearFitPnt0}, preLinearFitPnt1:{preLinearFitPnt1}')
-            # print(f'    xFit:{len(xFit)} yFit:{len(yFit)}')
-
-            # TODO: somehow trigger following errors to confirm code works (pytest)
-            with warnings.catch_warnings():
-                warnings.filterwarnings("error")
-                try:
-                    mLinear, bLinear = np.polyfit(
-                        xFit, yFit, 1
-                    )  # m is slope, b is intercept
-                    spikeDict[iIdx]["earlyDiastolicDurationRate"] = mLinear
-                    # todo: make an error if edd rate is too low
-                    lowestEddRate = dDict["lowEddRate_warning"]  # 8
-                    if mLinear <= lowestEddRate:
-                        errorType = "Fit EDD"
-                        errorStr = f"Early diastolic duration rate fit - Too low {round(mLinear,3)}<={lowestEddRate}"
-                        eDict = self._getErrorDict(
-                            i, spikeTimes[i], errorType, errorStr
-                        )  # spikeTime is in pnts
-                        # print('fit edd start num error:', 'iIdx:', iIdx, 'num error:', len(spikeDict[iIdx]['errors']))
-                        spikeDict[iIdx]["errors"].append(eDict)
-                        # print('  after num error:', len(spikeDict[iIdx]['errors']))
-                        if verbose:
-                            print(f"  spike:{iIdx} error:{eDict}")
-
-                except (TypeError, RuntimeWarning) as e:
-                    # catching exception:  expected non-empty vector for x
-                    # xFit/yFit turn up empty when mdp and TOP points are within 1 point
-                    spikeDict[iIdx]["earlyDiastolicDurationRate"] = defaultVal
-                    errorType = "Fit EDD"
-                    # errorStr = 'Early diastolic duration rate fit - TypeError'
-                    errorStr = (
-                        "Early diastolic duration rate fit - preMinPnt == spikePnt"
-                    )
-                    eDict = self._getErrorDict(i, spikeTimes[i], errorType, errorStr)
-                    spikeDict[iIdx]["errors"].append(eDict)
-                    if verbose:
-                        print(f"  spike:{iIdx} error:{eDict}")
-                except np.RankWarning as e:
-                    # logger.error('== FIX preLinearFitPnt0/preLinearFitPnt1 RankWarning')
-                    # logger.error(f'  error is: {e}')
-                    # print('RankWarning')
-                    # also throws: RankWarning: Polyfit may be poorly conditioned
-                    spikeDict[iIdx]["earlyDiastolicDurationRate"] = defaultVal
-                    errorType = "Fit EDD"
-                    errorStr = "Early diastolic duration rate fit - RankWarning"
-                    eDict = self._getErrorDict(i, spikeTimes[i], errorType, errorStr)
-                    spikeDict[iIdx]["errors"].append(eDict)
-                    if verbose:
-                        print(f"  spike:{iIdx} error:{eDict}")
-                # 20230422, don't ever catch an unknown exception
-                # except:
-                #     logger.error(
-                #         f" !!!!!!!!!!!!!!!!!!!!!!!!!!! UNKNOWN EXCEPTION DURING EDD LINEAR FIT for spike {i}"
-                #     )
-                #     spikeDict[iIdx]["earlyDiastolicDurationRate"] = defaultVal
-                #     errorType = "Fit EDD"
-                #     errorStr = "Early diastolic duration rate fit - Unknown Exception"
-                #     eDict = self._getErrorDict(i, spikeTimes[i], errorType, errorStr)
-                #     if verbose:
-                #         print(f"  spike:{iIdx} error:{eDict}")
-
-            # not implemented
-            # self.spikeDict[i]['lateDiastolicDuration'] = ???
-
-            #
-            # maxima in dv/dt before spike (between TOP and peak)
-            try:
-                preRange = filteredDeriv[spikeTimes[i] : peakPnt + 1]
-                preSpike_dvdt_max_pnt = np.argmax(preRange)
-                preSpike_dvdt_max_pnt += spikeTimes[i]
-                spikeDict[iIdx]["preSpike_dvdt_max_pnt"] = preSpike_dvdt_max_pnt
-                spikeDict[iIdx]["preSpike_dvdt_max_val"] = filteredVm[
-                    preSpike_dvdt_max_pnt
-                ]  # in units mV
-                spikeDict[iIdx]["preSpike_dvdt_max_val2"] = filteredDeriv[
-                    preSpike_dvdt_max_pnt
-                ]  # in units mV
-            except ValueError as e:
-                # sometimes preRange is empty, don't try and put min/max in error
-                errorType = "Pre Spike dvdt"
-                errorStr = "Searching for dvdt max - ValueError"
-                eDict = self._getErrorDict(
-                    i, spikeTimes[i], errorType, errorStr
-                )  # spikeTime is in pnts
-                spikeDict[iIdx]["errors"].append(eDict)
-                if verbose:
-                    print(f"  spike:{iIdx} error:{eDict}")
-
-            #
-            # minima in dv/dt after spike
-            # postRange = dvdt[self.spikeTimes[i]:postMinPnt]
-            # postSpike_ms = 20 # 10
-            # postSpike_pnts = self.ms2Pnt_(postSpike_ms)
-            dvdtPostWindow_ms = dDict["dvdtPostWindow_ms"]
-            dvdtPostWindow_pnts = self.fileLoader.ms2Pnt_(dvdtPostWindow_ms)
-            postRange = filteredDeriv[
-                peakPnt : peakPnt + dvdtPostWindow_pnts
-            ]  # fixed window after spike
-
-            postSpike_dvdt_min_pnt = np.argmin(postRange)
-            postSpike_dvdt_min_pnt += peakPnt
-            spikeDict[iIdx]["postSpike_dvdt_min_pnt"] = postSpike_dvdt_min_pnt
-            spikeDict[iIdx]["postSpike_dvdt_min_val"] = filteredVm[
-                postSpike_dvdt_min_pnt
-            ]
-            spikeDict[iIdx]["postSpike_dvdt_min_val2"] = filteredDeriv[
-                postSpike_dvdt_min_pnt
-            ]
-
-            #
-            # diastolic duration was defined as the interval between MDP and TOP
-            # one off error when preMinPnt is not defined
-            spikeDict[iIdx]["diastolicDuration_ms"] = self.fileLoader.pnt2Ms_(
-                spikeTime - preMinPnt
-            )
-
-            #
-            # calculate instantaneous spike frequency and ISI, for first spike this is not defined
-            spikeDict[iIdx]["cycleLength_ms"] = float("nan")
-            if iIdx > 0:
-                isiPnts = (
-                    spikeDict[iIdx]["thresholdPnt"]
-                    - spikeDict[iIdx - 1]["thresholdPnt"]
-                )
-                isi_ms = self.fileLoader.pnt2Ms_(isiPnts)
-                isi_hz = 1 / (isi_ms / 1000)
-                spikeDict[iIdx]["isi_pnts"] = isiPnts
-                spikeDict[iIdx]["isi_ms"] = self.fileLoader.pnt2Ms_(isiPnts)
-                spikeDict[iIdx]["spikeFreq_hz"] = 1 / (
-                    self.fileLoader.pnt2Ms_(isiPnts) / 1000
-                )
-
-                # Cycle length was defined as the interval between MDPs in successive APs
-                prevPreMinPnt = spikeDict[iIdx - 1]["preMinPnt"]  # can be nan
-                thisPreMinPnt = spikeDict[iIdx]["preMinPnt"]
-                if prevPreMinPnt is not None and thisPreMinPnt is not None:
-                    cycleLength_pnts = thisPreMinPnt - prevPreMinPnt
-                    spikeDict[iIdx]["cycleLength_pnts"] = cycleLength_pnts
-                    spikeDict[iIdx]["cycleLength_ms"] = self.fileLoader.pnt2Ms_(
-                        cycleLength_pnts
-                    )
-                else:
-                    # error
-                    prevPreMinSec = self.fileLoader.pnt2Sec_(prevPreMinPnt)
-                    thisPreMinSec = self.fileLoader.pnt2Sec_(thisPreMinPnt)
-                    # errorStr = f'Previous spike preMinPnt is {prevPreMinPnt} and this preMinPnt: {thisPreMinPnt}'
-                    errorType = "Cycle Length"
-                    errorStr = f"Previous spike preMinPnt (s) is {prevPreMinSec} and this preMinPnt: {thisPreMinSec}"
-                    eDict = self._getErrorDict(
-                        i, spikeTimes[i], errorType, errorStr
-                    )  # spikeTime is in pnts
-                    spikeDict[iIdx]["errors"].append(eDict)
-                    if verbose:
-                        print(f"  spike:{iIdx} error:{eDict}")
-
-            #
-            # TODO: Move half-width to a function !!!
-            #
-            hwWindowPnts = dDict["halfWidthWindow_ms"] * self.fileLoader.dataPointsPerMs
-            hwWindowPnts = round(hwWindowPnts)
-            halfHeightList = dDict["halfHeights"]
-            # was this
-            # self._getHalfWidth(filteredVm, i, iIdx, spikeTime, peakPnt, hwWindowPnts, self.dataPointsPerMs, halfHeightList)
-            self._getHalfWidth(
-                filteredVm,
-                iIdx,
-                spikeDict,
-                spikeTime,
-                peakPnt,
-                hwWindowPnts,
-                self.fileLoader.dataPointsPerMs,
-                halfHeightList,
-                verbose=verbose,
-            )
+        spikeDict.setColumn("errors", featureErrors)
 
         #
-        # look between threshold crossing to get minima
-        # we will ignore the first and last spike
-
-        #
-        # spike clips
-        self.spikeClips = None
-        self.spikeClips_x = None
-        self.spikeClips_x2 = None
-
-        # SUPER important, previously our self.spikeDict was simple list of dict
-        # now it is a list of class xxx
-        # print('=== addind', len(spikeDict))
-        self.spikeDict.appendAnalysis(spikeDict)
-        # print('   now have', len(self.spikeDict))
-        # print(self.spikeDict)
-
-        # keep track of spikes per sweep (expensive to calculate)
-        # self._spikesPerSweep[sweepNumber] = len(spikeDict)
-
-        # run all user analysis ... what if this fails ???
-        sanpy.user_analysis.baseUserAnalysis.runAllUserAnalysis(self)
+        # detection params
+        spikeDict.fillColumn("dvdtThreshold", dDict["dvdtThreshold"])
+        spikeDict.fillColumn("mvThreshold", dDict["mvThreshold"])
+        spikeDict.fillColumn("medianFilter", dDict["medianFilter"])
+        spikeDict.fillColumn("halfHeights", dDict["halfHeights"])
 
         #
-        # generate a df holding stats (used by scatterplotwidget)
-        # startSeconds = dDict['startSeconds']
-        # stopSeconds = dDict['stopSeconds']
-        # if self.numSpikes > 0:
-        #     # exportObject = sanpy.bExport(self)
-        #     # self.dfReportForScatter = exportObject.report(startSeconds, stopSeconds)
-        #     self._dfReportForScatter = self.spikeDict.asDataFrame()
-        # else:
-        #     self.dfReportForScatter = None
-        self.regenerateAnalysisDataFrame()
-
-        # generate error report
-        self.dfError = self.getErrorReport()
-
-        # bAnalysis needs to be saved
-        self._detectionDirty = True
-
-        ## done
+        # assign features, one column at a time
+        for key, values in features.items():
+            spikeDict.setColumn(key, values)
+
+        return spikeDict
+
+    @staticmethod
+    def getAnalysisDataFrame(spikeDict : "sanpy.bAnalysisResults.analysisResultList",
+                             metaData : dict) -> pd.DataFrame:
+        """Get spike analysis with one column per file metadata key, see asDataFrame().
+
+        Also used to pool analysis saved in h5 without loading the recording.
+        """
+        # exportObject = sanpy.bExport(self)
+        # self.dfReportForScatter = exportObject.report(startSeconds, stopSeconds)
+        df = spikeDict.asDataFrame()
+
+        # get rid of analysis results columns, we get these from file metadata
+        #  - include
+        #  - cellType
+        #  - sex
+        #  - condition
+        df = df.drop('include', axis=1)
+        df = df.drop('cellType', axis=1)
+        df = df.drop('sex', axis=1)
+        # 202401 removed
+        # df = df.drop('condition', axis=1)
+
+        # add all file meta data to df
+        for k,v in metaData.items():
+            # logger.info(f'   adding metadata {k} {v}')
+            df[k] = v
+        return df
 
     def regenerateAnalysisDataFrame(self):
         if self.numSpikes > 0:
-            # exportObject = sanpy.bExport(self)
-            # self.dfReportForScatter = exportObject.report(startSeconds, stopSeconds)
-            self._dfReportForScatter = self.spikeDict.asDataFrame()
-
-            # get rid of analysis results columns, we get these from file metadata
-            #  - include
-            #  - cellType
-            #  - sex
-            #  - condition
-            self._dfReportForScatter = self._dfReportForScatter.drop('include', axis=1)
-            self._dfReportForScatter = self._dfReportForScatter.drop('cellType', axis=1)
-            self._dfReportForScatter = self._dfReportForScatter.drop('sex', axis=1)
-            # 202401 removed
-            # self._dfReportForScatter = self._dfReportForScatter.drop('condition', axis=1)
-
-            # add all file meta data to df
-            for k,v in self.metaData.items():
-                # logger.info(f'   adding metadata {k} {v}')
-                self._dfReportForScatter[k] = v
-
+            self._dfReportForScatter = self.getAnalysisDataFrame(self.spikeDict, self.metaData)
         else:
             self.dfReportForScatter = None
 
@@ -2493,32 +2193,20 @@ class bAnalysis:
 
         # logger.info(f'Generating error report for {len(self.spikeDict)} spikes')
 
-        #  20230422 spikeDict is not working as an iterable
-        # use it as a list instead
-        numSpikes = len(self.spikeDict)
-        #for spike in self.spikeDict:
-        for _spikeNumber in range(numSpikes):
-            spike = self.spikeDict[_spikeNumber]
-            # spike is sanpy.bAnalysisResults.analysisResult
-            #print('spike:', spike)
-            for error in spike["errors"]:
+        # columns of the analysis, one value per spike
+        errorsCol = self.spikeDict.getColumn("errors", asList=True)
+        sweepCol = self.spikeDict.getColumn("sweep", asList=True)
+        epochCol = self.spikeDict.getColumn("epoch", asList=True)
+        for _spikeNumber, errors in enumerate(errorsCol):
+            for error in errors:
                 # spike["errors"] is a list of dict
                 # error is dict from _getErrorDict
                 if error is None or error == np.nan or error == "nan":
                     continue
 
                 # 20230422 add sweep and epoch to error dict
-                #_spikeNumber = error['Spike']
-                
-                #print('  _spikeNumber:', _spikeNumber, type(_spikeNumber))
-                
-                # _sweep = self.getSpikeStat([_spikeNumber], 'sweep')
-                # if len(_sweep)==0:
-                #     logger.error(f"_spikeNumber:{_spikeNumber} sweep:{_sweep}")
-                #     #print(self.getOneSpikeDict(_spikeNumber))
-                
-                error['Sweep'] = self.getSpikeStat([_spikeNumber], 'sweep')[0]
-                error['Epoch'] = self.getSpikeStat([_spikeNumber], 'epoch')[0]
+                error['Sweep'] = sweepCol[_spikeNumber]
+                error['Epoch'] = epochCol[_spikeNumber]
 
                 dictList.append(error)
 
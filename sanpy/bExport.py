@@ -12,6 +12,94 @@ from sanpy.sanpyLogger import get_logger
 
 logger = get_logger(__name__)
 
+summaryStats = ["count", "mean", "std", "sem", "median", "first", "last"]
+"""Default statistics of summarizeSpikes()."""
+
+_positionalStats = {"first": 0, "second": 1, "last": -1}
+"""Statistics that take the value of one spike in each group, nan is not skipped."""
+
+
+def summarizeSpikes(
+    df: pd.DataFrame,
+    columns: List[str],
+    groupBy: List[str] = ["file", "sweep", "epoch"],
+    stats: List[str] = summaryStats,
+    skipFirst: List[str] = None,
+) -> pd.DataFrame:
+    """Summarize spike columns per group (like per file, sweep and epoch).
+
+    All groups and columns are aggregated in one groupby pass.
+
+    Parameters
+    ----------
+    df : pd.DataFrame
+        One row per spike, like bAnalysis.asDataFrame() or analysisDir.pool_build()
+    columns : list of str
+        Numeric columns to summarize
+    groupBy : list of str
+        Columns to group spikes by, groups are sorted
+    stats : list of str
+        Any pandas aggregation ('count', 'mean', 'std', 'sem', 'median', 'min', 'max', 'size')
+        or one spike of each group ('first', 'second', 'last'), in spike order
+    skipFirst : list of str
+        Columns where the first spike of each group is not included.
+        Use for interval stats like 'spikeFreq_hz' or 'isi_ms'
+
+    Returns
+    -------
+    pd.DataFrame
+        One row per group with groupBy columns and a column '<column>_<stat>' for each column and stat.
+    """
+    aggStats = [stat for stat in stats if stat not in _positionalStats.keys()]
+
+    groupBy = list(groupBy)
+    df = df[groupBy + [c for c in columns if c not in groupBy]]
+    grouped = df.groupby(groupBy, sort=True, dropna=False)
+
+    isFirst = None
+    if skipFirst:
+        isFirst = (grouped.cumcount() == 0).to_numpy()
+        df = df.copy()
+        for column in skipFirst:
+            df.loc[isFirst, column] = float("nan")
+        grouped = df.groupby(groupBy, sort=True, dropna=False)
+
+    if aggStats:
+        dfSummary = grouped[columns].agg(aggStats)
+        dfSummary.columns = ["_".join(col) for col in dfSummary.columns.values]
+    else:
+        dfSummary = grouped.size().to_frame().iloc[:, 0:0]
+
+    # positional stats from the row of each group (group starts in stable sort by group)
+    if len(aggStats) < len(stats):
+        groupCodes = grouped.ngroup().to_numpy()
+        order = np.argsort(groupCodes, kind="stable")
+        sortedCodes = groupCodes[order]
+        starts = np.flatnonzero(np.r_[True, sortedCodes[1:] != sortedCodes[:-1]])
+        stops = np.r_[starts[1:], len(sortedCodes)]
+        for column in columns:
+            values = df[column].to_numpy()
+            # the first spike is nan in skipFirst columns, start at the next one
+            offset = 1 if (skipFirst and column in skipFirst) else 0
+            for stat in stats:
+                if stat not in _positionalStats.keys():
+                    continue
+                position = _positionalStats[stat]
+                if position < 0:
+                    rows = stops + position
+                    isValid = rows >= starts + offset
+                else:
+                    rows = starts + offset + position
+                    isValid = rows < stops
+                statValues = np.full(len(starts), np.nan, dtype=object if values.dtype == object else float)
+                statValues[isValid] = values[order[rows[isValid]]]
+                dfSummary[column + "_" + stat] = statValues
+
+    # same column order as stats
+    dfSummary = dfSummary[[column + "_" + stat for column in columns for stat in stats]]
+
+    return dfSummary.reset_index()
+
 
 class bExport:
     """Once analysis is performed with sanpy.bAnalysis.spikeDetect(),
@@ -146,73 +234,65 @@ class bExport:
 
         spikeList = self.ba.getStat('spikeNumber', sweepNumber=sweep, epochNumber=epoch)
 
-        newList = []
-        for spikeIdx in spikeList:
-            spike = self.ba.getOneSpikeDict(spikeIdx)
-            
-            # if current spike time is out of bounds
-            # then continue (e.g. it is not between theMin (sec) and theMax (sec)
-            spikeTime_sec = self.ba.fileLoader.pnt2Sec_(spike["thresholdPnt"])
-            if theMin is not None and theMax is not None:
-                if spikeTime_sec < theMin or spikeTime_sec > theMax:
-                    continue
-
-            spikeDict = (
-                OrderedDict()
-            )  # use OrderedDict so Pandas output is in the correct order
+        dfAnalysis = self.ba.asDataFrame()
+        if dfAnalysis is None:
+            return pd.DataFrame()
+        dfAnalysis = dfAnalysis.loc[dfAnalysis['spikeNumber'].isin(spikeList)]
 
-            spikeDict["Spike"] = spikeIdx
-            spikeDict["Take Off Potential (s)"] = self.ba.fileLoader.pnt2Sec_(
-                spike["thresholdPnt"]
-            )
-            spikeDict["Take Off Potential (ms)"] = self.ba.fileLoader.pnt2Ms_(
-                spike["thresholdPnt"]
-            )
-            spikeDict["Take Off Potential (mV)"] = spike["thresholdVal"]
-            spikeDict["AP Peak (ms)"] = self.ba.fileLoader.pnt2Ms_(spike["peakPnt"])
-            spikeDict["AP Peak (mV)"] = spike["peakVal"]
-            spikeDict["AP Height (mV)"] = spike["peakHeight"]
-            spikeDict["Pre AP Min (mV)"] = spike["preMinVal"]
-            # spikeDict['Post AP Min (mV)'] = spike['postMinVal']
-            #
-            # spikeDict['AP Duration (ms)'] = spike['apDuration_ms']
-            spikeDict["Early Diastolic Duration (ms)"] = spike[
-                "earlyDiastolicDuration_ms"
-            ]
-            spikeDict["Early Diastolic Depolarization Rate (dV/s)"] = spike[
-                "earlyDiastolicDurationRate"
-            ]  # abb 202012
-            spikeDict["Diastolic Duration (ms)"] = spike["diastolicDuration_ms"]
-            #
-            spikeDict["Inter-Spike-Interval (ms)"] = spike["isi_ms"]
-            spikeDict["Spike Frequency (Hz)"] = spike["spikeFreq_hz"]
-            spikeDict["ISI (ms)"] = spike["isi_ms"]
-
-            spikeDict["Cycle Length (ms)"] = spike["cycleLength_ms"]
+        # spike time from the threshold point
+        dataPointsPerMs = self.ba.fileLoader.dataPointsPerMs
+        thresholdMs = dfAnalysis["thresholdPnt"].to_numpy(dtype=float) / dataPointsPerMs
+        if theMin is not None and theMax is not None:
+            # spikes between theMin (sec) and theMax (sec)
+            inRange = (thresholdMs / 1000 >= theMin) & (thresholdMs / 1000 <= theMax)
+            dfAnalysis = dfAnalysis[inRange]
+            thresholdMs = thresholdMs[inRange]
+
+        # use dict so Pandas output is in the correct order
+        spikeDict = OrderedDict()
+
+        spikeDict["Spike"] = dfAnalysis["spikeNumber"].to_numpy()
+        spikeDict["Take Off Potential (s)"] = thresholdMs / 1000
+        spikeDict["Take Off Potential (ms)"] = thresholdMs
+        spikeDict["Take Off Potential (mV)"] = dfAnalysis["thresholdVal"].to_numpy()
+        spikeDict["AP Peak (ms)"] = dfAnalysis["peakPnt"].to_numpy(dtype=float) / dataPointsPerMs
+        spikeDict["AP Peak (mV)"] = dfAnalysis["peakVal"].to_numpy()
+        spikeDict["AP Height (mV)"] = dfAnalysis["peakHeight"].to_numpy()
+        spikeDict["Pre AP Min (mV)"] = dfAnalysis["preMinVal"].to_numpy()
+        # spikeDict['Post AP Min (mV)'] = spike['postMinVal']
+        #
+        # spikeDict['AP Duration (ms)'] = spike['apDuration_ms']
+        spikeDict["Early Diastolic Duration (ms)"] = dfAnalysis["earlyDiastolicDuration_ms"].to_numpy()
+        spikeDict["Early Diastolic Depolarization Rate (dV/s)"] = dfAnalysis[
+            "earlyDiastolicDurationRate"
+        ].to_numpy()  # abb 202012
+        spikeDict["Diastolic Duration (ms)"] = dfAnalysis["diastolicDuration_ms"].to_numpy()
+        #
+        spikeDict["Inter-Spike-Interval (ms)"] = dfAnalysis["isi_ms"].to_numpy()
+        spikeDict["Spike Frequency (Hz)"] = dfAnalysis["spikeFreq_hz"].to_numpy()
+        spikeDict["ISI (ms)"] = dfAnalysis["isi_ms"].to_numpy()
 
-            spikeDict["Max AP Upstroke (dV/dt)"] = spike["preSpike_dvdt_max_val2"]
-            spikeDict["Max AP Upstroke (mV)"] = spike["preSpike_dvdt_max_val"]
+        spikeDict["Cycle Length (ms)"] = dfAnalysis["cycleLength_ms"].to_numpy()
 
-            spikeDict["Max AP Repolarization (dV/dt)"] = spike[
-                "postSpike_dvdt_min_val2"
-            ]
-            spikeDict["Max AP Repolarization (mV)"] = spike["postSpike_dvdt_min_val"]
+        spikeDict["Max AP Upstroke (dV/dt)"] = dfAnalysis["preSpike_dvdt_max_val2"].to_numpy()
+        spikeDict["Max AP Upstroke (mV)"] = dfAnalysis["preSpike_dvdt_max_val"].to_numpy()
 
-            # half-width
-            for widthDict in spike["widths"]:
-                keyName = "width_" + str(widthDict["halfHeight"])
-                spikeDict[keyName] = widthDict["widthMs"]
+        spikeDict["Max AP Repolarization (dV/dt)"] = dfAnalysis["postSpike_dvdt_min_val2"].to_numpy()
+        spikeDict["Max AP Repolarization (mV)"] = dfAnalysis["postSpike_dvdt_min_val"].to_numpy()
 
-            spikeDict["File"] = self.ba.fileLoader.filename
+        # half-width, one column per detection halfHeights
+        for halfHeight in self.ba.getDetectionDict()["halfHeights"]:
+            keyName = "widths_" + str(halfHeight)
+            if keyName in dfAnalysis.columns:
+                spikeDict["width_" + str(halfHeight)] = dfAnalysis[keyName].to_numpy()
 
-            # errors
-            # spikeDict['numError'] = spike['numError']
-            spikeDict["errors"] = spike["errors"]
+        spikeDict["File"] = self.ba.fileLoader.filename
 
-            # append
-            newList.append(spikeDict)
+        # errors
+        # spikeDict['numError'] = spike['numError']
+        spikeDict["errors"] = dfAnalysis["errors"].to_numpy()
 
-        df = pd.DataFrame(newList)
+        df = pd.DataFrame(spikeDict) if len(dfAnalysis) > 0 else pd.DataFrame()
         return df
 
     def getSummary(self,
@@ -279,85 +359,25 @@ class bExport:
             float("%.2f" % (theMax))
         ]  # on export, x-axis of raw plot will be ouput
 
-        # 'stats' has xxx columns (name, mean, sd, se, n)
-        headerDict["stats"] = []
-
-        ignoreColumns = ["Spike", "File"]
-        for idx, col in enumerate(cardiac_df):
-            if col in ignoreColumns:
-                # in general, skip non numerical columns
-                continue
-            headerDict[col] = []
-
-        # mean
-        theMean = cardiac_df.mean(numeric_only=True)  # skipna default is True
-
-        logger.info('cardiac_df:')
-        print(cardiac_df)
-        logger.info('theMean:')
-        print(theMean)
-
-        theMean["errors"] = ""
-                
-        # sd
-        theSD = cardiac_df.std(numeric_only=True)  # skipna default is True
-        theSD["errors"] = ""
-        # se
-        theSE = cardiac_df.sem(numeric_only=True)  # skipna default is True
-        theSE["errors"] = ""
-        # n
-        theN = cardiac_df.count(numeric_only=True)  # skipna default is True
-        theN["errors"] = ""
-
+        # header values are in the first row, one row per stat
         statCols = ["mean", "sd", "se", "n"]
-        for j, stat in enumerate(statCols):
-            if j == 0:
-                pass
-            else:
-                # need to append columns to keep Excel sheet columns in sync
-                # for k,v in headerDict.items():
-                #    headerDict[k].append('')
-
-                headerDict["File Name"].append("")
-                headerDict["File Path"].append("")
-                headerDict["Cell Type"].append("")
-                headerDict["Sex"].append("")
-                headerDict["Condition"].append("")
-                #
-                headerDict["Date Analyzed"].append("")
-                headerDict["Time Analyzed"].append("")
-                headerDict["Detection Type"].append("")
-                headerDict["dV/dt Threshold"].append("")
-                headerDict["Vm Threshold (mV)"].append("")
-                # headerDict['Median Filter (pnts)'].append('')
-                headerDict["Analysis Version"].append("")
-                headerDict["Interface Version"].append("")
-                headerDict["Sweep Number"].append("")
-                headerDict["Number of Sweeps"].append("")
-                headerDict["Export Start (sec)"].append("")
-                headerDict["Export Stop (sec)"].append("")
-
-            # a dictionary key for each stat
-            headerDict["stats"].append(stat)
-            for idx, col in enumerate(cardiac_df):
-                if col in ignoreColumns:
-                    # in general, need to ignore string columns
-                    # headerDict[col].append('')
-                    continue
-                # headerDict[col].append('')
-                if stat == "mean":
-                    headerDict[col].append(theMean[col])
-                elif stat == "sd":
-                    headerDict[col].append(theSD[col])
-                elif stat == "se":
-                    headerDict[col].append(theSE[col])
-                elif stat == "n":
-                    headerDict[col].append(theN[col])
-
-        # end for j, stat
-        # print('=== headerDict')
-        # for k,v in headerDict.items():
-        #    print(k, ':', v)
+        for k, v in headerDict.items():
+            headerDict[k] = v + [""] * (len(statCols) - 1)
+
+        # 'stats' has xxx columns (name, mean, sd, se, n)
+        headerDict["stats"] = statCols
+
+        # in general, skip non numerical columns
+        ignoreColumns = ["Spike", "File", "errors"]
+        statColumns = [col for col in cardiac_df.columns if col not in ignoreColumns]
+        if statColumns:
+            # one group, all spikes are in the same file
+            aggStats = ["mean", "std", "sem", "count"]
+            dfStats = summarizeSpikes(cardiac_df, statColumns, groupBy=["File"], stats=aggStats)
+            for col in statColumns:
+                headerDict[col] = [dfStats.at[0, col + "_" + stat] for stat in aggStats]
+        if "errors" in cardiac_df.columns:
+            headerDict["errors"] = [""] * len(statCols)
 
         # dict to pandas dataframe
         df = pd.DataFrame(headerDict).T
@@ -365,6 +385,32 @@ class bExport:
 
         return df
 
+    def getEpochSummary(self,
+                        sweep='All',
+                        epoch='All',
+                        theMin: float = None,
+                        theMax: float = None,
+                        stats: List[str] = summaryStats,
+                        ) -> pd.DataFrame:
+        """Get summary of spike report bExport.report2() with one row per (sweep, epoch).
+
+        See summarizeSpikes() for stats.
+        """
+        cardiac_df = self.report2(sweep=sweep,
+                                  epoch=epoch,
+                                  theMin=theMin,
+                                  theMax=theMax)
+        if len(cardiac_df) == 0:
+            return None
+
+        dfAnalysis = self.ba.asDataFrame().set_index("spikeNumber")
+        cardiac_df.insert(1, "Sweep", dfAnalysis.loc[cardiac_df["Spike"], "sweep"].to_numpy())
+        cardiac_df.insert(2, "Epoch", dfAnalysis.loc[cardiac_df["Spike"], "epoch"].to_numpy())
+
+        ignoreColumns = ["Spike", "Sweep", "Epoch", "File", "errors"]
+        statColumns = [col for col in cardiac_df.columns if col not in ignoreColumns]
+        return summarizeSpikes(cardiac_df, statColumns, groupBy=["File", "Sweep", "Epoch"], stats=stats)
+
     def saveReport(
         self,
         savefile,
@@ -0,0 +1,297 @@
+"""Run spike detection on all files in a folder from the command line.
+
+Each file is analyzed in its own process and saved into the folder h5 file
+(see analysisDir), the same file the SanPy app opens. Also saves, in the folder:
+
+    <file>-analysis.csv   one row per spike, in 'sanpy_analysis/' next to each file
+    <file>-summary.csv    summary of each file, see bExport.getSummary()
+    sanpy_batch_pool.csv  all spikes of the files that were analyzed (or .parquet)
+
+Recordings already saved with the same detection parameters are skipped (resume).
+
+Example
+-------
+    sanpy-batch data/ --detection "SA Node" --glob "*.abf" --workers 4
+"""
+
+import argparse
+import concurrent.futures
+import fnmatch
+import json
+import os
+import time
+from typing import List, Optional
+
+import sanpy
+from sanpy.bAnalysisResults import NumpyEncoder
+from sanpy.bDetection import getDefaultDetection
+
+from sanpy.sanpyLogger import get_logger
+
+logger = get_logger(__name__)
+
+poolFile = "sanpy_batch_pool"
+"""Name of the pooled analysis file in the folder, without extension."""
+
+
+def getDetectionDict(detection: str) -> Optional[dict]:
+    """Get detection parameters from a preset name like 'SA Node' or a json file.
+
+    Keys missing from a json file get their default value, like bDetection presets.
+    """
+    if os.path.isfile(detection):
+        with open(detection, "r") as f:
+            detectionDict = json.load(f)
+        for _key, _defaultDict in getDefaultDetection().items():
+            if _key not in detectionDict.keys():
+                detectionDict[_key] = _defaultDict["defaultValue"]
+        return detectionDict
+
+    bd = sanpy.bDetection()
+    if detection not in bd.getDetectionPresetList():
+        logger.error(f'Did not find detection preset "{detection}", possible presets are {bd.getDetectionPresetList()}')
+        return None
+    return bd.getDetectionDict(detection)
+
+
+def _asJson(detectionDict: dict) -> dict:
+    """Detection parameters as they are saved in the h5 file, so they can be compared."""
+    return json.loads(json.dumps(detectionDict, cls=NumpyEncoder))
+
+
+def _detectOneFile(path: str, detectionDict: dict) -> dict:
+    """Detect spikes in one file and save its csv files, runs in a worker process.
+
+    Returns
+    -------
+    dict
+        With 'error' if the file did not load or detection failed,
+        otherwise what is needed to save it with sanpy.h5Util.saveRecording().
+    """
+    try:
+        ba = sanpy.bAnalysis(path)
+        if ba.loadError:
+            return {"path": path, "error": "did not load"}
+        ba.spikeDetect(detectionDict)
+
+        ba.saveAnalysis_tocsv()
+        if ba.numSpikes > 0:
+            dfSummary = sanpy.bExport(ba).getSummary(theMin=0, theMax=ba.fileLoader.recordingDur)
+            if dfSummary is not None:
+                dfSummary.to_csv(ba._getSaveBase() + "-summary.csv", index=False)
+    except Exception as e:
+        return {"path": path, "error": f"{type(e).__name__}: {e}"}
+
+    return {
+        "path": path,
+        "uuid": ba.uuid,
+        "detectionDict": ba.getDetectionDict(),
+        "metaDataDict": dict(ba.metaData),
+        "spikeDict": ba.spikeDict,
+        "numSpikes": ba.numSpikes,
+    }
+
+
+def runBatch(
+    folder: str,
+    detection: str,
+    fileGlob: str = None,
+    numWorkers: int = 1,
+    fileFormat: str = "csv",
+    resume: bool = True,
+    folderDepth: Optional[int] = None,
+) -> Optional[dict]:
+    """Detect spikes in all files of a folder and save them to the folder h5 file.
+
+    Parameters
+    ----------
+    folder : str
+        Folder with raw data files
+    detection : str
+        Detection preset name like 'SA Node' or path to a detection json file
+    fileGlob : str
+        Only files whose path relative to folder matches, like '*.abf', None for all
+    numWorkers : int
+        Number of files to analyze in parallel processes, 1 to analyze in this process
+    fileFormat : str
+        Format of the pooled analysis, 'csv' or 'parquet' (needs pyarrow)
+    resume : bool
+        If True, skip files already saved with the same detection parameters
+    folderDepth : int
+        See analysisDir
+
+    Returns
+    -------
+    dict
+        With keys (analyzed, skipped, failed, numSpikes, seconds, poolPath),
+        None if detection parameters were not found or numWorkers is less than 1
+    """
+    if numWorkers < 1:
+        logger.error(f"numWorkers must be 1 or more, got {numWorkers}")
+        return None
+
+    detectionDict = getDetectionDict(detection)
+    if detectionDict is None:
+        return None
+    detectionJson = _asJson(detectionDict)
+
+    ad = sanpy.analysisDir(
+        folder,
+        fileLoaderDict=sanpy.fileloaders.getFileLoaders(),
+        folderDepth=folderDepth,
+        useFolderIndex=True,
+    )
+    df = ad.getDataFrame()
+    hdfPath = ad._getHdfFile()
+
+    rowList: List[int] = []
+    skipped: List[int] = []
+    for rowIdx, rowDict in df.iterrows():
+        if fileGlob is not None and not fnmatch.fnmatch(rowDict["relPath"], fileGlob):
+            continue
+        uuid = rowDict["uuid"]
+        if resume and isinstance(uuid, str) and len(uuid) > 0:
+            if sanpy.h5Util.loadDetectionDict(hdfPath, uuid) == detectionJson:
+                skipped.append(rowIdx)
+                continue
+        rowList.append(rowIdx)
+
+    logger.info(f"analyzing {len(rowList)} files, skipping {len(skipped)} already analyzed in {folder}")
+
+    pathList = {rowIdx: ad.getPathFromRelPath(df.at[rowIdx, "relPath"]) for rowIdx in rowList}
+    analyzed = []
+    failed = []
+    numSpikes = 0
+
+    def _saveResult(rowIdx, result):
+        nonlocal numSpikes
+        if "error" in result.keys():
+            logger.error(f'{result["path"]}: {result["error"]}')
+            failed.append((result["path"], result["error"]))
+            return
+        # keep the uuid of a file that was saved before, its old analysis is replaced
+        uuid = df.at[rowIdx, "uuid"]
+        if not isinstance(uuid, str) or len(uuid) == 0:
+            uuid = result["uuid"]
+        with ad._hdfLock:
+            sanpy.h5Util.saveRecording(
+                hdfPath, uuid, result["detectionDict"], result["metaDataDict"], result["spikeDict"]
+            )
+        df.at[rowIdx, "uuid"] = uuid
+        analyzed.append(rowIdx)
+        numSpikes += result["numSpikes"]
+        logger.info(f'{len(analyzed) + len(failed)}/{len(rowList)} {result["numSpikes"]} spikes in {result["path"]}')
+
+    _start = time.time()
+    try:
+        if numWorkers == 1:
+            for rowIdx in rowList:
+                _saveResult(rowIdx, _detectOneFile(pathList[rowIdx], detectionDict))
+        else:
+            with concurrent.futures.ProcessPoolExecutor(max_workers=numWorkers) as executor:
+                futureDict = {
+                    executor.submit(_detectOneFile, pathList[rowIdx], detectionDict): rowIdx
+                    for rowIdx in rowList
+                }
+                for future in concurrent.futures.as_completed(futureDict):
+                    _saveResult(futureDict[future], future.result())
+    finally:
+        # files saved so far are kept if we are interrupted
+        if analyzed:
+            ad._saveFileTable()
+    seconds = time.time() - _start
+
+    #
+    # pool of all selected files, including the ones we skipped
+    poolPath = None
+    poolRows = set(analyzed + skipped)
+    masterDf = ad.pool_build() if poolRows else None
+    if masterDf is not None:
+        masterDf = masterDf[masterDf["File Number"].isin(poolRows)]
+        poolPath = os.path.join(ad.path, poolFile + "." + fileFormat)
+        if fileFormat == "parquet":
+            try:
+                masterDf.to_parquet(poolPath)
+            except ImportError as e:
+                logger.error(f"Did not save parquet, saving csv: {e}")
+                fileFormat = "csv"
+                poolPath = os.path.join(ad.path, poolFile + ".csv")
+        if fileFormat == "csv":
+            masterDf.to_csv(poolPath, index=False)
+        logger.info(f"saved {len(masterDf)} spikes from {len(poolRows)} files to {poolPath}")
+
+    return {
+        "analyzed": len(analyzed),
+        "skipped": len(skipped),
+        "failed": failed,
+        "numSpikes": numSpikes,
+        "seconds": seconds,
+        "poolPath": poolPath,
+    }
+
+
+def _numWorkers(value: str) -> int:
+    """Parse --workers, at least 1."""
+    numWorkers = int(value)
+    if numWorkers < 1:
+        raise argparse.ArgumentTypeError(f"must be 1 or more, got {numWorkers}")
+    return numWorkers
+
+
+def main(argv: List[str] = None) -> int:
+    """Entry point for the sanpy-batch command, returns the exit code."""
+    parser = argparse.ArgumentParser(
+        prog="sanpy-batch",
+        description="Detect spikes in all files of a folder and save to the folder database.",
+    )
+    parser.add_argument("folder", help="Folder with raw data files")
+    parser.add_argument(
+        "-d", "--detection", required=True,
+        help="Detection preset like 'SA Node' or a detection json file",
+    )
+    parser.add_argument("-g", "--glob", default=None, help="Only files matching, like '*.abf'")
+    parser.add_argument("-w", "--workers", type=_numWorkers, default=os.cpu_count(), help="Number of processes")
+    parser.add_argument("--format", choices=["csv", "parquet"], default="csv", help="Format of pooled analysis")
+    parser.add_argument("--depth", type=int, default=None, help="Folder depth to search for files")
+    parser.add_argument(
+        "--no-resume", action="store_true",
+        help="Analyze files already saved with the same detection parameters",
+    )
+    args = parser.parse_args(argv)
+
+    if not os.path.isdir(args.folder):
+        logger.error(f"Did not find folder {args.folder}")
+        return 1
+
+    results = runBatch(
+        args.folder,
+        args.detection,
+        fileGlob=args.glob,
+        numWorkers=args.workers,
+        fileFormat=args.format,
+        resume=not args.no_resume,
+        folderDepth=args.depth,
+    )
+    if results is None:
+        return 1
+
+    seconds = results["seconds"]
+    filesPerSecond = results["analyzed"] / seconds if seconds > 0 else 0
+    spikesPerSecond = results["numSpikes"] / seconds if seconds > 0 else 0
+    print(f'analyzed {results["analyzed"]} files ({filesPerSecond:.2f} files/s) '
+          f'with {results["numSpikes"]} spikes ({spikesPerSecond:.0f} spikes/s) in {seconds:.1f} s')
+    print(f'skipped {results["skipped"]} files already analyzed')
+    if results["poolPath"] is not None:
+        print(f'pooled analysis: {results["poolPath"]}')
+    if results["failed"]:
+        print(f'failed {len(results["failed"])} files:')
+        for path, error in results["failed"]:
+            print(f"    {path}: {error}")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    import sys
+
+    sys.exit(main())
@@ -0,0 +1,165 @@
+"""Detect spikes in overlapping blocks of a long sweep.
+
+A very long gap-free sweep is detected one block at a time so memory is bounded by the block size,
+see `bAnalysis.spikeDetect(chunkSeconds=)`. Each block is a core plus margins before and after it.
+Spikes are reported for threshold crossings in the core, the margins hold everything detection
+and features need to look at around those spikes (pre spike min, peak, fast ahp, half-widths)
+and keep the edges of the filters out of the core.
+
+Spikes are detected and features computed with points local to the block, the results are then
+shifted back to points in the sweep and blocks are stitched in order.
+State that crosses blocks (the last good spike of the refractory period) is carried by `detectionBlock`.
+"""
+
+import math
+from typing import Iterator, Tuple
+
+import numpy as np
+import scipy.signal
+
+import sanpy.detectionUtils
+from sanpy.sanpyLogger import get_logger
+
+logger = get_logger(__name__)
+
+
+def getBlockMargins(dDict: dict, dataPointsPerMs) -> Tuple[int, int]:
+    """Get the margins (pnts) needed before and after the core of a block.
+
+    Parameters
+    ----------
+    dDict : dict
+        Detection parameters from sanpy.bDetection
+    dataPointsPerMs : int
+
+    Returns
+    -------
+    prePnts, postPnts : int
+    """
+    # spike time can move back from the threshold crossing by dvdtPreWindow_ms (dvdt)
+    # or up to 20 bins of 1 ms, looking at 2 more bins (mv, see bAnalysis._backupSpikeVm)
+    backup_ms = max(dDict["dvdtPreWindow_ms"], 23)
+    pre_ms = backup_ms + dDict["mdp_ms"] + dDict["avgWindow_ms"]
+
+    # peak is within peakWindow_ms of the spike, features look after the peak
+    post_ms = (
+        dDict["dvdtPreWindow_ms"]
+        + dDict["peakWindow_ms"]
+        + max(
+            dDict["fastAhpWindow_ms"],
+            dDict["halfWidthWindow_ms"],
+            dDict["dvdtPostWindow_ms"],
+        )
+    )
+
+    # keep the edges of (median, SavitzkyGolay) filters of the trace and its derivative
+    # and windows of a few points around the threshold crossing out of the core
+    medianFilter = max(dDict["medianFilter"], 5)
+    slackPnts = 2 * (medianFilter + dDict["SavitzkyGolay_pnts"]) + 16
+
+    prePnts = math.ceil(pre_ms * dataPointsPerMs) + slackPnts
+    postPnts = math.ceil(post_ms * dataPointsPerMs) + slackPnts
+    return prePnts, postPnts
+
+
+def iterBlocks(
+    numPnts: int, chunkPnts: int, prePnts: int, postPnts: int
+) -> Iterator[Tuple[int, int, int, int]]:
+    """Split a sweep into overlapping blocks.
+
+    Yields
+    ------
+    startPnt, stopPnt : int
+        Points of the block in the sweep, [startPnt, stopPnt)
+    coreStart, coreStop : int
+        Points of the core in the sweep, [coreStart, coreStop)
+    """
+    chunkPnts = max(int(chunkPnts), 1)
+    for coreStart in range(0, numPnts, chunkPnts):
+        coreStop = min(coreStart + chunkPnts, numPnts)
+        startPnt = max(coreStart - prePnts, 0)
+        stopPnt = min(coreStop + postPnts, numPnts)
+        yield startPnt, stopPnt, coreStart, coreStop
+
+
+class detectionBlock:
+    """Traces for one block of one sweep and the detection state carried between blocks.
+
+    All traces start at `startPnt` in the sweep, detection uses points local to the block.
+    """
+
+    def __init__(
+        self,
+        sweepX: np.ndarray,
+        sweepY: np.ndarray,
+        filteredVm: np.ndarray,
+        filteredDeriv: np.ndarray,
+        startPnt: int,
+        coreStart: int,
+        coreStop: int,
+        state: dict,
+    ):
+        """
+        Parameters
+        ----------
+        sweepX, sweepY, filteredVm, filteredDeriv : np.ndarray
+            Traces of the block
+        startPnt : int
+            Point in the sweep of the first point in the block
+        coreStart, coreStop : int
+            Points in the sweep of the core, spikes are only reported for threshold crossings in the core
+        state : dict
+            Shared by all blocks of a sweep, see newState()
+        """
+        self.sweepX = sweepX
+        self.sweepY = sweepY
+        self.filteredVm = filteredVm
+        self.filteredDeriv = filteredDeriv
+        self.startPnt = startPnt
+        self.coreStart = coreStart
+        self.coreStop = coreStop
+        self.state = state
+
+    @staticmethod
+    def newState() -> dict:
+        """Get the state for the first block of a sweep."""
+        return {
+            "lastSpikeTime": {},  # last good spike (pnt in sweep) of each refractory pass
+            "numCrossings": 0,  # threshold crossings reported in previous blocks
+            "numSpikes": 0,  # spikes reported in previous blocks
+        }
+
+    def getCoreMask(self, spikeTimes: np.ndarray) -> np.ndarray:
+        """Get a mask of local spike times in the core."""
+        spikeTimes = np.asarray(spikeTimes, dtype=np.int64) + self.startPnt
+        return (spikeTimes >= self.coreStart) & (spikeTimes < self.coreStop)
+
+    def getRefractoryMask(self, name: str, spikeTimes, refractoryPnts: float) -> np.ndarray:
+        """Greedy refractory mask of local spike times, continued from previous blocks.
+
+        Parameters
+        ----------
+        name : str
+            Name of this refractory pass, detection can have more than one
+        """
+        spikeTimes = np.asarray(spikeTimes, dtype=np.int64)
+        lastSpikeTime = self.state["lastSpikeTime"].get(name)
+        if lastSpikeTime is not None:
+            lastSpikeTime -= self.startPnt
+        goodMask = sanpy.detectionUtils.getRefractoryMask(
+            spikeTimes, refractoryPnts, lastSpikeTime=lastSpikeTime
+        )
+        if goodMask.any():
+            self.state["lastSpikeTime"][name] = (
+                int(spikeTimes[goodMask][-1]) + self.startPnt
+            )
+        elif lastSpikeTime is None and len(spikeTimes) and spikeTimes[0] == 0:
+            # spike at pnt 0 is not good but the greedy pass continues from it
+            self.state["lastSpikeTime"][name] = self.startPnt
+        return goodMask
+
+    def getMedianFiltered(self, medianFilter: int) -> np.ndarray:
+        """Raw sweepY of the block with just a median filter, see bAnalysis._backupSpikeVm()."""
+        # (samples, 1) to filter along axis 0 like fileLoader_base
+        sweepY = np.asarray(self.sweepY).reshape(-1, 1)
+        return scipy.signal.medfilt2d(sweepY, [medianFilter, 1])[:, 0]
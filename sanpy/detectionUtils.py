@@ -1,3 +1,4 @@
+import math
 from pprint import pprint
 
 from typing import List, Union, Optional  # Callable, Iterator, Optional
@@ -73,34 +74,72 @@ def getThreshold_vm(y, threshold: float):
     return thresholdPoints
 
 
-def reduceByRefractory(spikeTimes: List[int], refractoryPnts: int):
-    """If there are fast-spikes, throw-out the second one.
+def getRefractoryMask(
+    spikeTimes, refractoryPnts: float, lastSpikeTime: Optional[int] = None
+) -> np.ndarray:
+    """Get a mask of spikes to keep, throw-out spikes within refractoryPnts of the last good spike.
+
+    Greedy, in one pass over the good spikes: the first spike is always good, the next good spike
+    is the first one at least refractoryPnts after it (found with np.searchsorted).
 
     Args:
-    spikeTimes: list of spike time threshold crossing
-    refractoryPnts:
+        spikeTimes: Sorted spike times (pnts)
+        refractoryPnts: Minimum points between good spikes, can be float
+        lastSpikeTime: Last good spike before spikeTimes (pnts), used to continue
+            the greedy pass from a previous block of spikes. None if there is none.
+
+    Returns:
+        np.ndarray: Boolean mask, True for good spikes.
+            A spike time of 0 is never good (like 'if spikeTime').
     """
+    if lastSpikeTime is not None:
+        # the last good spike is always good, continue from it
+        spikeTimes = np.concatenate(([lastSpikeTime], spikeTimes)).astype(np.int64)
+        goodMask = getRefractoryMask(spikeTimes, refractoryPnts)
+        return goodMask[1:]
 
-    # refractory_ms = 20 #10 # remove spike [i] if it occurs within refractory_ms of spike [i-1]
+    spikeTimes = np.asarray(spikeTimes, dtype=np.int64)
+    numSpikes = len(spikeTimes)
+    goodMask = np.zeros(numSpikes, dtype=bool)
 
-    spikeTimes = spikeTimes.copy()  # make a copy of the list, we are modifying it
+    # spike time differences are int, d < refractoryPnts is d < ceil(refractoryPnts)
+    refractoryPnts = math.ceil(refractoryPnts)
+
+    if refractoryPnts <= 0:
+        goodMask[:] = True
+    else:
+        lastGood = 0  # first spike [0] will always be good, there is no spike [i-1]
+        while lastGood < numSpikes:
+            goodMask[lastGood] = True
+            nextTime = spikeTimes[lastGood] + refractoryPnts
+            lastGood = int(np.searchsorted(spikeTimes, nextTime, side="left"))
+
+    # spike times of 0 do not pass 'if spikeTime'
+    goodMask &= spikeTimes != 0
+    return goodMask
 
-    lastGood = 0  # first spike [0] will always be good, there is no spike [i-1]
-    for i in range(len(spikeTimes)):
-        if i == 0:
-            # first spike is always good
-            continue
-        dPoints = spikeTimes[i] - spikeTimes[lastGood]
-        if dPoints < refractoryPnts:
-            # remove spike time [i]
-            spikeTimes[i] = 0
-        else:
-            # spike time [i] was good
-            lastGood = i
 
-    # regenerate spikeTimes0 by throwing out any spike time that does not pass 'if spikeTime'
-    # spikeTimes[i] that were set to 0 above (they were too close to the previous spike)
-    newSpikeTimes = [spikeTime for spikeTime in spikeTimes if spikeTime]
+def getTimeWindowMask(spikeTimes, startPnt: float, stopPnt: float) -> np.ndarray:
+    """Get a mask of sorted spike times in [startPnt, stopPnt] using np.searchsorted."""
+    spikeTimes = np.asarray(spikeTimes, dtype=np.int64)
+    goodMask = np.zeros(len(spikeTimes), dtype=bool)
+    firstIdx = np.searchsorted(spikeTimes, startPnt, side="left")
+    lastIdx = np.searchsorted(spikeTimes, stopPnt, side="right")
+    goodMask[firstIdx:lastIdx] = True
+    return goodMask
+
+
+def reduceByRefractory(spikeTimes: List[int], refractoryPnts: int):
+    """If there are fast-spikes, throw-out the second one.
+
+    Args:
+    spikeTimes: list of spike time threshold crossing
+    refractoryPnts:
+    """
+    goodMask = getRefractoryMask(spikeTimes, refractoryPnts)
+    newSpikeTimes = [
+        spikeTime for spikeTime, isGood in zip(spikeTimes, goodMask) if isGood
+    ]
     return newSpikeTimes
 
 
@@ -4,55 +4,39 @@ from pprint import pprint
 import pandas as pd
 
 import sanpy
+from sanpy.bExport import summarizeSpikes
 
 
 class epochAnalysis:
     def __init__(self, ba: sanpy.bAnalysis):
-        retDictList = []
+        """Number of spikes and spike frequency of each (file, sweep, epoch).
 
+        Spike frequency does not include the first spike in the epoch (it is an interval).
+        """
         df = ba.asDataFrame()
 
-        files = df["file"].unique()
-        for file in files:
-            dfFile = df[df["file"] == file]
-            sweeps = dfFile["sweep"].unique()
-            for sweep in sweeps:
-                dfSweep = dfFile[dfFile["sweep"] == sweep]
-                epochs = dfSweep["epoch"].unique()
-                for epoch in epochs:
-                    dfEpoch = dfSweep[dfSweep["epoch"] == epoch]
-
-                    # pprint(dfEpoch)
-
-                    # count number of spikes in this (file, sweep, epoch)
-                    numSpikes = len(dfEpoch)
-
-                    firstSpikeFreq = float("nan")
-                    spikeFreq_mean = float("nan")
-                    if numSpikes > 1:
-                        firstSpikeFreq = dfEpoch["spikeFreq_hz"].iloc[1]
-
-                        # TODO: this can't include the first spike in the epoch
-                        # average spike freq from each spikes 'spikeFreq_hz'
-                        spikeFreq_mean = (
-                            dfEpoch["spikeFreq_hz"].iloc[1 : len(dfEpoch)].mean()
-                        )
-
-                    # print('file:', file, 'sweep:', sweep, 'epoch:', epoch, 'numSpikes:', numSpikes)
-
-                    oneDict = self.getDefaultDict()
-                    oneDict["file"] = file
-                    oneDict["sweep"] = sweep
-                    oneDict["epoch"] = epoch
-                    oneDict["numSpikes"] = numSpikes
-                    oneDict["spikeFreq_mean"] = spikeFreq_mean
-                    oneDict["firstSpikeFreq"] = firstSpikeFreq
-                    retDictList.append(oneDict)
-
-        #
-        dfReturn = pd.DataFrame(retDictList)
+        dfSummary = summarizeSpikes(
+            df,
+            ["spikeFreq_hz"],
+            groupBy=["file", "sweep", "epoch"],
+            stats=["size", "mean", "first"],
+            skipFirst=["spikeFreq_hz"],
+        )
+
+        dfReturn = dfSummary.rename(
+            columns={
+                "spikeFreq_hz_size": "numSpikes",
+                "spikeFreq_hz_mean": "spikeFreq_mean",
+                "spikeFreq_hz_first": "firstSpikeFreq",
+            }
+        )
+        self._df = dfReturn
         pprint(dfReturn)
 
+    def getDataFrame(self) -> pd.DataFrame:
+        """Get one row per (file, sweep, epoch)."""
+        return self._df
+
     def getDefaultDict(self):
         """A dictionary for one (file, sweep, epoch).
 
@@ -1,4 +1,4 @@
-from typing import Union, Dict, List, Tuple
+from typing import Union, Dict, List, Tuple, Callable
 import numpy as np
 import pyabf
 
@@ -10,6 +10,69 @@ from sanpy.sanpyLogger import get_logger
 logger = get_logger(__name__)
 
 
+class mappedSweeps:
+    """Read-only (rows, sweeps) array of one channel, values are computed when indexed.
+
+    Indexing works like a 2D np.ndarray with slices or ints, only the rows asked for are computed.
+    Used by `fileLoader_abf(memoryMap=True)` to scale int16 samples of a memory-mapped file.
+    """
+
+    def __init__(
+        self,
+        numRows: int,
+        numSweeps: int,
+        getRows: Callable[[int, int, int], np.ndarray],
+    ):
+        """
+        Parameters
+        ----------
+        numRows, numSweeps : int
+            Shape of the array
+        getRows : function
+            getRows(sweep, startRow, stopRow) returns values of rows [startRow, stopRow) of one sweep
+        """
+        self.shape = (numRows, numSweeps)
+        self._getRows = getRows
+
+    ndim = 2
+    dtype = np.dtype(np.float64)
+
+    def __len__(self):
+        return self.shape[0]
+
+    def __getitem__(self, key):
+        if not isinstance(key, tuple):
+            key = (key, slice(None))
+        rowKey, sweepKey = key
+
+        # int rows drop the row axis like np.ndarray
+        rowIsInt = not isinstance(rowKey, slice)
+        rows = range(self.shape[0])[rowKey]
+        if rowIsInt:
+            rows = range(rows, rows + 1)
+
+        def getValues(sweep):
+            if len(rows) == 0:
+                return np.empty(0)
+            # read rows forward, step can be negative
+            start = min(rows[0], rows[-1])
+            stop = max(rows[0], rows[-1]) + 1
+            return self._getRows(sweep, start, stop)[:: rows.step]
+
+        sweeps = range(self.shape[1])[sweepKey]
+        if isinstance(sweeps, range):
+            values = np.empty((len(rows), len(sweeps)))
+            for idx, sweep in enumerate(sweeps):
+                values[:, idx] = getValues(sweep)
+            values.flags.writeable = False
+        else:
+            values = getValues(sweeps)
+
+        if rowIsInt:
+            values = values[0]
+        return values
+
+
 class fileLoader_abf(fileLoader_base):
     loadFileType = ".abf"
 
@@ -17,8 +80,122 @@ class fileLoader_abf(fileLoader_base):
     # def loadFileType(self):
     #     return 'abf'
 
+    def __init__(self, filepath: str, loadData: bool = True, memoryMap: bool = False):
+        """Load an abf file.
+
+        Parameters
+        ----------
+        filepath : str
+        loadData : bool
+            If True then load raw data, otherwise just load the header.
+        memoryMap : bool
+            If True then memory-map the data section of the file rather than reading it.
+            Sweeps are scaled from int16 when they are accessed and
+            sweepC is built from the epoch table when it is asked for.
+            Opening is about as fast as reading the header.
+            Use with `sanpy.bAnalysis(fileLoader=fileLoader_abf(path, memoryMap=True))`.
+        """
+        self._memoryMap = memoryMap
+        self._abfHeader: pyabf.ABF = None  # kept with memoryMap to build sweepC
+        self._mappedData: np.memmap = None
+        super().__init__(filepath, loadData=loadData)
+
     def loadFile(self):
-        self._loadAbf()
+        self._loadAbf(loadData=self._loadData)
+
+    @property
+    def numEpochs(self):
+        """Get the number of epochs, also when only the header was loaded."""
+        if self._epochTableList is None:
+            return self._numHeaderEpochs
+        return super().numEpochs
+
+    def getSweepY(self, sweep: int) -> np.ndarray:
+        """Get the Y values for one sweep, does not depend on `currentSweep`."""
+        if self._mappedData is None:
+            return super().getSweepY(sweep)
+        # scaled sweeps share the memory budget of filtered sweeps
+        return self._getCached(("sweepY", sweep), lambda: (self._sweepY[:, sweep],))[0]
+
+    def getSweepC(self, sweep: int) -> np.ndarray:
+        """Get the DAC command for one sweep, does not depend on `currentSweep`."""
+        if self._mappedData is None:
+            return super().getSweepC(sweep)
+        return self._sweepC[:, sweep]
+
+    def _isFixedLengthSweeps(self) -> bool:
+        """Same as pyabf.ABF.setSweep()."""
+        if self._abf.sweepCount > 1 and hasattr(self._abf, "_synchArraySection"):
+            return len(set(self._abf._synchArraySection.lLength)) == 1
+        return True
+
+    def _setHeaderSweep(self, sweep: int):
+        """Set the sweep (and its epochs) of an abf loaded without data, see pyabf.ABF.setSweep()."""
+        channel = 0
+        self._abf.sweepNumber = sweep
+        self._abf.sweepChannel = channel
+        if channel < len(self._abf.holdingCommand):
+            epochTable = pyabf.waveform.EpochTable(self._abf, channel)
+            self._abf.sweepEpochs = epochTable.epochWaveformsBySweep[sweep]
+        else:
+            self._abf.sweepEpochs = None
+
+    def _mapSweeps(self):
+        """Memory-map the data section of the abf file, channel 0 of each sweep is scaled when accessed."""
+        abf = self._abf
+        numRows = abf.sweepPointCount
+        numSweeps = len(self._sweepList)
+
+        # same layout as pyabf.ABF._loadAndScaleData(), (points, channels)
+        self._mappedData = np.memmap(
+            self.filepath,
+            dtype=abf._dtype,
+            mode="r",
+            offset=abf.dataByteStart,
+            shape=(abf.dataPointCount // abf.channelCount, abf.channelCount),
+        )
+        isInt = abf._dtype == np.int16
+        dataGain = abf._dataGain[0]
+        dataOffset = abf._dataOffset[0]
+
+        def getRowsY(sweep, start, stop):
+            pointStart = numRows * sweep
+            raw = self._mappedData[pointStart + start : pointStart + stop, 0]
+            # scale like pyabf, in float32
+            values = raw.astype(np.float32)
+            if isInt:
+                values[:] = np.multiply(values, dataGain)
+                values[:] = np.add(values, dataOffset)
+            values = values.astype(np.float64)
+            values.flags.writeable = False
+            return values
+
+        def getSweepC(sweep):
+            try:
+                waveform = self._abfHeader.stimulusByChannel[0].stimulusWaveform(sweep)
+            except ValueError as e:
+                logger.warning(f"ba has no sweep {sweep} sweepC: {e}")
+                waveform = np.zeros(numRows)
+            sweepC = np.zeros(numRows)
+            sweepC[: len(waveform[:numRows])] = waveform[:numRows]
+            sweepC.flags.writeable = False
+            return (sweepC,)
+
+        def getRowsC(sweep, start, stop):
+            # the waveform of a sweep is built once, slices are views of it
+            return self._getCached(("sweepC", sweep), lambda: getSweepC(sweep))[0][start:stop]
+
+        dataSecPerPoint = abf.dataSecPerPoint
+
+        def getRowsX(sweep, start, stop):
+            values = np.arange(start, stop) * dataSecPerPoint
+            values.flags.writeable = False
+            return values
+
+        self._sweepX = mappedSweeps(numRows, 1, getRowsX)
+        self._sweepY = mappedSweeps(numRows, numSweeps, getRowsY)
+        self._sweepC = mappedSweeps(numRows, numSweeps, getRowsC)
+        self._abfHeader = abf
 
     def _loadAbf(
         self, byteStream=None, loadData: bool = True, stimulusFileFolder: str = None
@@ -28,15 +205,22 @@ class fileLoader_abf(fileLoader_base):
             # logger.info(f'loadData:{loadData}')
             if byteStream is not None:
                 logger.info("Loading byte stream")
+                self._memoryMap = False
                 self._abf = pyabf.ABF(byteStream)
                 self._isBytesIO = True
             else:
                 # logger.info(f'Loading file: {self.filepath}')
                 self._abf = pyabf.ABF(
                     self.filepath,
-                    loadData=loadData,
+                    loadData=loadData and not self._memoryMap,
                     stimulusFileFolder=stimulusFileFolder,
                 )
+                if loadData and self._memoryMap and not self._isFixedLengthSweeps():
+                    logger.warning(f"    can not memory-map variable length sweeps, loading {self.filepath}")
+                    self._memoryMap = False
+                    self._abf = pyabf.ABF(
+                        self.filepath, stimulusFileFolder=stimulusFileFolder
+                    )
 
         except NotImplementedError as e:
             logger.error(f"    did not load abf file: {self.filepath}")
@@ -53,7 +237,10 @@ class fileLoader_abf(fileLoader_base):
             self._abf = None
 
         self._epochTableList = None
-        if not self._loadError and loadData:            
+        self._numHeaderEpochs = None
+        if not self._loadError:
+            if self._memoryMap or not loadData:
+                self._setHeaderSweep(0)
             try:
                 _tmp = self._abf.sweepEpochs.p1s
             except AttributeError as e:
@@ -61,14 +248,22 @@ class fileLoader_abf(fileLoader_base):
                     f"    did not find epochTable loadData:{loadData}: {e} in file {self.filepath}"
                 )
             else:
-                _numSweeps = len(self._abf.sweepList)
-                self._epochTableList = [None] * _numSweeps
-                for _sweepIdx in range(_numSweeps):
-                    self._abf.setSweep(_sweepIdx)
-                    self._epochTableList[_sweepIdx] = sanpy.fileloaders.epochTable(
-                        self._abf
-                    )
-                self._abf.setSweep(0)
+                if not loadData:
+                    # header only, just count epochs of the first sweep
+                    self._numHeaderEpochs = len(_tmp)
+                else:
+                    _numSweeps = len(self._abf.sweepList)
+                    self._epochTableList = [None] * _numSweeps
+                    for _sweepIdx in range(_numSweeps):
+                        if self._memoryMap:
+                            self._setHeaderSweep(_sweepIdx)
+                        else:
+                            self._abf.setSweep(_sweepIdx)
+                        self._epochTableList[_sweepIdx] = sanpy.fileloaders.epochTable(
+                            self._abf
+                        )
+                    if not self._memoryMap:
+                        self._abf.setSweep(0)
 
             self._sweepList = self._abf.sweepList
             self._sweepLengthSec = (
@@ -76,7 +271,9 @@ class fileLoader_abf(fileLoader_base):
             )  # assuming all sweeps have the same duration
 
             # on load, sweep is 0
-            if loadData:
+            if loadData and self._memoryMap:
+                self._mapSweeps()
+            elif loadData:
                 
                 # owl
                 #<bound method ABF.sweepD of ABF (v2.9) with 1 channel (pA), sampled at 10.0 kHz, containing 18 sweeps, having no tags, with a total length of 6.33 minutes, recorded with protocol "PPR_v-clamp_owl". path=/Users/cudmore/Dropbox/data/sanpy-users/porter/2022_08_15_0022.abf>
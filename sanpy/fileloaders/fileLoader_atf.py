@@ -17,7 +17,15 @@ class fileLoader_atf(fileLoader_base):
     #     # self._loadAtf()
 
     def loadFile(self):
+        # set for both the sidecar and the atf file
+        self.myFileType = "atf"
+        self._abf = None
+
+        # a file that did not change is memory-mapped from its sidecar
+        if self._loadSidecar():
+            return
         self._loadAtf()
+        self._saveSidecar()
 
     def _loadAtf(self):
         # We cant't get dataPointsPerMs without loading the data
@@ -38,7 +46,7 @@ class fileLoader_atf(fileLoader_base):
             self._abf = None
             return
 
-        print("  self._abf:", self._abf.sweepList)
+        logger.info(f"  self._abf.sweepList: {self._abf.sweepList}")
         # try:
         if 1:
             self._sweepList = self._abf.sweepList
@@ -96,6 +104,4 @@ class fileLoader_atf(fileLoader_base):
             self._abf = None
         """
 
-        self.myFileType = "atf"
-
         # don't keep _abf, we grabbed every thing we needed
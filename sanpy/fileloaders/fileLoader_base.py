@@ -1,8 +1,11 @@
 import os
 import glob
+import json
 import math
 import enum
 import inspect
+import threading
+from collections import OrderedDict
 from typing import Union, Dict, List, Tuple, Optional
 from abc import ABC, abstractmethod
 
@@ -25,13 +28,32 @@ def getFileLoaders(verbose: bool = False) -> dict:
 
     Each file loader is a class derived from [fileLoader_base](../../api/fileloader/fileLoader_base.md)
 
+    Loaders are found once per process and found again only when files in the user
+    file loader folder change (added, removed or edited).
+
     See: sanpy.interface.bPlugins.loadPlugins()
 
     Returns
     -------
     dict
-        A dictionary of file loaders.
+        A dictionary of file loaders, keys are file extensions.
     """
+    # copy so callers can not change the cache
+    retDict = dict(_fileLoaderCache.get())
+
+    if verbose:
+        logger.info(f"Loaded {len(retDict.keys())} file loaders:")
+        for k, v in retDict.items():
+            # logger.info(f'    {k}:{v}')
+            logger.info(f"  {k}")
+            for k2, v2 in v.items():
+                logger.info(f"    {k2}: {v2}")
+
+    return retDict
+
+
+def _findFileLoaders() -> dict:
+    """Find file loaders, see getFileLoaders()."""
     retDict = {}
 
     ignoreModuleList = ["fileLoader_base", "recordingModes", "epochTable", "hekaUtils"]
@@ -126,20 +148,18 @@ def getFileLoaders(verbose: bool = False) -> dict:
                 logger.warning(f"  this loader will overwrite the previous loader.")
             retDict[filetype] = oneLoaderDict
 
-    if verbose:
-        logger.info(f"Loaded {len(retDict.keys())} file loaders:")
-        for k, v in retDict.items():
-            # logger.info(f'    {k}:{v}')
-            logger.info(f"  {k}")
-            for k2, v2 in v.items():
-                logger.info(f"    {k2}: {v2}")
-
     # sort
     # retDict = dict(sorted(retDict.items()))
 
     return retDict
 
 
+_fileLoaderCache = sanpy._util._folderCache(
+    _findFileLoaders, lambda: sanpy._util._getUserFileLoaderFolder()
+)
+"""File loaders of this process, see getFileLoaders()."""
+
+
 class recordingModes(enum.Enum):
     """Recording modes for I-Clamp, V-Clamp, and unknown."""
 
@@ -173,6 +193,19 @@ class fileLoader_base(ABC):
     """
 
     loadFileType: str = ""
+
+    filterCacheMaxBytes: int = 256 * 2**20
+    """Default memory budget (bytes) for cached filtered sweeps, see setFilterCacheBudget()."""
+
+    useSidecarCache: bool = False
+    """If True, loaders that parse text (fileLoader_text, fileLoader_atf) save the loaded
+    arrays as .npy files in 'sanpy_analysis' and memory-map them when the file is opened again,
+    see _loadSidecar(). For example `sanpy.fileloaders.fileLoader_text.useSidecarCache = True`.
+    """
+
+    _sidecarVersion: int = 1
+    """Increment when the sidecar layout changes, older sidecars are then written again."""
+
     # @property
     # @abstractmethod
     # def loadFileType(self) -> str:
@@ -204,11 +237,17 @@ class fileLoader_base(ABC):
         self._loadError = False
 
         self._path = filepath
+        self._loadData = loadData
 
         self._metaData = sanpy.metaData.MetaData()  # per file metadata
 
-        self._filteredY : np.ndarray = None  # set in _getDerivative
-        self._filteredDeriv : np.ndarray = None
+        # filter params (medianFilter, SavitzkyGolay_pnts, SavitzkyGolay_poly), set in _getDerivative
+        self._filterParams: tuple = None
+        # LRU cache of (filteredY, filteredDeriv), key is (*self._filterParams, sweep)
+        self._filterCache: OrderedDict = OrderedDict()
+        self._filterCacheBytes: int = 0
+        self._filterCacheLock = threading.Lock()
+        self._rawDataLock = threading.Lock()
         self._currentSweep: int = 0
 
         self._epochTableList: List[sanpy.fileloaders.epochTable] = None
@@ -333,21 +372,257 @@ class fileLoader_base(ABC):
         -----
         All sweeps are assumed to have the same x-values (seconds).
         """
-        # return self._sweepX[:, self.currentSweep]
-        return self._sweepX[:, 0]
+        return self.getSweepX()
 
     @property
     def sweepY(self):
         """Get the Y values for the current sweep."""
-        return self._sweepY[:, self.currentSweep]
+        return self.getSweepY(self.currentSweep)
 
     @property
     def sweepC(self):
         """Get the DAC command for the current sweep."""
+        return self.getSweepC(self.currentSweep)
+
+    def isRawDataLoaded(self) -> bool:
+        """True if the raw data is loaded, False if only the header was loaded."""
+        return self._sweepY is not None
+
+    def loadRawData(self):
+        """Load the raw data of a file opened with `loadData=False`.
+
+        Called when sweeps are first used (see getSweepY), does nothing if the data is loaded.
+        """
+        if self._sweepY is not None or self._loadError:
+            return
+        with self._rawDataLock:
+            if self._sweepY is not None:
+                return
+            logger.info(f'loading raw data "{self.filepath}"')
+            self._loadData = True
+            self.loadFile()
+
+    def getSweepX(self, sweep: int = 0) -> np.ndarray:
+        """Get the X-Values for one sweep, does not depend on `currentSweep`.
+
+        All sweeps are assumed to have the same x-values (seconds).
+        """
+        if self._sweepX is None:
+            self.loadRawData()
+        # return self._sweepX[:, sweep]
+        return self._sweepX[:, 0]
+
+    def getSweepY(self, sweep: int) -> np.ndarray:
+        """Get the Y values for one sweep, does not depend on `currentSweep`."""
+        if self._sweepY is None:
+            self.loadRawData()
+        return self._sweepY[:, sweep]
+
+    def getSweepC(self, sweep: int) -> np.ndarray:
+        """Get the DAC command for one sweep, does not depend on `currentSweep`."""
+        if self._sweepY is None:
+            self.loadRawData()
         if self._sweepC is None:
-            # return np.zeros_like(self._sweepX[:, self.currentSweep])
             return np.zeros_like(self._sweepX[:, 0])
-        return self._sweepC[:, self.currentSweep]
+        return self._sweepC[:, sweep]
+
+    def getSweepY_filtered(self, sweep: int) -> Optional[np.ndarray]:
+        """Get a filtered version of one sweep, does not depend on `currentSweep`.
+
+        Requires a call to `_getDerivative()`.
+        """
+        filtered = self._getFilteredSweep(sweep)
+        if filtered is not None:
+            return filtered[0]
+
+    def getFilteredDeriv(self, sweep: int) -> Optional[np.ndarray]:
+        """Get the filtered first derivative of one sweep, does not depend on `currentSweep`.
+
+        Requires a call to `_getDerivative()`.
+        """
+        filtered = self._getFilteredSweep(sweep)
+        if filtered is not None:
+            return filtered[1]
+
+    def setFilterCacheBudget(self, maxBytes: int):
+        """Set the memory budget (bytes) for cached filtered sweeps.
+
+        Least recently used sweeps are evicted first, use 0 to not cache.
+        """
+        self.filterCacheMaxBytes = maxBytes
+        with self._filterCacheLock:
+            self._evictFilterCache()
+
+    def invalidateFilterCache(self):
+        """Remove all cached filtered sweeps.
+
+        Derived classes must call this if they change raw data after `setLoadedData()`.
+        """
+        with self._filterCacheLock:
+            self._filterCache.clear()
+            self._filterCacheBytes = 0
+
+    def _evictFilterCache(self):
+        while self._filterCache and self._filterCacheBytes > self.filterCacheMaxBytes:
+            _key, filtered = self._filterCache.popitem(last=False)
+            self._filterCacheBytes -= sum(oneArray.nbytes for oneArray in filtered)
+
+    def _getFilteredSweep(self, sweep: int) -> Optional[Tuple[np.ndarray, np.ndarray]]:
+        """Get (filteredY, filteredDeriv) for one sweep from the cache, filter on a miss."""
+        if self._filterParams is None:
+            return None
+        if self._sweepY is None:
+            self.loadRawData()
+            if self._sweepY is None:
+                return None
+
+        key = self._filterParams + (sweep,)
+        return self._getCached(key, lambda: self._filterSweep(sweep, *self._filterParams))
+
+    def getMedianFilteredSweep(self, sweep: int, medianFilter: int) -> np.ndarray:
+        """Get the raw Y values of one sweep with just a median filter (cached).
+
+        Used to backup spike times with mV detection, see bAnalysis._backupSpikeVm().
+        """
+        if self._sweepY is None:
+            self.loadRawData()
+        key = ("medianFilter", medianFilter, sweep)
+        filtered = self._getCached(
+            key,
+            lambda: (
+                scipy.signal.medfilt2d(
+                    self._sweepY[:, sweep : sweep + 1], [medianFilter, 1]
+                )[:, 0],
+            ),
+        )
+        return filtered[0]
+
+    def _getCached(self, key: tuple, filterFn) -> Tuple[np.ndarray, ...]:
+        """Get a tuple of filtered arrays from the cache, call filterFn() on a miss."""
+        with self._filterCacheLock:
+            filtered = self._filterCache.get(key)
+            if filtered is not None:
+                self._filterCache.move_to_end(key)
+                return filtered
+
+        # filter outside the lock so sweeps can be filtered concurrently
+        filtered = filterFn()
+
+        numBytes = sum(oneArray.nbytes for oneArray in filtered)
+        if numBytes <= self.filterCacheMaxBytes:
+            with self._filterCacheLock:
+                if key not in self._filterCache:
+                    self._filterCache[key] = filtered
+                    self._filterCacheBytes += numBytes
+                    self._evictFilterCache()
+        return filtered
+
+    def getSweepBlock(
+        self, sweep: int, startPnt: int, stopPnt: int
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """Get the X and Y values of points [startPnt, stopPnt) of one sweep (not cached).
+
+        Used to detect long recordings in blocks, see sanpy.detectionBlocks.
+        With `fileLoader_abf(memoryMap=True)` only these points are read from the file.
+
+        Returns
+        -------
+        (sweepX, sweepY) for the block
+        """
+        if self._sweepY is None:
+            self.loadRawData()
+        return self._sweepX[startPnt:stopPnt, 0], self._sweepY[startPnt:stopPnt, sweep]
+
+    def getFilteredBlock(
+        self, sweep: int, startPnt: int, stopPnt: int
+    ) -> Optional[Tuple[np.ndarray, np.ndarray]]:
+        """Filter points [startPnt, stopPnt) of one sweep and take its derivative (not cached).
+
+        Used to detect long recordings in blocks, see sanpy.detectionBlocks.
+        Values within a few points (the filter widths) of the block edges differ from getSweepY_filtered().
+
+        Requires a call to `_getDerivative()`.
+
+        Returns
+        -------
+        (filteredY, filteredDeriv) for the block
+        """
+        if self._filterParams is None:
+            return None
+        if self._sweepY is None:
+            self.loadRawData()
+            if self._sweepY is None:
+                return None
+        sweepY = self._sweepY[startPnt:stopPnt, sweep : sweep + 1]
+        return self._filterTrace(sweepY, *self._filterParams)
+
+    def _filterSweep(
+        self,
+        sweep: int,
+        medianFilter: int,
+        SavitzkyGolay_pnts: int,
+        SavitzkyGolay_poly: int,
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """Filter one sweep and take its derivative, see _getDerivative()."""
+        # keep 2D (samples, 1) to filter along axis 0 like all sweeps at once
+        sweepY = self._sweepY[:, sweep : sweep + 1]
+        return self._filterTrace(
+            sweepY, medianFilter, SavitzkyGolay_pnts, SavitzkyGolay_poly
+        )
+
+    def _filterTrace(
+        self,
+        sweepY: np.ndarray,
+        medianFilter: int,
+        SavitzkyGolay_pnts: int,
+        SavitzkyGolay_poly: int,
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        """Filter a (samples, 1) trace and take its derivative."""
+        if medianFilter > 0:
+            filteredY = scipy.signal.medfilt2d(sweepY, [medianFilter, 1])
+        elif SavitzkyGolay_pnts > 0:
+            filteredY = scipy.signal.savgol_filter(
+                sweepY,
+                SavitzkyGolay_pnts,
+                SavitzkyGolay_poly,
+                axis=0,
+                mode="nearest",
+            )
+        else:
+            filteredY = sweepY
+
+        filteredDeriv = np.diff(filteredY, axis=0)
+
+        # filter the derivative
+        if medianFilter > 0:
+            filteredDeriv = scipy.signal.medfilt2d(filteredDeriv, [medianFilter, 1])
+        elif SavitzkyGolay_pnts > 0:
+            filteredDeriv = scipy.signal.savgol_filter(
+                filteredDeriv,
+                SavitzkyGolay_pnts,
+                SavitzkyGolay_poly,
+                axis=0,
+                mode="nearest",
+            )
+
+        # mV/ms
+        filteredDeriv = filteredDeriv * self.dataPointsPerMs  # / 1000
+
+        # insert an initial point (rw) so it is the same length as raw data in abf.sweepY
+        filteredDeriv = np.concatenate(([0.0], filteredDeriv[:, 0]))
+
+        return filteredY[:, 0], filteredDeriv
+
+    def __getstate__(self):
+        state = self.__dict__.copy()
+        del state["_filterCacheLock"]
+        del state["_rawDataLock"]
+        return state
+
+    def __setstate__(self, state):
+        self.__dict__.update(state)
+        self._filterCacheLock = threading.Lock()
+        self._rawDataLock = threading.Lock()
 
     def get_xUnits(self):
         return self._sweepLabelX
@@ -358,10 +633,7 @@ class fileLoader_base(ABC):
     @property
     def filteredDeriv(self) -> Optional[np.ndarray]:
         """Get the filtered first derivative of sweepY."""
-        if self._filteredDeriv is not None:
-            return self._filteredDeriv[:, self.currentSweep]
-        else:
-            return None
+        return self.getFilteredDeriv(self.currentSweep)
 
     def _getDerivative(
         self,
@@ -383,9 +655,10 @@ class fileLoader_base(ABC):
 
         Notes
         -----
-        Creates:
-            self._filteredVm
-            self._filteredDeriv
+        Sweeps are filtered when first requested with getSweepY_filtered(sweep)
+        or getFilteredDeriv(sweep) and then cached by
+        (medianFilter, SavitzkyGolay_pnts, SavitzkyGolay_poly, sweep).
+        Calling again with the same parameters does not filter again.
         """
 
         # logger.info(f'{self.filename} medianFilter:{medianFilter} SavitzkyGolay_pnts:{SavitzkyGolay_pnts} SavitzkyGolay_poly:{SavitzkyGolay_poly}')
@@ -397,74 +670,16 @@ class fileLoader_base(ABC):
             if not medianFilter % 2:
                 medianFilter += 1
                 logger.warning(
-                    "Please use an odd value for the median filter, set medianFilter: {medianFilter}"
-                )
-            medianFilter = int(medianFilter)
-            self._filteredY = scipy.signal.medfilt2d(self._sweepY, [medianFilter, 1])
-        elif SavitzkyGolay_pnts > 0:
-            self._filteredY = scipy.signal.savgol_filter(
-                self._sweepY,
-                SavitzkyGolay_pnts,
-                SavitzkyGolay_poly,
-                axis=0,
-                mode="nearest",
-            )
-        else:
-            self._filteredY = self.sweepY
-
-        self._filteredDeriv = np.diff(self._filteredY, axis=0)
-
-        # filter the derivative
-        if medianFilter > 0:
-            if not medianFilter % 2:
-                medianFilter += 1
-                print(
                     f"Please use an odd value for the median filter, set medianFilter: {medianFilter}"
                 )
             medianFilter = int(medianFilter)
-            self._filteredDeriv = scipy.signal.medfilt2d(
-                self._filteredDeriv, [medianFilter, 1]
-            )
-        elif SavitzkyGolay_pnts > 0:
-            self._filteredDeriv = scipy.signal.savgol_filter(
-                self._filteredDeriv,
-                SavitzkyGolay_pnts,
-                SavitzkyGolay_poly,
-                axis=0,
-                mode="nearest",
-            )
-        else:
-            # self._filteredDeriv = self.filteredDeriv
-            pass
-
-        # mV/ms
-        dataPointsPerMs = self.dataPointsPerMs
-        self._filteredDeriv = self._filteredDeriv * dataPointsPerMs  # / 1000
-
-        # insert an initial point (rw) so it is the same length as raw data in abf.sweepY
-        # three options (concatenate, insert, vstack), could only get vstack working
-        rowOfZeros = np.zeros(self.numSweeps)
-
-        # logger.info(f' dataPointsPerMs:{dataPointsPerMs}')
-        # logger.info(f' self.numSweeps:{self.numSweeps}')
-        # logger.info(f' rowOfZeros:{rowOfZeros.shape}')
-        # logger.info(f' 1 - _filteredDeriv:{self._filteredDeriv.shape}')
 
-        # rowZero = 0
-        self._filteredDeriv = np.vstack([rowOfZeros, self._filteredDeriv])
+        self._filterParams = (medianFilter, SavitzkyGolay_pnts, SavitzkyGolay_poly)
 
-        # logger.info(f'  sweepX:{self.sweepX.shape}')
-        # logger.info(f'  sweepY:{self.sweepY.shape}')
-        # logger.info(f'  _filteredY:{self._filteredY.shape}')
-        # logger.info(f'  2- _filteredDeriv:{self._filteredDeriv.shape}')
-
-        return self._filteredDeriv
-    
     @property
     def sweepY_filtered(self) -> np.ndarray:
         """Get a filtered version of sweepY."""
-        if self._filteredY is not None:
-            return self._filteredY[:, self.currentSweep]
+        return self.getSweepY_filtered(self.currentSweep)
 
     @property
     def recordingFrequency(self) -> int:
@@ -542,6 +757,142 @@ class fileLoader_base(ABC):
         if self._epochTableList is not None:
             return self._epochTableList[0].numEpochs()
 
+    @classmethod
+    def readHeader(cls, filepath: str) -> Optional[dict]:
+        """Read the header of one file without loading raw data, see getHeader().
+
+        Derived classes that do not implement `loadData=False` in loadFile() load the full file.
+
+        Returns
+        -------
+        dict
+            None on load error
+        """
+        fileLoader = cls(filepath, loadData=False)
+        if fileLoader.getLoadError():
+            return None
+        return fileLoader.getHeader()
+
+    def getHeader(self) -> dict:
+        """Get the header of the file, does not use raw data.
+
+        Keys are columns of the analysisDir file table (File, Dur(s), Channels, Sweeps,
+        Epochs, kHz, Mode) and the per file metadata (Acq Date, Acq Time, ...).
+        """
+        header = {
+            "File": self.filename,
+            "Dur(s)": self.recordingDur,
+            "Channels": self.numChannels,
+            "Sweeps": self.numSweeps,
+            "Epochs": self.numEpochs,
+            "kHz": self.recordingFrequency,
+            "Mode": self.recordingMode.value,
+        }
+        header.update(self.metadata)
+        return header
+
+    def _getSidecarFolder(self) -> str:
+        """Get the folder with the sidecar cache of this file.
+
+        For example 'sanpy_analysis/<file name>.cache/' next to the file.
+        """
+        parentPath, fileName = os.path.split(self.filepath)
+        return os.path.join(parentPath, "sanpy_analysis", fileName + ".cache")
+
+    def _getSidecarStat(self) -> Tuple[int, float]:
+        """Get (size, mtime) of the file, a sidecar is valid while they do not change."""
+        fileStat = os.stat(self.filepath)
+        return fileStat.st_size, fileStat.st_mtime
+
+    def _loadSidecar(self) -> bool:
+        """Memory-map the arrays saved by _saveSidecar(), if they are up to date.
+
+        Call at the start of loadFile() in derived classes.
+
+        Returns
+        -------
+        bool
+            True if the data was loaded from the sidecar
+        """
+        if not self.useSidecarCache or self.filepath is None:
+            return False
+
+        sidecarFolder = self._getSidecarFolder()
+        headerPath = os.path.join(sidecarFolder, "header.json")
+        if not os.path.isfile(headerPath):
+            return False
+        try:
+            with open(headerPath) as f:
+                header = json.load(f)
+            size, mtime = self._getSidecarStat()
+            if (
+                header["version"] != self._sidecarVersion
+                or header["size"] != size
+                or header["mtime"] != mtime
+            ):
+                logger.info(f'sidecar is out of date: "{sidecarFolder}"')
+                return False
+
+            arrays = {}
+            for name in header["arrays"]:
+                arrays[name] = np.load(
+                    os.path.join(sidecarFolder, name + ".npy"), mmap_mode="r"
+                )
+        except (OSError, ValueError, KeyError) as e:
+            logger.warning(f'did not load sidecar "{sidecarFolder}": {e}')
+            return False
+
+        self._sweepX = arrays["sweepX"]
+        self._sweepY = arrays["sweepY"]
+        self._sweepC = arrays.get("sweepC")
+        self.invalidateFilterCache()
+
+        self._numSweeps = header["numSweeps"]
+        self._sweepList = list(range(self._numSweeps))
+        self._sweepLengthSec = header["sweepLengthSec"]
+        self._dataPointsPerMs = header["dataPointsPerMs"]
+        self._recordingMode = recordingModes(header["recordingMode"])
+        self._sweepLabelX = header["sweepLabelX"]
+        self._sweepLabelY = header["sweepLabelY"]
+        return True
+
+    def _saveSidecar(self):
+        """Save the loaded arrays (as .npy) and values derived from them, see _loadSidecar().
+
+        Call at the end of loadFile() in derived classes.
+        """
+        if not self.useSidecarCache or self.filepath is None or self._loadError:
+            return
+
+        sidecarFolder = self._getSidecarFolder()
+        arrays = {"sweepX": self._sweepX, "sweepY": self._sweepY}
+        if self._sweepC is not None:
+            arrays["sweepC"] = self._sweepC
+        header = {
+            "version": self._sidecarVersion,
+            "arrays": list(arrays.keys()),
+            "numSweeps": self.numSweeps,
+            "sweepLengthSec": np.asarray(self._sweepLengthSec).item(),
+            "dataPointsPerMs": np.asarray(self._dataPointsPerMs).item(),
+            "recordingMode": self._recordingMode.value,
+            "sweepLabelX": self._sweepLabelX,
+            "sweepLabelY": self._sweepLabelY,
+        }
+        try:
+            header["size"], header["mtime"] = self._getSidecarStat()
+            os.makedirs(sidecarFolder, exist_ok=True)
+            for name, array in arrays.items():
+                np.save(os.path.join(sidecarFolder, name + ".npy"), np.asarray(array))
+            # header last, the sidecar is only valid once all arrays are written
+            headerPath = os.path.join(sidecarFolder, "header.json")
+            with open(headerPath + ".tmp", "w") as f:
+                json.dump(header, f, indent=4)
+            os.replace(headerPath + ".tmp", headerPath)
+        except OSError as e:
+            logger.warning(f'did not save sidecar "{sidecarFolder}": {e}')
+            return
+        logger.info(f'saved sidecar "{sidecarFolder}"')
+
     def _checkLoadedData(self):
         # TODO: check all the member vraiables are correct
         # set error if they are not
@@ -586,6 +937,9 @@ class fileLoader_base(ABC):
         self._sweepY = sweepY
         self._sweepC = sweepC
 
+        # raw data changed
+        self.invalidateFilterCache()
+
         self._userList = userList
 
         self._numSweeps: int = self._sweepY.shape[1]
@@ -22,7 +22,12 @@ class fileLoader_text(fileLoader_base):
 
         Column 0 is seconds
         Column 1 is recording in ['mV', 'pA']
+
+        If useSidecarCache, a file that did not change is memory-mapped from its sidecar.
         """
+        if self._loadSidecar():
+            return
+
         # load the csv file
         try:
             _df = pd.read_csv(self.filepath)
@@ -82,3 +87,5 @@ class fileLoader_text(fileLoader_base):
             xLabel=xLabel,
             yLabel=yLabel,
         )
+
+        self._saveSidecar()
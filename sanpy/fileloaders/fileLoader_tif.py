@@ -207,11 +207,58 @@ class fileLoader_czi(fileLoader_base):
 class fileLoader_tif(fileLoader_base):
     loadFileType = ".tif"
 
+    sumChunkBytes: int = 64 * 2**20
+    """Memory budget (bytes) of each block of line scans summed in _sumLines()."""
+
+    def __init__(self, filepath: str, loadData: bool = True, memoryMap: bool = False):
+        """Load a tif kymograph.
+
+        Parameters
+        ----------
+        filepath : str
+        loadData : bool
+            If True then load raw data, otherwise just load the header.
+        memoryMap : bool
+            If True then memory-map the pages of the tif rather than reading them.
+            Channels (tifData) are read-only views that are read when they are used,
+            the line scan sums (sweepY) are computed in blocks of sumChunkBytes.
+            Falls back to reading the file if it is compressed (not memory-mappable).
+            Use with `sanpy.bAnalysis(fileLoader=fileLoader_tif(path, memoryMap=True))`.
+        """
+        self._memoryMap = memoryMap
+        super().__init__(filepath, loadData=loadData)
+
+    def _readTif(self) -> np.ndarray:
+        """Read (or memory-map) all pages of the tif."""
+        if self._memoryMap:
+            try:
+                return tifffile.memmap(self.filepath, mode="r")
+            except ValueError as e:
+                logger.warning(f'did not memory-map "{self.filepath}", reading it: {e}')
+        return tifffile.imread(self.filepath)
+
+    def _sumLines(self, img: np.ndarray) -> np.ndarray:
+        """Sum the pixels of each line scan (columns of img).
+
+        Blocks of line scans are summed in turn so a memory-mapped image is never
+        read into memory at once.
+        """
+        numPixels, numLines = img.shape
+        linesPerChunk = max(1, self.sumChunkBytes // max(1, numPixels * img.itemsize))
+        if numLines <= linesPerChunk:
+            return np.sum(img, axis=0)
+        return np.concatenate(
+            [
+                np.sum(img[:, start : start + linesPerChunk], axis=0)
+                for start in range(0, numLines, linesPerChunk)
+            ]
+        )
+
     def loadFile(self):
         # assuming pixels x line scan like (519, 10000)
         self._tif = []
         
-        loadedTif = tifffile.imread(self.filepath)
+        loadedTif = self._readTif()
 
         self._useThisChannel = 1
         
@@ -243,6 +290,7 @@ class fileLoader_tif(fileLoader_base):
             return
         
         # image must be shape[0] is time/big, shape[1] is space/small
+        # (rot90 is a view, a memory-mapped channel is not read)
         for _channel, img in enumerate(self._tif):
             if img.shape[1] < img.shape[0]:
                 logger.info(f"rot90 image with shape: {img.shape}")
@@ -292,7 +340,7 @@ class fileLoader_tif(fileLoader_base):
         sweepX = sweepX.astype(np.float64)
         sweepX *= self._tifHeader['secondsPerLine']
 
-        sweepY = np.sum(self._tif[channelIdx], axis=0).reshape(-1, 1)
+        sweepY = self._sumLines(self._tif[channelIdx]).reshape(-1, 1)
         sweepY = np.divide(sweepY, np.max(sweepY))
 
         self.setLoadedData(
@@ -320,7 +368,7 @@ class fileLoader_tif(fileLoader_base):
         sweepX *= self._tifHeader['secondsPerLine']
 
         # todo: need to use rect roi
-        sweepY = np.sum(self._tif[channelIdx], axis=0).reshape(-1, 1)
+        sweepY = self._sumLines(self._tif[channelIdx]).reshape(-1, 1)
 
         self.setLoadedData(
             sweepX=sweepX,
@@ -363,6 +411,7 @@ class fileLoader_tif(fileLoader_base):
 
         self._sweepX[:, 0] = self._abf.sweepX
         self._sweepY[:, 0] = self._abf.sweepY
+        self.invalidateFilterCache()
 
 if __name__ == '__main__':
     # path = 'data/kymograph/rosie-kymograph.tif'
@@ -0,0 +1,146 @@
+"""Cache of file table rows for a folder, see analysisDir.
+
+Each file row (header columns and metadata from analysisDir.getFileRow) is saved in a small
+SQLite file in the 'sanpy_analysis' sub folder, keyed by the path relative to the folder and
+checked against the file size and modification time. Reopening or syncing a folder only reads the header
+of files that are new or changed since they were indexed.
+"""
+
+import contextlib
+import json
+import os
+import sqlite3
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+from sanpy.sanpyLogger import get_logger
+
+logger = get_logger(__name__)
+
+indexFile = "sanpy_recording_index.sqlite"
+"""Name of the index file in each folder."""
+
+indexFolder = "sanpy_analysis"
+"""Sub folder with the index file, like other analysis saved next to raw data (see bAnalysis._getSaveFolder)."""
+
+
+def getFileStat(path: str) -> Optional[Tuple[int, float]]:
+    """Get (size, mtime) of a file, None if it does not exist."""
+    try:
+        fileStat = os.stat(path)
+    except OSError:
+        return None
+    return fileStat.st_size, fileStat.st_mtime
+
+
+def _jsonDefault(value):
+    """Convert numpy scalars for json."""
+    if isinstance(value, np.generic):
+        return value.item()
+    return str(value)
+
+
+class folderIndex:
+    """Rows of the file table of one folder, saved in `indexFile`.
+
+    Every call opens its own connection so an index can be used from any thread.
+    If the folder can not be written (for example a read only share) the index is disabled
+    and all files are read again.
+    """
+
+    def __init__(self, folderPath: str):
+        self._path = os.path.join(folderPath, indexFolder, indexFile)
+        self._enabled = True
+        try:
+            os.makedirs(os.path.dirname(self._path), exist_ok=True)
+            with self._connect() as conn:
+                conn.execute(
+                    "CREATE TABLE IF NOT EXISTS fileRows ("
+                    "relPath TEXT PRIMARY KEY, size INTEGER, mtime REAL, row TEXT)"
+                )
+        except (OSError, sqlite3.Error) as e:
+            logger.warning(f'Folder index disabled, could not open "{self._path}": {e}')
+            self._enabled = False
+
+    @property
+    def path(self) -> str:
+        return self._path
+
+    @contextlib.contextmanager
+    def _connect(self):
+        """Open a connection, commit on success and always close."""
+        conn = sqlite3.connect(self._path, timeout=10)
+        try:
+            with conn:
+                yield conn
+        finally:
+            conn.close()
+
+    def getRows(self, fileStats: Dict[str, Tuple[int, float]]) -> Dict[str, dict]:
+        """Get cached rows of files that did not change.
+
+        Parameters
+        ----------
+        fileStats : dict
+            Keys are relative paths, values are (size, mtime) from getFileStat()
+
+        Returns
+        -------
+        dict
+            Keys are relative paths of files with a row that is up to date
+        """
+        if not self._enabled or not fileStats:
+            return {}
+        rows = {}
+        try:
+            with self._connect() as conn:
+                for relPath, size, mtime, row in conn.execute(
+                    "SELECT relPath, size, mtime, row FROM fileRows"
+                ):
+                    if fileStats.get(relPath) == (size, mtime):
+                        rows[relPath] = json.loads(row)
+        except sqlite3.Error as e:
+            logger.warning(f'Could not read folder index "{self._path}": {e}')
+        return rows
+
+    def setRows(self, rows: List[Tuple[str, Tuple[int, float], dict]]):
+        """Save rows as a list of (relPath, (size, mtime), rowDict)."""
+        if not self._enabled or not rows:
+            return
+        values = [
+            (relPath, size, mtime, json.dumps(rowDict, default=_jsonDefault))
+            for relPath, (size, mtime), rowDict in rows
+        ]
+        try:
+            with self._connect() as conn:
+                conn.executemany(
+                    "INSERT OR REPLACE INTO fileRows (relPath, size, mtime, row) VALUES (?, ?, ?, ?)",
+                    values,
+                )
+        except sqlite3.Error as e:
+            logger.warning(f'Could not write folder index "{self._path}": {e}')
+
+    def getRelPaths(self) -> List[str]:
+        """Get relative paths of all indexed files."""
+        if not self._enabled:
+            return []
+        try:
+            with self._connect() as conn:
+                return [relPath for (relPath,) in conn.execute("SELECT relPath FROM fileRows")]
+        except sqlite3.Error as e:
+            logger.warning(f'Could not read folder index "{self._path}": {e}')
+            return []
+
+    def removeRows(self, relPaths: List[str]):
+        """Remove rows, for example of deleted files."""
+        if not self._enabled or not relPaths:
+            return
+        try:
+            with self._connect() as conn:
+                conn.executemany(
+                    "DELETE FROM fileRows WHERE relPath = ?",
+                    [(relPath,) for relPath in relPaths],
+                )
+        except sqlite3.Error as e:
+            logger.warning(f'Could not write folder index "{self._path}": {e}')
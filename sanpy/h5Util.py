@@ -1,18 +1,28 @@
 import os
-import sys
 import time
-import pathlib
-import shutil
+import json
+import warnings
+from typing import Dict, List, Optional, Tuple
 
+import numpy as np
 import pandas as pd
 
-# april 5, removed (why did I remove???)
-import tables.scripts.ptrepack  # to save compressed .h5 file
+import tables
+
+from sanpy.bAnalysisResults import NumpyEncoder, _isNull
 
 from sanpy.sanpyLogger import get_logger
 
 logger = get_logger(__name__)
 
+recordingFormat = 1
+"""Version of the layout written by saveRecording(), legacy (pandas) recordings do not have one."""
+
+_filters = tables.Filters(complevel=4, complib="zlib", shuffle=True)
+
+_nullsGroup = "_nulls"
+"""Group with the null mask of int columns that have missing values."""
+
 def listKeys(hdfPath, printData=False):
     """List all keys in h5 file."""
     with pd.HDFStore(hdfPath, mode="r") as store:
@@ -23,83 +33,449 @@ def listKeys(hdfPath, printData=False):
                 print(store[key])
 
 
-def _getTmpHdfFile(hdfPath):
-    """Get temporary h5 file to write to.
-
-    We will always then compress with _rebuildHdf.
+def _getNodeBytes(node) -> int:
+    """Get the bytes a group (or array) takes in the file.
 
-    Used in analysisDir to delete uuid from h5 file
+    This is 'footprintBytes', the file growth when the group was written.
+    Groups written before it was kept use the size of their arrays.
     """
-    if not os.path.isfile(hdfPath):
-        logger.error(f"File not found {hdfPath}")
-        return
-
-    logger.info("")
-
-    _folder, _file = os.path.split(hdfPath)
-
-    tmpHdfFile = os.path.splitext(_file)[0] + "_tmp.h5"
-    tmpHdfPath = pathlib.Path(_folder) / tmpHdfFile
-
-    # the compressed version from the last save
-    hdfFile = os.path.splitext(_file)[0] + ".h5"
-    hdfFilePath = pathlib.Path(_folder) / hdfFile
-
-    # hdfMode = 'w'
-    if os.path.isfile(hdfFilePath):
-        logger.info(f"    copying existing hdf file to tmp ")
-        logger.info(f"    hdfFilePath {hdfFilePath}")
-        logger.info(f"    tmpHdfPath {tmpHdfPath}")
-        shutil.copyfile(hdfFilePath, tmpHdfPath)
+    if "footprintBytes" in node._v_attrs:
+        return int(node._v_attrs.footprintBytes)
+    if isinstance(node, tables.Leaf):
+        leaves = [node]
     else:
-        pass
-        # compressed file does not exist, just use tmp path
-        # print('   does not exist:', hdfFilePath)
-
-    return tmpHdfPath
-
-
-def _repackHdf(hdfPath):
-    _folder, _file = os.path.split(hdfPath)
+        leaves = node._f_walknodes("Leaf")
+    numBytes = 0
+    for leaf in leaves:
+        try:
+            numBytes += leaf.size_on_disk
+        except NotImplementedError:
+            # pickled object columns of legacy recordings
+            numBytes += leaf.size_in_memory
+    return numBytes
+
+
+def _removeNode(h5File, name: str):
+    """Remove a group from root and remember its bytes as unused, see getFragmentation()."""
+    node = h5File.root._f_get_child(name)
+    unusedBytes = _getNodeBytes(node)
+    h5File.remove_node(h5File.root, name, recursive=True)
+    rootAttrs = h5File.root._v_attrs
+    rootAttrs.unusedBytes = int(rootAttrs["unusedBytes"] if "unusedBytes" in rootAttrs else 0) + unusedBytes
+
+
+def saveTable(hdfPath: str, key: str, df: pd.DataFrame):
+    """Save (or replace) a DataFrame in an h5 file, like the analysisDir file table.
+
+    The old table is counted as unused, see getFragmentation().
+    """
+    if os.path.isfile(hdfPath):
+        with tables.open_file(hdfPath, mode="a") as h5File:
+            if key in h5File.root:
+                _removeNode(h5File, key)
+        startBytes = os.path.getsize(hdfPath)
+    else:
+        startBytes = 0
+    # space freed in another session is not reused, the table is written at the end
+    df.to_hdf(hdfPath, key=key)
+    with tables.open_file(hdfPath, mode="a") as h5File:
+        h5File.root._f_get_child(key)._v_attrs.footprintBytes = (
+            os.path.getsize(hdfPath) - startBytes
+        )
 
-    # rebuild the file to remove old changes and reduce size
-    # tmpHdfFile = os.path.splitext(_file)[0] + '_tmp.h5'
-    # tmpHdfPath = pathlib.Path(_folder) / tmpHdfFile
 
-    # always write to a tmp and then repack into hdfPath
-    tmpHdfPath = _getTmpHdfFile(hdfPath)
+def getFragmentation(hdfPath: str) -> float:
+    """Get the fraction of an h5 file that is unused.
 
-    hdfFile = os.path.splitext(_file)[0] + ".h5"
-    hdfPath = pathlib.Path(_folder) / hdfFile
-    logger.info(f"Rebuilding h5 to {hdfPath}")
+    HDF5 does not reuse the space of removed (or replaced) recordings once the file is closed,
+    it is counted when they are removed and freed by compactHdf().
+    """
+    if not os.path.isfile(hdfPath):
+        return 0.0
+    with tables.open_file(hdfPath, mode="r") as h5File:
+        rootAttrs = h5File.root._v_attrs
+        unusedBytes = rootAttrs["unusedBytes"] if "unusedBytes" in rootAttrs else 0
+    fileBytes = os.path.getsize(hdfPath)
+    return min(unusedBytes / fileBytes, 1.0) if fileBytes > 0 else 0.0
 
-    # can't pass sys.argv a 'PosixPath' from pathlib.Path, needs to be a string
-    tmpHdfPath = str(tmpHdfPath)
-    hdfPath = str(hdfPath)
 
-    # when calling ptrepack, we need trailing ':' on each src/dst path
-    # without this Windows fails to find the file
-    _tmpHdfPath = tmpHdfPath + ":"
-    _hdfPath = hdfPath + ":"
+def compactHdf(hdfPath: str) -> bool:
+    """Rewrite an h5 file without its unused space.
 
-    # The first item is normally the command line command name (not used)
-    sys.argv = ["", "--overwrite", "--chunkshape=auto", _tmpHdfPath, _hdfPath]
+    All nodes are copied into '<file>_tmp.h5' which then replaces hdfPath,
+    hdfPath is left as is if the copy fails.
 
-    logger.info("    running tables.scripts.ptrepack.main()")
-    logger.info(f"    sys.argv: {sys.argv}")
+    Returns
+    -------
+    bool
+        True if the file was compacted
+    """
+    start = time.time()
+    _folder, _file = os.path.split(hdfPath)
+    tmpHdfPath = os.path.join(_folder, os.path.splitext(_file)[0] + "_tmp.h5")
     try:
-        tables.scripts.ptrepack.main()
+        with tables.open_file(hdfPath, mode="r") as h5File, warnings.catch_warnings():
+            warnings.simplefilter("ignore", tables.NaturalNameWarning)
+            h5File.copy_file(tmpHdfPath, overwrite=True)
+        with tables.open_file(tmpHdfPath, mode="a") as h5File:
+            h5File.root._v_attrs.unusedBytes = 0
+        os.replace(tmpHdfPath, hdfPath)
+    except (OSError, tables.HDF5ExtError) as e:
+        logger.error(f'Did not compact "{hdfPath}": {e}')
+        if os.path.isfile(tmpHdfPath):
+            os.remove(tmpHdfPath)
+        return False
+    logger.info(f'Compacted "{hdfPath}" in {round(time.time()-start,2)} seconds')
+    return True
+
+
+#
+# One recording (bAnalysis) per uuid group, one typed array per column:
+#
+#   /<uuid>                  attrs: recordingFormat, analysisStamp, detectionDict, metaDataDict (json)
+#   /<uuid>/spikes/<key>     one array per analysis result key, attrs: kind
+#   /<uuid>/spikes/_nulls    null masks of int columns with missing values
+#   /<uuid>/spikes/errors    ragged lists of dict, normalized into a table with one row per dict
+#   /<uuid>/spikes/widths      (group of arrays, column '_row' is the spike row)
+#
+
+def _getValuesKind(values) -> str:
+    """Get how to store a column.
+
+    Returns one of ('numeric', 'int', 'float', 'bool', 'str', 'table', 'json').
+    'table' is a list of dict per row (like 'errors' and 'widths').
+    """
+    if isinstance(values, np.ndarray) and values.dtype != object:
+        return "numeric"
+    notNull = [v for v in values if not _isNull(v)]
+    hasNull = len(notNull) < len(values)
+    if not hasNull and all(isinstance(v, str) for v in notNull):
+        return "str"
+    elif not hasNull and all(isinstance(v, (bool, np.bool_)) for v in notNull):
+        return "bool"
+    elif all(
+        isinstance(v, (int, np.integer)) and not isinstance(v, (bool, np.bool_))
+        for v in notNull
+    ):
+        return "int"
+    elif all(
+        isinstance(v, (int, float, np.integer, np.floating))
+        and not isinstance(v, (bool, np.bool_))
+        for v in notNull
+    ):
+        return "float"
+    elif all(
+        isinstance(v, list) and all(isinstance(oneDict, dict) for oneDict in v)
+        for v in notNull
+    ):
+        return "table"
+    return "json"
+
+
+def _createArray(h5File, group, name: str, array: np.ndarray):
+    """Create a compressed array, pytables can not compress an empty array."""
+    if len(array) == 0:
+        return h5File.create_array(group, name, obj=array)
+    return h5File.create_carray(group, name, obj=array, filters=_filters)
+
+
+def _writeColumns(h5File, group, columns: Dict[str, object], numRows: int):
+    """Write one array per column into group, see _readColumns()."""
+    group._v_attrs.numRows = numRows
+    group._v_attrs.columns = json.dumps(list(columns.keys()))
+    for name, values in columns.items():
+        kind = _getValuesKind(values)
+        if kind == "table":
+            rowList = []
+            dictList = []
+            for row, oneList in enumerate(values):
+                if _isNull(oneList):
+                    continue
+                rowList += [row] * len(oneList)
+                dictList += oneList
+            fieldNames = list(dict.fromkeys(k for oneDict in dictList for k in oneDict))
+            fieldColumns = {"_row": np.array(rowList, dtype=np.int64)}
+            for fieldName in fieldNames:
+                fieldColumns[fieldName] = [oneDict.get(fieldName) for oneDict in dictList]
+            tableGroup = h5File.create_group(group, name)
+            _writeColumns(h5File, tableGroup, fieldColumns, len(dictList))
+            continue
+
+        if kind == "numeric":
+            array = values
+        elif kind == "int":
+            nulls = np.array([_isNull(v) for v in values], dtype=bool)
+            array = np.array([0 if isNull else v for v, isNull in zip(values, nulls)], dtype=np.int64)
+            if nulls.any():
+                if _nullsGroup not in group:
+                    h5File.create_group(group, _nullsGroup)
+                _createArray(h5File, group._f_get_child(_nullsGroup), name, nulls)
+        elif kind == "float":
+            array = np.array([np.nan if _isNull(v) else v for v in values], dtype=np.float64)
+        elif kind == "bool":
+            array = np.array(values, dtype=bool)
+        else:
+            if kind == "json":
+                values = [json.dumps(v, cls=NumpyEncoder) for v in values]
+            array = np.char.encode(np.array(values, dtype=str), "utf-8")
+        node = _createArray(h5File, group, name, array)
+        node.attrs.kind = kind
+
+
+def _readColumns(group, names: List[str] = None) -> Tuple[Dict[str, object], int]:
+    """Read columns written by _writeColumns(), only the arrays in names are read.
+
+    Returns
+    -------
+    columns : dict
+        Numeric columns are np.ndarray, int columns with missing values and
+        all other columns are lists
+    numRows : int
+    """
+    numRows = int(group._v_attrs.numRows)
+    allNames = json.loads(group._v_attrs.columns)
+    if names is None:
+        names = allNames
+
+    columns = {}
+    for name in names:
+        if name not in allNames:
+            logger.warning(f'did not find column "{name}" in {group._v_pathname}')
+            continue
+        node = group._f_get_child(name)
+        if isinstance(node, tables.Group):
+            # ragged list of dict per row
+            fieldColumns, _ = _readColumns(node)
+            rowList = fieldColumns.pop("_row").tolist()
+            fieldColumns = {
+                k: v.tolist() if isinstance(v, np.ndarray) else v
+                for k, v in fieldColumns.items()
+            }
+            values = [[] for _ in range(numRows)]
+            for idx, row in enumerate(rowList):
+                values[row].append({k: v[idx] for k, v in fieldColumns.items()})
+            columns[name] = values
+            continue
+
+        kind = node.attrs.kind
+        values = node.read()
+        if kind == "int" and _nullsGroup in group and name in group._f_get_child(_nullsGroup):
+            nulls = group._f_get_child(_nullsGroup)._f_get_child(name).read()
+            values = [None if isNull else v for v, isNull in zip(values.tolist(), nulls.tolist())]
+        elif kind in ("str", "json"):
+            values = np.char.decode(values, "utf-8").tolist()
+            if kind == "json":
+                values = [json.loads(v) for v in values]
+        columns[name] = values
+    return columns, numRows
+
+
+def saveRecording(
+    hdfPath: str,
+    uuid: str,
+    detectionDict: Optional[dict],
+    metaDataDict: dict,
+    spikeDict: "sanpy.bAnalysisResults.analysisResultList",
+):
+    """Save (or replace) the analysis of one recording, other recordings are not touched.
+
+    Parameters
+    ----------
+    hdfPath : str
+    uuid : str
+        Group of the recording, from bAnalysis.uuid
+    detectionDict : dict
+        Detection parameters used, None if not analyzed
+    metaDataDict : dict
+        Per file metadata
+    spikeDict : sanpy.bAnalysisResults.analysisResultList
+        Spike analysis results, saved column by column
+    """
+    columns = {}
+    for k in spikeDict.keys():
+        # int columns as list so missing values are kept
+        asList = spikeDict.getColumnKind(k) == "int"
+        columns[k] = spikeDict.getColumn(k, asList=asList)
+
+    tmpName = uuid + "_tmp"
+    with tables.open_file(hdfPath, mode="a") as h5File:
+        if tmpName in h5File.root:
+            _removeNode(h5File, tmpName)
+        # written at the end of the file before the old group is removed,
+        # so the file growth is what it takes (see getFragmentation())
+        startBytes = h5File.get_filesize()
+        group = h5File.create_group(h5File.root, tmpName)
+        group._v_attrs.recordingFormat = recordingFormat
+        group._v_attrs.analysisStamp = time.time()
+        group._v_attrs.detectionDict = json.dumps(detectionDict, cls=NumpyEncoder)
+        group._v_attrs.metaDataDict = json.dumps(dict(metaDataDict), cls=NumpyEncoder)
+        spikeGroup = h5File.create_group(group, "spikes")
+        _writeColumns(h5File, spikeGroup, columns, len(spikeDict))
+        h5File.flush()
+        group._v_attrs.footprintBytes = h5File.get_filesize() - startBytes
+
+        if uuid in h5File.root:
+            _removeNode(h5File, uuid)
+        h5File.rename_node(h5File.root, uuid, name=tmpName)
+
+
+def loadRecording(
+    hdfPath: str, uuid: str, columns: List[str] = None
+) -> Optional[Tuple[Optional[dict], dict, pd.DataFrame]]:
+    """Load the analysis of one recording saved with saveRecording().
+
+    Parameters
+    ----------
+    hdfPath : str
+    uuid : str
+    columns : list of str
+        Analysis result keys to load, None for all. Only these columns are read from disk.
+
+    Returns
+    -------
+    (detectionDict, metaDataDict, df)
+        df has one row per spike, None if uuid is not a saved recording (or is legacy)
+    """
+    if not os.path.isfile(hdfPath):
+        return None
+    with tables.open_file(hdfPath, mode="r") as h5File:
+        if uuid not in h5File.root:
+            return None
+        group = h5File.root._f_get_child(uuid)
+        if "recordingFormat" not in group._v_attrs:
+            return None
+        detectionDict = json.loads(group._v_attrs.detectionDict)
+        metaDataDict = json.loads(group._v_attrs.metaDataDict)
+        spikeColumns, numSpikes = _readColumns(group._f_get_child("spikes"), columns)
+    df = pd.DataFrame(spikeColumns, index=pd.RangeIndex(numSpikes))
+    return detectionDict, metaDataDict, df
+
+
+def loadDetectionDict(hdfPath: str, uuid: str) -> Optional[dict]:
+    """Load the detection parameters of one recording saved with saveRecording().
+
+    Only the group attributes are read, not the analysis.
+
+    Returns
+    -------
+    dict
+        None if uuid is not a saved recording (or is legacy) or was not analyzed
+    """
+    if not os.path.isfile(hdfPath):
+        return None
+    with tables.open_file(hdfPath, mode="r") as h5File:
+        if uuid not in h5File.root:
+            return None
+        group = h5File.root._f_get_child(uuid)
+        if "recordingFormat" not in group._v_attrs:
+            return None
+        return json.loads(group._v_attrs.detectionDict)
+
+
+def removeRecording(hdfPath: str, uuid: str) -> bool:
+    """Remove one recording (columnar or legacy) from an h5 file.
+
+    Returns
+    -------
+    bool
+        False if uuid was not in the file
+    """
+    with tables.open_file(hdfPath, mode="a") as h5File:
+        if uuid not in h5File.root:
+            return False
+        _removeNode(h5File, uuid)
+    return True
 
-        # delete the temporary (large file)
-        logger.info(f"    Deleting tmp file: {tmpHdfPath}")
-        os.remove(tmpHdfPath)
 
-        # self.signalApp(f'Saved compressed folder analysis with tables.scripts.ptrepack.main()')
+def getAnalysisStamps(hdfPath: str) -> Dict[str, float]:
+    """Get the time each recording was saved, keys are uuid.
 
-    except FileNotFoundError as e:
-        logger.error("tables.scripts.ptrepack.main() failed ... file was not saved")
-        logger.error(e)
-        # self.signalApp(f'ERROR in tables.scripts.ptrepack.main(): {e}')
+    Only the group attributes are read. Recordings saved before stamps were kept are not included.
+    Also works on a pool file, see savePoolFrames().
+    """
+    if not os.path.isfile(hdfPath):
+        return {}
+    stamps = {}
+    with tables.open_file(hdfPath, mode="r") as h5File:
+        for group in h5File.root._f_iter_nodes("Group"):
+            if "analysisStamp" in group._v_attrs:
+                stamps[group._v_name] = float(group._v_attrs.analysisStamp)
+    return stamps
+
+
+#
+# Pooled analysis (see analysisDir.pool_build), one group per recording:
+#
+#   /<uuid>                  attrs: analysisStamp of the recording it was extracted from
+#   /<uuid>/<column>         one array per column of the pooled df, see _writeColumns()
+#
+
+def savePoolFrames(
+    hdfPath: str,
+    frames: Dict[str, Tuple[float, Optional[pd.DataFrame]]],
+    removeUuids: List[str] = None,
+):
+    """Save (or replace) the pooled df of recordings, other recordings are not touched.
+
+    Parameters
+    ----------
+    hdfPath : str
+    frames : dict
+        Keys are uuid, values are (analysisStamp, df).
+        df is None for a recording that has no spikes.
+    removeUuids : list of str
+        Recordings to remove, for example deleted from the recording db
+    """
+    if not frames and not removeUuids:
+        return
+    with tables.open_file(hdfPath, mode="a") as h5File, warnings.catch_warnings():
+        # columns like 'Cell Type' are not python identifiers
+        warnings.simplefilter("ignore", tables.NaturalNameWarning)
+        for uuid in removeUuids or []:
+            if uuid in h5File.root:
+                _removeNode(h5File, uuid)
+        for uuid, (analysisStamp, df) in frames.items():
+            if uuid in h5File.root:
+                _removeNode(h5File, uuid)
+            startBytes = h5File.get_filesize()
+            group = h5File.create_group(h5File.root, uuid)
+            group._v_attrs.analysisStamp = analysisStamp
+            if df is None:
+                columns = {}
+                numRows = 0
+            else:
+                columns = {
+                    colStr: df[colStr].to_numpy() if df[colStr].dtype.kind in "biuf" else df[colStr].tolist()
+                    for colStr in df.columns
+                }
+                numRows = len(df)
+            _writeColumns(h5File, group, columns, numRows)
+            h5File.flush()
+            group._v_attrs.footprintBytes = h5File.get_filesize() - startBytes
+
+
+def loadPoolFrames(hdfPath: str, uuids: List[str]) -> Dict[str, Optional[pd.DataFrame]]:
+    """Load the pooled df of recordings saved with savePoolFrames().
+
+    Returns
+    -------
+    dict
+        Keys are uuid, the df is None if the recording has no spikes.
+        Recordings that are not in the file are not included.
+    """
+    if not os.path.isfile(hdfPath):
+        return {}
+    frames = {}
+    with tables.open_file(hdfPath, mode="r") as h5File:
+        for uuid in uuids:
+            if uuid not in h5File.root:
+                continue
+            columns, numRows = _readColumns(h5File.root._f_get_child(uuid))
+            if numRows == 0:
+                frames[uuid] = None
+            else:
+                frames[uuid] = pd.DataFrame(columns, index=pd.RangeIndex(numRows))
+    return frames
 
 
 def _loadAnalysis(hdfPath):
@@ -2530,6 +2530,18 @@ class bScatterPlotMainWindow(QtWidgets.QMainWindow):
         # todo: put this somewhere better
         self.setWindowTitle(path)
 
+    def setMasterDf(self, masterDf : pd.DataFrame):
+        """Replace masterDf with one that has more rows and replot.
+
+        Used while a pool is loading (see plotToolPool), columns do not change.
+        """
+        self.masterDf = masterDf
+        for oneCanvas in self.myPlotCanvasList:
+            if oneCanvas is not None:
+                oneCanvas.stateDict.setState('masterDf', masterDf)
+        self.rawTableView.slotSwitchTableDf(masterDf)
+        self.update2()
+
     def on_button_click(self, name):
         """ """
         logger.info(f"=== {name}")
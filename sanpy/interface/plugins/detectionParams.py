@@ -403,8 +403,8 @@ class detectionParams(sanpyPlugin):
         if self.ba is None:
             return
 
-        # spike detect
-        self.ba.spikeDetect(self._detectionDict)
+        # spike detect, only recompute features if just their parameters changed
+        self.ba.spikeDetect(self._detectionDict, incremental=True)
 
         logger.info(f"detected {self.ba.numSpikes} spikes")
 
@@ -17,6 +17,7 @@ logger = get_logger(__name__)
 import sanpy
 from sanpy import bDetection
 from sanpy import bAnalysis
+from sanpy.bExport import summarizeSpikes
 from sanpy.interface import myTableView_tmp  # name conflict with interface.myTableView
 from sanpy.interface.plugins import sanpyPlugin
 from sanpy.interface.plugins import (
@@ -58,51 +59,22 @@ def getStatFi(
     # reduce to only spikes for given epochNumber
     dfEpoch = dfMaster[dfMaster["epoch"] == epochNumber]
 
-    # epochLevels is a list of current injection amplitudes
-    epochLevels = dfEpoch["epochLevel"].unique()
-    epochLevels = np.round(epochLevels, 3)
-
-    # we also want 1st, 2nd, 3rd and nth values
-    # don't use agg variable `first` or `last`` (they skip nan)
-    #   `second`` is not available
-    agg_func_math = {stat: ["count", "mean", "median", "min", "max", "std", "sem"]}
-    as_index = True  # if True then 'sweep' number becomes the row index
-    dfSweepsSummary = (
-        dfEpoch.groupby(["sweep"], as_index=as_index).agg(agg_func_math).round(2)
-    )
-
-    # flatten
-    dfSweepsSummary.columns = [
-        "_".join(col).rstrip("_") for col in dfSweepsSummary.columns.values
-    ]
-
-    # insert as first column, after 'sweeps'
-    dfSweepsSummary.insert(0, "epochLevel", epochLevels)
-    # dfSweepsSummary['epochLevel'] = epochLevels
-
-    # get the first, second and last values
     # if we are doing interval statistics like 'inter spike interval'
     # then always ignore the `first` event in the epoch (e.g. no interval for first spike)
+    skipFirst = [stat] if intervalStat else None
 
-    if intervalStat:
-        firstSpike = 1
-    else:
-        firstSpike = 0
-
-    _first = dfEpoch.groupby(["sweep"], as_index=True)[stat].nth(firstSpike)
-    dfSweepsSummary.at[_first.index, stat + "_first"] = _first.values
-    # print('_first.index', _first.index)
-
-    _second = dfEpoch.groupby(["sweep"], as_index=True)[stat].nth(firstSpike + 1)
-    dfSweepsSummary.at[_second.index, stat + "_second"] = _second.values
-    # print('_second.index', _second.index)
-
-    # _third = dfEpoch.groupby(['sweep'], as_index=True)[stat].nth(2)
-    # dfSweepsSummary.at[_second.index, stat + '_third'] = _third.values
+    # one row per sweep, `first` and `last` do not skip nan
+    stats = ["count", "mean", "median", "min", "max", "std", "sem", "first", "second", "last"]
+    dfSweepsSummary = summarizeSpikes(
+        dfEpoch, [stat], groupBy=["sweep"], stats=stats, skipFirst=skipFirst
+    )
+    roundColumns = [stat + "_" + _stat for _stat in stats[0:7]]
+    dfSweepsSummary[roundColumns] = dfSweepsSummary[roundColumns].round(2)
 
-    _last = dfEpoch.groupby(["sweep"], as_index=True)[stat].nth(-1)
-    dfSweepsSummary.at[_last.index, stat + "_last"] = _last.values
-    # print('_last.index', _last.index)
+    # epochLevel is the current injection amplitude of each sweep
+    # insert as first column, after 'sweeps'
+    dfEpochLevel = summarizeSpikes(dfEpoch, ["epochLevel"], groupBy=["sweep"], stats=["first"])
+    dfSweepsSummary.insert(1, "epochLevel", np.round(dfEpochLevel["epochLevel_first"].to_numpy(), 3))
 
     # 1st / 2nd and 1s / last
     dfSweepsSummary[stat + "_1_2"] = (
@@ -120,9 +92,6 @@ def getStatFi(
 
     dfSweepsSummary["filename"] = filename
 
-    # move index column 'sweep' into a column
-    dfSweepsSummary = dfSweepsSummary.reset_index()
-
     _stopSec = time.time()
     # print(f'Took {round(_stopSec-_startSec,3)} seconds')
 
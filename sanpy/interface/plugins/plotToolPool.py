@@ -1,3 +1,8 @@
+import numpy as np
+import pandas as pd
+
+from PyQt5 import QtWidgets
+
 import sanpy
 from sanpy.interface.plugins import basePlotTool
 
@@ -9,6 +14,9 @@ class plotToolPool(basePlotTool):
 
     myHumanName = "Plot Tool (pool)"
 
+    numWorkers = 4
+    # Number of files to load concurrently when building the pool.
+
     def __init__(self, tmpMasterDf=None, **kwargs):
         """
         tmpMasterDf (pd df): only for debuggin
@@ -21,9 +29,10 @@ class plotToolPool(basePlotTool):
             _analysisDir = self.getSanPyWindow().myAnalysisDir
             if _analysisDir is not None:
                 logger.info('using sanpy app analysis dir')
-                self.masterDf = _analysisDir.pool_build(uniqueColumn=uniqueColumn, allowAutoLoad=False)
+                self._plotPool(_analysisDir, uniqueColumn=uniqueColumn)
                 logger.info('masterDf is')
                 logger.info(f'\n{self.masterDf}')
+                return
             else:
                 logger.error('main SanPY app does not have an analysis dir')
 
@@ -34,6 +43,44 @@ class plotToolPool(basePlotTool):
 
         self.plot()
 
+    def _plotPool(self, analysisDir : "sanpy.analysisDir", uniqueColumn=None):
+        """Plot the first file as soon as it is loaded, then add the rest while they load.
+
+        Saved analysis is read from the pool file (see analysisDir.pool_refresh),
+        other files are loaded on a pool of threads (see analysisDir.pool_iter).
+        The plot is refreshed each time the number of spikes doubles
+        so the pool is only concatenated a few times.
+        """
+        dfList = []
+        numRows = 0
+        numPlotted = 0
+        for _rowIdx, oneDf in analysisDir.pool_iter(uniqueColumn=uniqueColumn,
+                                                     allowAutoLoad=False,
+                                                     numWorkers=self.numWorkers):
+            dfList.append(oneDf)
+            numRows += len(oneDf)
+            if self.masterDf is None or numRows >= 2 * numPlotted:
+                self._setPoolDf(dfList)
+                numPlotted = numRows
+            # keep the interface responsive while loading
+            QtWidgets.QApplication.processEvents()
+
+        if self.masterDf is None:
+            self.plot()  # logs there is no analysis
+        elif numRows > numPlotted:
+            self._setPoolDf(dfList)
+
+    def _setPoolDf(self, dfList):
+        masterDf = pd.concat(dfList, ignore_index=True)
+        # add an index column (for plotting)
+        masterDf['index'] = np.arange(len(masterDf))
+        if self.masterDf is None:
+            self.masterDf = masterDf
+            self.plot()
+        else:
+            self.masterDf = masterDf
+            self.mainWidget2.setMasterDf(masterDf)
+
 if __name__ == "__main__":
     import sys
     # import random
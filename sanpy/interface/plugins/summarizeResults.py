@@ -18,6 +18,7 @@ class SummarizeResults(sanpyPlugin):
      - All: similar to what is exported to csv
      - Human Readable: A subset of human redable columns
      - Sweep summary: Report the mean/std/se/n etc for one sweep
+     - Epoch summary: Report the count/mean/std/se/median/first/last for each (sweep, epoch)
 
     Uses:
         sanpy.bExport
@@ -65,6 +66,9 @@ class SummarizeResults(sanpyPlugin):
         radio3 = QtWidgets.QRadioButton("Sweep Summary")
         radio3.toggled.connect(lambda:self._on_radio_clicked(radio3))
 
+        radio5 = QtWidgets.QRadioButton("Epoch Summary")
+        radio5.toggled.connect(lambda:self._on_radio_clicked(radio5))
+
         radio4 = QtWidgets.QRadioButton("Detection Errors")
         radio4.toggled.connect(lambda:self._on_radio_clicked(radio4))
 
@@ -73,6 +77,7 @@ class SummarizeResults(sanpyPlugin):
         controlsLayout.addWidget(radio1)
         controlsLayout.addWidget(radio2)
         controlsLayout.addWidget(radio3)
+        controlsLayout.addWidget(radio5)
         controlsLayout.addWidget(radio4)
 
         # the number of spikes in the report
@@ -164,6 +169,14 @@ class SummarizeResults(sanpyPlugin):
                 theMin=startSec,
                 theMax=stopSec)
 
+        elif self._reportType == 'Epoch Summary':
+            # one row per (sweep, epoch), see sanpy.bExport.summarizeSpikes()
+            self.cardiacDf = exportObject.getEpochSummary(
+                sweep=self.sweepNumber,
+                epoch=self.epochNumber,
+                theMin=startSec,
+                theMax=stopSec)
+
         elif self._reportType == 'Detection Errors':
             self.cardiacDf = self.ba.dfError
 
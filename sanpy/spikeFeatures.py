@@ -0,0 +1,621 @@
+"""Batch (vectorized) extraction of per spike features.
+
+Given threshold crossings and peaks for all spikes in one sweep,
+compute every feature with windowed array operations rather than
+a Python loop over spikes.
+
+Used by `bAnalysis._spikeDetect2()`, results are the same as the original per spike loop,
+including the order and text of per spike errors.
+
+Features are computed in groups (see `featureGroups`) so `bAnalysis.spikeDetect(incremental=True)`
+only recomputes the groups that depend on changed detection parameters.
+"""
+
+import math
+from typing import List, Tuple
+
+import numpy as np
+
+import sanpy.analysisUtil
+import sanpy.bAnalysisResults
+from sanpy.sanpyLogger import get_logger
+
+logger = get_logger(__name__)
+
+
+def getErrorDict(spikeNumber, pnt, errorType: str, detailStr, dataPointsPerMs) -> dict:
+    """Get error dict for one spike.
+
+    Same keys as `bAnalysis._getErrorDict()`, 'Sweep' and 'Epoch' are filled in later.
+    """
+    sec = pnt / dataPointsPerMs / 1000
+    sec = round(sec, 4)
+    eDict = {
+        "Spike": spikeNumber,
+        "Seconds": sec,
+        "Sweep": "",
+        "Epoch": "",
+        "Type": errorType,
+        "Details": detailStr,
+    }
+    return eDict
+
+
+class _sweepSpikes:
+    """Spikes in one sweep and the traces their features are computed from."""
+
+    def __init__(
+        self,
+        sweepX,
+        filteredVm,
+        filteredDeriv,
+        spikeTimes,
+        peakPnts,
+        peakVals,
+        dDict,
+        dataPointsPerMs,
+        verbose,
+        pntOffset=0,
+        spikeOffset=0,
+    ):
+        self.sweepX = sweepX
+        self.filteredVm = filteredVm
+        self.filteredDeriv = filteredDeriv
+        self.dDict = dDict
+        self.dataPointsPerMs = dataPointsPerMs
+        self.verbose = verbose
+        self.pntOffset = pntOffset
+        self.spikeOffset = spikeOffset
+
+        self.numSpikes = len(spikeTimes)
+        self.numPnts = len(filteredVm)
+
+        self.t = np.asarray(spikeTimes, dtype=np.int64).reshape(self.numSpikes)
+        self.peakPnt = np.asarray(peakPnts, dtype=np.int64).reshape(self.numSpikes)
+        self.peakVal = np.asarray(peakVals, dtype=np.float64).reshape(self.numSpikes)
+
+        self.thresholdSec = ((self.t + pntOffset) / dataPointsPerMs) / 1000
+        self.thresholdVal = filteredVm[self.t]
+        self.peakSec = ((self.peakPnt + pntOffset) / dataPointsPerMs) / 1000
+
+        self.features = {}
+        self.errors = [[] for _ in range(self.numSpikes)]
+
+    def ms2Pnt(self, ms):
+        return int(round(ms * self.dataPointsPerMs))
+
+    def pnt2Ms(self, pnt):
+        return pnt / self.dataPointsPerMs
+
+    def nanArray(self):
+        return np.full(self.numSpikes, np.nan)
+
+    def addErrors(self, mask, errorType, detailFn):
+        for i in np.flatnonzero(mask):
+            eDict = getErrorDict(
+                int(i) + self.spikeOffset,
+                self.t[i] + self.pntOffset,
+                errorType,
+                detailFn(i),
+                self.dataPointsPerMs,
+            )
+            self.errors[i].append(eDict)
+            if self.verbose:
+                logger.error(f"  spike:{i} error:{eDict}")
+
+
+def _thresholdPeak(s: _sweepSpikes):
+    """Threshold and peak."""
+    s.features["thresholdPnt"] = s.t
+    s.features["thresholdSec"] = s.thresholdSec
+    s.features["thresholdVal"] = s.thresholdVal
+    s.features["thresholdVal_dvdt"] = s.filteredDeriv[s.t]
+    s.features["peakPnt"] = s.peakPnt
+    s.features["peakSec"] = s.peakSec
+    s.features["peakVal"] = s.peakVal
+    s.features["peakHeight"] = s.peakVal - s.thresholdVal
+    s.features["timeToPeak_ms"] = (s.peakSec - s.thresholdSec) * 1000
+
+
+def _fastAhp(s: _sweepSpikes):
+    """Fast ahp, minima in a window after the peak."""
+    peakPnt = s.peakPnt
+    fastAhpWindow_pnts = s.ms2Pnt(s.dDict["fastAhpWindow_ms"])
+    fastAhpPnt = s.nanArray()
+    fastAhpValue = s.nanArray()
+    hasAhp = (peakPnt + fastAhpWindow_pnts < len(s.sweepX)) & (fastAhpWindow_pnts > 0)
+    ahpIdx = sanpy.analysisUtil.windowArgMin(
+        s.filteredVm,
+        peakPnt[hasAhp],
+        np.full(hasAhp.sum(), fastAhpWindow_pnts),
+        fastAhpWindow_pnts,
+    )
+    fastAhpPnt[hasAhp] = peakPnt[hasAhp] + ahpIdx
+    fastAhpValue[hasAhp] = s.filteredVm[peakPnt[hasAhp] + ahpIdx]
+    s.features["fastAhpPnt"] = fastAhpPnt
+    s.features["fastAhpSec"] = (fastAhpPnt + s.pntOffset) / s.dataPointsPerMs / 1000
+    s.features["fastAhpValue"] = fastAhpValue
+
+    fastAhpError = np.zeros(s.numSpikes, dtype=bool)
+    fastAhpError[hasAhp] = ahpIdx == fastAhpWindow_pnts - 1
+    s.addErrors(
+        fastAhpError,
+        "Fast AHP was detected at end of fast AHP window",
+        lambda i: "Consider increasing the fast AHP window with fastAhpWindow_ms",
+    )
+
+
+def _preMin(s: _sweepSpikes):
+    """Pre spike min (mdp) and everything derived from it (edd, diastolic duration, cycle length)."""
+    t = s.t
+    filteredVm = s.filteredVm
+    numSpikes = s.numSpikes
+    numPnts = s.numPnts
+
+    #
+    # pre spike min (mdp), search in a predefined window before each spike
+    mdp_pnts = int(s.ms2Pnt(s.dDict["mdp_ms"]))
+    avgWindow_pnts = math.floor(s.ms2Pnt(s.dDict["avgWindow_ms"]) / 2)  # can be 0 !!!
+
+    startPnt = t - mdp_pnts
+    underRun = startPnt < 0
+    startPnt[underRun] = 0
+    s.addErrors(
+        underRun,
+        "Pre spike min under-run (mdp)",
+        lambda i: "Went past startPnt 0 searching for pre-spike min",
+    )
+
+    preMinRel = sanpy.analysisUtil.windowArgMin(
+        filteredVm, startPnt, t - startPnt, mdp_pnts
+    )
+    preMinEmpty = preMinRel < 0
+    preMinRel[preMinEmpty] = startPnt[preMinEmpty]
+    s.addErrors(
+        preMinEmpty,
+        "Pre spike min 0 (mdp)",
+        lambda i: f"Did not find preMinPnt mdp_pnts:{mdp_pnts} startPnt:{startPnt[i] + s.pntOffset} spikeTimes[i]:{t[i] + s.pntOffset}",
+    )
+
+    # preMinLocal is used for (edd, diastolic duration) even if preMinVal was not found
+    preMinPnt = s.nanArray()
+    preMinVal = s.nanArray()
+    if avgWindow_pnts < 1:
+        preMinLocal = preMinRel
+        s.addErrors(
+            np.ones(numSpikes, dtype=bool), "mdp error", lambda i: "avgWindow_pnts"
+        )
+    else:
+        preMinLocal = preMinRel + startPnt
+
+        # the pre min is actually an average around the real minima
+        avgStart = preMinLocal - avgWindow_pnts
+        inBounds = (avgStart >= 0) & (preMinLocal + avgWindow_pnts <= numPnts)
+        avgVal = s.nanArray()
+        avgVal[inBounds] = sanpy.analysisUtil.windowMean(
+            filteredVm, avgStart[inBounds], 2 * avgWindow_pnts
+        )
+        for i in np.flatnonzero(~inBounds):
+            # rare, keep slice semantics of the original per spike code
+            avgVal[i] = np.average(
+                filteredVm[avgStart[i] : preMinLocal[i] + avgWindow_pnts]
+            )
+
+        # search backward from spike to find when vm reaches avgVal
+        searchLen = np.clip(t - preMinLocal, 0, None)
+        backIdx = sanpy.analysisUtil.windowFirst(
+            filteredVm,
+            t - 1,
+            searchLen,
+            searchLen.max(initial=0),
+            avgVal,
+            np.less,
+            step=-1,
+        )
+        found = backIdx >= 0
+        preMinLocal = np.where(found, t - backIdx, preMinLocal)
+        preMinPnt[found] = preMinLocal[found]
+        preMinVal[found] = avgVal[found]
+        s.addErrors(
+            ~found,
+            "Pre spike min (mdp)",
+            lambda i: "Did not find preMinVal: " + str(round(avgVal[i], 3)),
+        )
+    s.features["preMinPnt"] = preMinPnt
+    s.features["preMinVal"] = preMinVal
+
+    #
+    # linear fit on 10% - 50% of the time from preMinPnt to spike threshold
+    startLinearFit = 0.1  # percent of time between pre spike min and AP peak
+    stopLinearFit = 0.5  #
+    timeInterval_pnts = t - preMinLocal
+    preLinearFitPnt0 = preMinLocal + np.rint(timeInterval_pnts * startLinearFit).astype(
+        np.int64
+    )
+    preLinearFitPnt1 = preMinLocal + np.rint(timeInterval_pnts * stopLinearFit).astype(
+        np.int64
+    )
+    s.features["preLinearFitPnt0"] = preLinearFitPnt0
+    s.features["preLinearFitPnt1"] = preLinearFitPnt1
+    s.features["earlyDiastolicDuration_ms"] = s.pnt2Ms(preLinearFitPnt1 - preLinearFitPnt0)
+    s.features["preLinearFitVal0"] = filteredVm[preLinearFitPnt0]
+    s.features["preLinearFitVal1"] = filteredVm[preLinearFitPnt1]
+
+    fitLen = np.clip(preLinearFitPnt1 - preLinearFitPnt0, 0, None)
+    eddRate = sanpy.analysisUtil.windowSlope(
+        s.sweepX, filteredVm, preLinearFitPnt0, fitLen, fitLen.max(initial=0)
+    )
+    s.features["earlyDiastolicDurationRate"] = eddRate
+
+    # np.polyfit() raises on empty x and warns (RankWarning) with one point
+    lowestEddRate = s.dDict["lowEddRate_warning"]  # 8
+    fitError = fitLen < 2
+    lowEddRate = ~fitError & (eddRate <= lowestEddRate)
+    eddErrors = np.where(fitError, 1, np.where(lowEddRate, 2, 0))
+    s.addErrors(
+        eddErrors > 0,
+        "Fit EDD",
+        lambda i: "Early diastolic duration rate fit - preMinPnt == spikePnt"
+        if eddErrors[i] == 1
+        else f"Early diastolic duration rate fit - Too low {round(eddRate[i],3)}<={lowestEddRate}",
+    )
+
+    #
+    # diastolic duration was defined as the interval between MDP and TOP
+    s.features["diastolicDuration_ms"] = s.pnt2Ms(t - preMinLocal)
+
+    # Cycle length was defined as the interval between MDPs in successive APs
+    s.features.update(_cycleLength(preMinPnt, s.dataPointsPerMs))
+
+
+def _preSpikeDvdt(s: _sweepSpikes):
+    """Maxima in dv/dt before spike (between TOP and peak)."""
+    t = s.t
+    dvdtMaxPnt = s.nanArray()
+    preLen = s.peakPnt + 1 - t
+    maxIdx = sanpy.analysisUtil.windowArgMax(
+        s.filteredDeriv, t, preLen, preLen.max(initial=0)
+    )
+    hasMax = maxIdx >= 0
+    dvdtMaxPnt[hasMax] = t[hasMax] + maxIdx[hasMax]
+    s.features["preSpike_dvdt_max_pnt"] = dvdtMaxPnt
+    s.features["preSpike_dvdt_max_val"] = _takeValid(s.filteredVm, dvdtMaxPnt)  # mV
+    s.features["preSpike_dvdt_max_val2"] = _takeValid(s.filteredDeriv, dvdtMaxPnt)
+    s.addErrors(
+        ~hasMax,
+        "Pre Spike dvdt",
+        lambda i: "Searching for dvdt max - ValueError",
+    )
+
+
+def _postSpikeDvdt(s: _sweepSpikes):
+    """Minima in dv/dt after spike."""
+    peakPnt = s.peakPnt
+    dvdtPostWindow_pnts = s.ms2Pnt(s.dDict["dvdtPostWindow_ms"])
+    minIdx = sanpy.analysisUtil.windowArgMin(
+        s.filteredDeriv,
+        peakPnt,
+        np.clip(len(s.filteredDeriv) - peakPnt, 0, dvdtPostWindow_pnts),
+        dvdtPostWindow_pnts,
+    )
+    dvdtMinPnt = np.where(minIdx >= 0, peakPnt + minIdx, np.nan)
+    s.features["postSpike_dvdt_min_pnt"] = dvdtMinPnt
+    s.features["postSpike_dvdt_min_val"] = _takeValid(s.filteredVm, dvdtMinPnt)
+    s.features["postSpike_dvdt_min_val2"] = _takeValid(s.filteredDeriv, dvdtMinPnt)
+
+
+def _interval(s: _sweepSpikes):
+    """Instantaneous spike frequency and ISI, for first spike this is not defined."""
+    s.features.update(_isi(s.t, s.dataPointsPerMs))
+
+
+def _isi(thresholdPnt, dataPointsPerMs) -> dict:
+    isi_pnts = np.full(len(thresholdPnt), np.nan)
+    isi_pnts[1:] = np.diff(thresholdPnt)
+    isi_ms = isi_pnts / dataPointsPerMs
+    with np.errstate(divide="ignore"):
+        spikeFreq_hz = 1 / (isi_ms / 1000)
+    return {"isi_pnts": isi_pnts, "isi_ms": isi_ms, "spikeFreq_hz": spikeFreq_hz}
+
+
+def _cycleLength(preMinPnt, dataPointsPerMs) -> dict:
+    cycleLength_pnts = np.full(len(preMinPnt), np.nan)
+    cycleLength_pnts[1:] = np.diff(preMinPnt)
+    return {
+        "cycleLength_pnts": cycleLength_pnts,
+        "cycleLength_ms": cycleLength_pnts / dataPointsPerMs,
+    }
+
+
+def _halfWidths(s: _sweepSpikes):
+    """Half-widths, one per detection halfHeights."""
+    dataPointsPerMs = s.dataPointsPerMs
+
+    hwWindowPnts = round(s.dDict["halfWidthWindow_ms"] * dataPointsPerMs)
+    halfWidthWindow_ms = hwWindowPnts / dataPointsPerMs
+    halfHeightList = s.dDict["halfHeights"]
+
+    # (spikes, heights)
+    risingPnt, fallingPnt, thisVm, errorMask = sanpy.analysisUtil.halfWidths(
+        s.filteredVm, s.t, s.peakPnt, halfHeightList, hwWindowPnts
+    )
+    widthPnts = fallingPnt - risingPnt
+    widthMs = np.where(errorMask, np.nan, widthPnts / dataPointsPerMs)
+    for j, halfHeight in enumerate(halfHeightList):
+        s.features["widths_" + str(halfHeight)] = widthMs[:, j]
+
+    # one list of widthDict per spike
+    good = (~errorMask).tolist()
+    risingList = risingPnt.tolist()
+    fallingList = fallingPnt.tolist()
+    widthPntsList = widthPnts.tolist()
+    widths = []
+    for i in range(s.numSpikes):
+        widths.append(
+            [
+                {
+                    "halfHeight": halfHeight,
+                    "risingPnt": rising if isGood else None,
+                    "fallingPnt": falling if isGood else None,
+                    "widthPnts": width if isGood else None,
+                    "widthMs": oneWidthMs,
+                }
+                for halfHeight, rising, falling, width, oneWidthMs, isGood in zip(
+                    halfHeightList,
+                    risingList[i],
+                    fallingList[i],
+                    widthPntsList[i],
+                    list(widthMs[i]),
+                    good[i],
+                )
+            ]
+        )
+    s.features["widths"] = widths
+
+    # errors are reported by half-height, then spike
+    for j, halfHeight in enumerate(halfHeightList):
+        s.addErrors(
+            errorMask[:, j],
+            "Spike Width",
+            lambda i: (
+                f'Half width {halfHeight} error in "{"rising point" if fallingPnt[i, j] >= 0 else "falling point"}" '
+                f"with halfWidthWindow_ms:{halfWidthWindow_ms} "
+                f"searching for Vm:{round(thisVm[i, j],2)} from peak sec {round(s.peakSec[i],2)}"
+            ),
+        )
+
+
+# Groups of features, in the order they are computed (and errors are reported).
+# "detection" are the detection parameters each group reads (besides spike times and peaks),
+# "columns" are the analysis results it sets and "errors" are the error types it can report.
+# A column ending in '_' is a prefix, like 'widths_' for 'widths_50'.
+featureGroups = {
+    "thresholdPeak": {
+        "fn": _thresholdPeak,
+        "detection": [],
+        "columns": [
+            "thresholdPnt", "thresholdSec", "thresholdVal", "thresholdVal_dvdt",
+            "peakPnt", "peakSec", "peakVal", "peakHeight", "timeToPeak_ms",
+        ],
+        "errors": [],
+    },
+    "fastAhp": {
+        "fn": _fastAhp,
+        "detection": ["fastAhpWindow_ms"],
+        "columns": ["fastAhpPnt", "fastAhpSec", "fastAhpValue"],
+        "errors": ["Fast AHP was detected at end of fast AHP window"],
+    },
+    "preMin": {
+        "fn": _preMin,
+        "detection": ["mdp_ms", "avgWindow_ms", "lowEddRate_warning"],
+        "columns": [
+            "preMinPnt", "preMinVal",
+            "preLinearFitPnt0", "preLinearFitPnt1", "preLinearFitVal0", "preLinearFitVal1",
+            "earlyDiastolicDuration_ms", "earlyDiastolicDurationRate",
+            "diastolicDuration_ms", "cycleLength_pnts", "cycleLength_ms",
+        ],
+        "errors": [
+            "Pre spike min under-run (mdp)",
+            "Pre spike min 0 (mdp)",
+            "mdp error",
+            "Pre spike min (mdp)",
+            "Fit EDD",
+        ],
+    },
+    "preSpikeDvdt": {
+        "fn": _preSpikeDvdt,
+        "detection": [],
+        "columns": ["preSpike_dvdt_max_pnt", "preSpike_dvdt_max_val", "preSpike_dvdt_max_val2"],
+        "errors": ["Pre Spike dvdt"],
+    },
+    "postSpikeDvdt": {
+        "fn": _postSpikeDvdt,
+        "detection": ["dvdtPostWindow_ms"],
+        "columns": ["postSpike_dvdt_min_pnt", "postSpike_dvdt_min_val", "postSpike_dvdt_min_val2"],
+        "errors": [],
+    },
+    "interval": {
+        "fn": _interval,
+        "detection": [],
+        "columns": ["isi_pnts", "isi_ms", "spikeFreq_hz"],
+        "errors": [],
+    },
+    "halfWidths": {
+        "fn": _halfWidths,
+        "detection": ["halfHeights", "halfWidthWindow_ms"],
+        "columns": ["widths", "widths_"],
+        "errors": ["Spike Width"],
+    },
+}
+
+
+def getFeatureGroup(column: str):
+    """Get the name of the feature group that sets one analysis result column, None if not a feature."""
+    for groupName, group in featureGroups.items():
+        for groupColumn in group["columns"]:
+            if column == groupColumn or (
+                groupColumn.endswith("_") and column.startswith(groupColumn)
+            ):
+                return groupName
+    return None
+
+
+def getInvalidFeatureGroups(oldDetectionDict: dict, newDetectionDict: dict):
+    """Get the feature groups invalidated by changing detection parameters.
+
+    Uses the dependency graph (detection parameter -> analysis results)
+    from the "depends on detection" field of bAnalysisResults.analysisResultDict.
+
+    Returns
+    -------
+    list of str or None
+        Names of feature groups to recompute (in featureGroups order),
+        empty if nothing changed. None if spikes need to be detected again,
+        e.g. a threshold or filter changed.
+    """
+    dependencies = sanpy.bAnalysisResults.getDetectionDependencies()
+
+    invalidGroups = set()
+    for key in set(oldDetectionDict.keys()) | set(newDetectionDict.keys()):
+        if oldDetectionDict.get(key) == newDetectionDict.get(key):
+            continue
+        # skip the column holding the detection parameter itself (like 'halfHeights')
+        columns = [column for column in dependencies.get(key, []) if column != key]
+        if not columns:
+            # we do not know what depends on this key
+            return None
+        for column in columns:
+            groupName = getFeatureGroup(column)
+            if groupName is None or key not in featureGroups[groupName]["detection"]:
+                # key changes the spikes themselves (times, peaks, number of spikes)
+                return None
+            invalidGroups.add(groupName)
+
+    return [groupName for groupName in featureGroups if groupName in invalidGroups]
+
+
+def mergeErrors(oldErrors: list, newErrors: list, groups: List[str]) -> list:
+    """Replace the errors of some feature groups for one spike.
+
+    Errors are kept in the same order as a full detection,
+    detection errors first and then feature groups in order.
+    """
+    groupOrder = list(featureGroups.keys())
+    errorGroup = {}
+    for groupName, group in featureGroups.items():
+        for errorType in group["errors"]:
+            errorGroup[errorType] = groupName
+
+    def _order(eDict):
+        groupName = errorGroup.get(eDict["Type"])
+        return -1 if groupName is None else groupOrder.index(groupName)
+
+    keepErrors = [
+        eDict for eDict in oldErrors if errorGroup.get(eDict["Type"]) not in groups
+    ]
+    return sorted(keepErrors + newErrors, key=_order)
+
+
+def getSpikeFeatures(
+    sweepX: np.ndarray,
+    filteredVm: np.ndarray,
+    filteredDeriv: np.ndarray,
+    spikeTimes,
+    peakPnts,
+    peakVals,
+    dDict: dict,
+    dataPointsPerMs,
+    verbose: bool = False,
+    groups: List[str] = None,
+    pntOffset: int = 0,
+    spikeOffset: int = 0,
+) -> Tuple[dict, List[list]]:
+    """Compute all per spike features for one sweep.
+
+    Parameters
+    ----------
+    sweepX, filteredVm, filteredDeriv : np.ndarray
+        1D traces for one sweep
+    spikeTimes : list of int
+        Threshold crossing (pnt) of each spike
+    peakPnts, peakVals : list
+        AP peak (pnt) and value (mV) of each spike
+    dDict : dict
+        Detection parameters from sanpy.bDetection
+    dataPointsPerMs : int
+    groups : list of str
+        Only compute these feature groups (see featureGroups), None for all
+    pntOffset, spikeOffset : int
+        When traces are a block of the sweep (see sanpy.detectionBlocks), the point in the sweep
+        of the first point in the block and the number of spikes in the sweep before the block.
+        Spike times and peaks are local to the block, returned features and errors are for the sweep.
+
+    Returns
+    -------
+    features : dict
+        Keys are analysis results (see bAnalysisResults), values are np.ndarray with one value per spike.
+        Point keys that may not be found (like preMinPnt) are float with nan.
+        Key 'widths' is a list (one per spike) of widthDict.
+    errors : list of list
+        Errors (dict) for each spike, in the order they were found.
+    """
+    s = _sweepSpikes(
+        sweepX,
+        filteredVm,
+        filteredDeriv,
+        spikeTimes,
+        peakPnts,
+        peakVals,
+        dDict,
+        dataPointsPerMs,
+        verbose,
+        pntOffset=pntOffset,
+        spikeOffset=spikeOffset,
+    )
+    for groupName, group in featureGroups.items():
+        if groups is None or groupName in groups:
+            group["fn"](s)
+    if pntOffset:
+        _shiftPnts(s.features, pntOffset)
+    return s.features, s.errors
+
+
+# Features holding a point in the sweep, see _shiftPnts()
+pntColumns = [
+    "thresholdPnt", "peakPnt", "fastAhpPnt", "preMinPnt",
+    "preLinearFitPnt0", "preLinearFitPnt1",
+    "preSpike_dvdt_max_pnt", "postSpike_dvdt_min_pnt",
+]
+
+
+def _shiftPnts(features: dict, pntOffset: int):
+    """Shift features holding a point in a block of a sweep to points in the sweep."""
+    for key in pntColumns:
+        if key in features:
+            features[key] = features[key] + pntOffset
+    for oneSpikeWidths in features.get("widths", []):
+        for widthDict in oneSpikeWidths:
+            for key in ("risingPnt", "fallingPnt"):
+                if widthDict[key] is not None:
+                    widthDict[key] += pntOffset
+
+
+def stitchIntervals(features: dict, dataPointsPerMs):
+    """Recompute features that span spikes (isi, cycle length) once blocks of a sweep are stitched.
+
+    Parameters
+    ----------
+    features : dict
+        Features for all spikes in one sweep, in order.
+        Needs thresholdPnt and preMinPnt, updates features in place.
+    """
+    features.update(_isi(features["thresholdPnt"], dataPointsPerMs))
+    features.update(_cycleLength(features["preMinPnt"], dataPointsPerMs))
+
+
+def _takeValid(x, pnts):
+    """Get x[pnts] where pnts is float with nan for missing points."""
+    valid = ~np.isnan(pnts)
+    theRet = np.full(len(pnts), np.nan)
+    theRet[valid] = x[pnts[valid].astype(np.int64)]
+    return theRet
@@ -0,0 +1,194 @@
+"""Detect spikes in a live recording as blocks of samples arrive.
+
+Uses the same detection and features as offline analysis (`bAnalysis.spikeDetect()`),
+see sanpy.detectionBlocks. A spike is reported once the samples after it
+(peakWindow_ms, halfWidthWindow_ms, fastAhpWindow_ms, dvdtPostWindow_ms) have arrived.
+Only the samples needed to detect the next spikes are kept.
+
+Example
+-------
+
+```python
+import sanpy
+
+dDict = sanpy.bDetection().getDetectionDict('SA Node')
+stream = sanpy.spikeStream(dDict, sampleRate=20000)
+
+# samples is a 1D np.ndarray from the acquisition
+for samples in acquisition:
+    for spike in stream.push(samples):
+        print(spike['thresholdSec'], spike['spikeFreq_hz'], spike['widths_50'])
+
+# end of recording
+lastSpikes = stream.flush()
+```
+"""
+
+import copy
+from typing import List
+
+import numpy as np
+
+import sanpy
+import sanpy.detectionBlocks
+import sanpy.spikeFeatures
+from sanpy.fileloaders.fileLoader_base import fileLoader_base
+
+from sanpy.sanpyLogger import get_logger
+
+logger = get_logger(__name__)
+
+
+class _streamLoader(fileLoader_base):
+    """File loader without a file, holds the sample rate of a stream."""
+
+    loadFileType = None
+
+    def __init__(self, sampleRate: float):
+        self._sampleRate = sampleRate
+        super().__init__(None)
+
+    def loadFile(self):
+        # two samples so derived values (sample interval) are defined, samples are in spikeStream
+        sweepX = np.arange(2).reshape(-1, 1) / self._sampleRate
+        sweepY = np.zeros((2, 1))
+        self.setLoadedData(sweepX, sweepY, xLabel="sec", yLabel="mV")
+        self._dataPointsPerMs = self._sampleRate / 1000
+
+
+class spikeStream:
+    """Detect spikes in successive blocks of samples from one (gap free) recording."""
+
+    def __init__(self, detectionDict: dict, sampleRate: float):
+        """
+        Parameters
+        ----------
+        detectionDict : dict
+            Detection parameters from sanpy.bDetection
+        sampleRate : float
+            Samples per second (Hz)
+        """
+        self._sampleRate = sampleRate
+        self._dataPointsPerMs = sampleRate / 1000
+
+        self._ba = sanpy.bAnalysis(fileLoader=_streamLoader(sampleRate))
+        self._ba._detectionDict = copy.deepcopy(detectionDict)
+        self._ba._getFilteredRecording()
+
+        self._prePnts, self._postPnts = sanpy.detectionBlocks.getBlockMargins(
+            detectionDict, self._dataPointsPerMs
+        )
+
+        # samples [self._bufferStart, self._numSamples) of the recording
+        self._buffer = np.zeros(self._prePnts + self._postPnts + 1)
+        self._bufferStart = 0
+        self._numSamples = 0
+
+        # first sample of the next block core
+        self._coreStart = 0
+        self._state = sanpy.detectionBlocks.detectionBlock.newState()
+
+        # (thresholdPnt, preMinPnt) of the last spike, for isi and cycle length of the next
+        self._lastSpike = None
+
+    @property
+    def numSamples(self) -> int:
+        """Number of samples pushed so far."""
+        return self._numSamples
+
+    @property
+    def numSpikes(self) -> int:
+        """Number of spikes reported so far."""
+        return self._state["numSpikes"]
+
+    @property
+    def bufferSize(self) -> int:
+        """Number of samples currently held."""
+        return self._numSamples - self._bufferStart
+
+    def push(self, samples) -> List[dict]:
+        """Add the next block of samples.
+
+        Returns
+        -------
+        list of dict
+            One dict per spike (keys are from sanpy.bAnalysisResults) for spikes
+            whose post spike windows are complete, in order.
+        """
+        samples = np.asarray(samples, dtype=np.float64).ravel()
+        self._append(samples)
+        return self._detect(self._numSamples - self._postPnts)
+
+    def flush(self) -> List[dict]:
+        """Report the remaining spikes at the end of the recording.
+
+        Their post spike windows are cut off like spikes at the end of a sweep.
+        """
+        return self._detect(self._numSamples)
+
+    def _append(self, samples: np.ndarray):
+        """Append samples to the buffer, dropping samples no longer needed."""
+        # keep the margin before the next block core
+        keepStart = max(self._coreStart - self._prePnts, 0)
+        if keepStart > self._bufferStart:
+            numKeep = self._numSamples - keepStart
+            dropPnts = keepStart - self._bufferStart
+            self._buffer[:numKeep] = self._buffer[dropPnts : dropPnts + numKeep]
+            self._bufferStart = keepStart
+
+        numHeld = self._numSamples - self._bufferStart
+        if numHeld + len(samples) > len(self._buffer):
+            newBuffer = np.zeros(max(2 * len(self._buffer), numHeld + len(samples)))
+            newBuffer[:numHeld] = self._buffer[:numHeld]
+            self._buffer = newBuffer
+        self._buffer[numHeld : numHeld + len(samples)] = samples
+        self._numSamples += len(samples)
+
+    def _detect(self, coreStop: int) -> List[dict]:
+        """Detect spikes with threshold crossings in [self._coreStart, coreStop)."""
+        if coreStop <= self._coreStart:
+            return []
+
+        startPnt = max(self._coreStart - self._prePnts, 0)
+        sweepY = self._buffer[
+            startPnt - self._bufferStart : self._numSamples - self._bufferStart
+        ]
+        filteredVm, filteredDeriv = self._ba.fileLoader._filterTrace(
+            sweepY.reshape(-1, 1), *self._ba.fileLoader._filterParams
+        )
+        # same as pyabf sweepX
+        sweepX = (startPnt + np.arange(len(sweepY))) * (1 / self._sampleRate)
+
+        block = sanpy.detectionBlocks.detectionBlock(
+            sweepX,
+            sweepY,
+            filteredVm,
+            filteredDeriv,
+            startPnt,
+            self._coreStart,
+            coreStop,
+            self._state,
+        )
+        spikeDict = self._ba._spikeDetect2(0, block=block)
+        self._coreStart = coreStop
+
+        if spikeDict is None or len(spikeDict) == 0:
+            return []
+
+        spikeDict.setColumn("spikeNumber", spikeDict.getColumn("sweepSpikeNumber"))
+
+        # first spike needs the last spike of the blocks before for (isi, cycle length)
+        thresholdPnt = spikeDict.getColumn("thresholdPnt")
+        preMinPnt = spikeDict.getColumn("preMinPnt")
+        if self._lastSpike is not None:
+            features = {
+                "thresholdPnt": np.concatenate(([self._lastSpike[0]], thresholdPnt)),
+                "preMinPnt": np.concatenate(([self._lastSpike[1]], preMinPnt)),
+            }
+            sanpy.spikeFeatures.stitchIntervals(features, self._dataPointsPerMs)
+            for key, values in features.items():
+                if key not in ("thresholdPnt", "preMinPnt"):
+                    spikeDict.setColumn(key, values[1:])
+        self._lastSpike = (thresholdPnt[-1], preMinPnt[-1])
+
+        return spikeDict.asList()
@@ -41,10 +41,20 @@ def _getObjectList(verbose=True) -> List[dict]:
 
     Each of these is an object we can (i) construct or (ii) interrogate static class members
 
+    Classes are found once per process and found again only when files in the
+    user analysis folder change (added, removed or edited).
+    `verbose` is kept for compatibility, classes are logged when they are found.
+
     Returns
     -------
     list of dict
     """
+    # copy so callers can not change the cache
+    return list(_objectListCache.get())
+
+
+def _findObjectList(verbose=True) -> List[dict]:
+    """Find user analysis classes, see _getObjectList()."""
 
     if verbose:
         logger.info("Loading user analysis plugins")
@@ -151,6 +161,12 @@ def _getObjectList(verbose=True) -> List[dict]:
     return loadedModuleList  # list of dict
 
 
+_objectListCache = sanpy._util._folderCache(
+    _findObjectList, lambda: sanpy._util._getUserAnalysisFolder()
+)
+"""User analysis classes of this process, see _getObjectList()."""
+
+
 def findUserAnalysisStats() -> List[dict]:
     """Get the stat names of all user defined analysis.
     
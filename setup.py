@@ -139,6 +139,7 @@ setup(
     entry_points={
         'console_scripts': [
             'sanpy=sanpy.interface.sanpy_app:main',
+            'sanpy-batch=sanpy.batch:main',
         ]
     },
 )
@@ -53,5 +53,244 @@ class Test_Analysis(unittest.TestCase):
 
         self.assertEqual(len(thresholdSec), self.expectedNumSpikes) # expecting 102 spikes
 
+    def test_3_features(self):
+        logger.info('RUNNING')
+        thresholdPnt = self.ba.getStat('thresholdPnt')
+        peakPnt = self.ba.getStat('peakPnt')
+        preSpike_dvdt_max_pnt = self.ba.getStat('preSpike_dvdt_max_pnt')
+
+        # features are computed in a batch, check they are ordered within each spike
+        for idx in range(self.expectedNumSpikes):
+            self.assertLessEqual(thresholdPnt[idx], preSpike_dvdt_max_pnt[idx])
+            self.assertLessEqual(preSpike_dvdt_max_pnt[idx], peakPnt[idx])
+
+    def test_4_parallel_sweeps(self):
+        logger.info('RUNNING')
+        ba = sanpy.bAnalysis('data/2021_07_20_0010.abf')  # 18 sweeps
+        dDict = sanpy.bDetection().getDetectionDict('SA Node')
+
+        ba.spikeDetect(dDict)
+        dfSerial = ba.asDataFrame().drop('analysisTime', axis=1)
+
+        # sweeps detected concurrently are merged back in sweep order
+        ba.spikeDetect(dDict, numWorkers=4)
+        dfParallel = ba.asDataFrame().drop('analysisTime', axis=1)
+
+        self.assertTrue(dfParallel.equals(dfSerial))
+        self.assertEqual(list(ba.getStat('spikeNumber')), list(range(ba.numSpikes)))
+
+    def test_5_incremental(self):
+        logger.info('RUNNING')
+        ba = sanpy.bAnalysis(self.path)
+        dDict = sanpy.bDetection().getDetectionDict('SA Node')
+        ba.spikeDetect(dDict)
+
+        # only half-widths depend on halfHeights, spikes are not detected again
+        dDict = sanpy.bDetection().getDetectionDict('SA Node')
+        dDict['halfHeights'] = [20, 50]
+        ba.spikeDetect(dDict, incremental=True)
+        dfIncremental = ba.asDataFrame().drop(['analysisTime', 'widths'], axis=1)
+
+        ba.spikeDetect(dDict)
+        dfFull = ba.asDataFrame().drop(['analysisTime', 'widths'], axis=1)
+
+        self.assertTrue(dfIncremental.equals(dfFull))
+
+    def test_6_chunked(self):
+        logger.info('RUNNING')
+        ba = sanpy.bAnalysis(self.path)
+        dDict = sanpy.bDetection().getDetectionDict('SA Node')
+        ba.spikeDetect(dDict)
+        dfFull = ba.asDataFrame().drop(['analysisTime', 'widths'], axis=1)
+        dfErrorFull = ba.dfError
+
+        # spikes are stitched across block boundaries (isi, cycle length)
+        ba.spikeDetect(dDict, chunkSeconds=0.5)
+        dfChunked = ba.asDataFrame().drop(['analysisTime', 'widths'], axis=1)
+
+        self.assertTrue(dfChunked.equals(dfFull))
+        self.assertTrue(ba.dfError.equals(dfErrorFull))
+
+        # memory-mapped file, only one block (with its margins) is read at a time
+        from sanpy.fileloaders.fileLoader_abf import fileLoader_abf
+        fileLoader = fileLoader_abf(self.path, memoryMap=True)
+        readPnts = []
+        for mapped in (fileLoader._sweepX, fileLoader._sweepY):
+            def _getRows(sweep, start, stop, _getRows=mapped._getRows):
+                readPnts.append(stop - start)
+                return _getRows(sweep, start, stop)
+            mapped._getRows = _getRows
+
+        baMapped = sanpy.bAnalysis(fileLoader=fileLoader)
+        baMapped.spikeDetect(dDict, chunkSeconds=0.5)
+        dfMapped = baMapped.asDataFrame().drop(['analysisTime', 'widths'], axis=1)
+        self.assertTrue(dfMapped.equals(dfFull))
+
+        chunkPnts = round(0.5 * 1000 * fileLoader.dataPointsPerMs)
+        prePnts, postPnts = sanpy.detectionBlocks.getBlockMargins(dDict, fileLoader.dataPointsPerMs)
+        self.assertLessEqual(max(readPnts), prePnts + chunkPnts + postPnts)
+        self.assertNotIn(('sweepY', 0), fileLoader._filterCache)
+
+    def test_7_stream(self):
+        logger.info('RUNNING')
+        import numpy as np
+
+        ba = sanpy.bAnalysis(self.path)
+        dDict = sanpy.bDetection().getDetectionDict('SA Node')
+        ba.spikeDetect(dDict)
+
+        # push the recording in blocks of random size
+        sampleRate = ba.fileLoader.dataPointsPerMs * 1000
+        stream = sanpy.spikeStream(dDict, sampleRate)
+        sweepY = ba.fileLoader.getSweepY(0)
+        blockSizes = np.random.default_rng(0).integers(1, 5000, size=len(sweepY))
+        blockStops = np.cumsum(blockSizes)
+        blockStops = blockStops[blockStops < len(sweepY)]
+        spikes = []
+        for block in np.split(sweepY, blockStops):
+            spikes += stream.push(block)
+        spikes += stream.flush()
+
+        self.assertEqual(len(spikes), ba.numSpikes)
+        for key in ['thresholdPnt', 'peakPnt', 'isi_ms', 'cycleLength_ms', 'widths_50', 'earlyDiastolicDurationRate']:
+            offline = ba.getStat(key)
+            streamed = [spike[key] for spike in spikes]
+            np.testing.assert_allclose(streamed, offline, equal_nan=True)
+
+    def test_8_saveRecording(self):
+        logger.info('RUNNING')
+        # saving also exports csv next to the file
+        tmpFolder = tempfile.mkdtemp()
+        try:
+            path = shutil.copy(self.path, tmpFolder)
+            ba = sanpy.bAnalysis(path)
+            dDict = sanpy.bDetection().getDetectionDict('SA Node')
+            ba.spikeDetect(dDict)
+
+            hdfPath = os.path.join(tmpFolder, 'sanpy_recording_db.h5')
+            self.assertTrue(ba._saveHdf_pytables(hdfPath))
+
+            baLoaded = sanpy.bAnalysis(path)
+            baLoaded._loadHdf_pytables(hdfPath, ba.uuid)
+            self.assertEqual(baLoaded.getDetectionDict(), ba.getDetectionDict())
+            self.assertEqual(baLoaded.numSpikes, ba.numSpikes)
+            for key in ['thresholdPnt', 'thresholdSec', 'include', 'detectionType']:
+                self.assertEqual(baLoaded.getStat(key), ba.getStat(key))
+            # ragged lists are stored as their own table
+            self.assertEqual(baLoaded.spikeDict[1]['errors'], ba.spikeDict[1]['errors'])
+            self.assertEqual(baLoaded.spikeDict[1]['widths'], ba.spikeDict[1]['widths'])
+
+            # only the requested columns are read
+            _, _, df = sanpy.h5Util.loadRecording(hdfPath, ba.uuid, columns=['peakVal'])
+            self.assertEqual(list(df.columns), ['peakVal'])
+            self.assertEqual(len(df), ba.numSpikes)
+
+            self.assertTrue(sanpy.h5Util.removeRecording(hdfPath, ba.uuid))
+            self.assertIsNone(sanpy.h5Util.loadRecording(hdfPath, ba.uuid))
+        finally:
+            shutil.rmtree(tmpFolder)
+
+    def test_9_compactHdf(self):
+        logger.info('RUNNING')
+        tmpFolder = tempfile.mkdtemp()
+        try:
+            path = shutil.copy(self.path, tmpFolder)
+            ba = sanpy.bAnalysis(path)
+            ba.spikeDetect(sanpy.bDetection().getDetectionDict('SA Node'))
+
+            hdfPath = os.path.join(tmpFolder, 'sanpy_recording_db.h5')
+            sanpy.h5Util.saveRecording(hdfPath, ba.uuid, ba.getDetectionDict(), ba.metaData, ba.spikeDict)
+            self.assertEqual(sanpy.h5Util.getFragmentation(hdfPath), 0)
+
+            # replacing a recording leaves its old space unused until compacted
+            sanpy.h5Util.saveRecording(hdfPath, ba.uuid, ba.getDetectionDict(), ba.metaData, ba.spikeDict)
+            fileBytes = os.path.getsize(hdfPath)
+            self.assertGreater(sanpy.h5Util.getFragmentation(hdfPath), 0.3)
+
+            self.assertTrue(sanpy.h5Util.compactHdf(hdfPath))
+            self.assertEqual(sanpy.h5Util.getFragmentation(hdfPath), 0)
+            self.assertLess(os.path.getsize(hdfPath), fileBytes)
+            _, _, df = sanpy.h5Util.loadRecording(hdfPath, ba.uuid)
+            self.assertEqual(len(df), ba.numSpikes)
+        finally:
+            shutil.rmtree(tmpFolder)
+
+    def test_10_analysisHandle(self):
+        logger.info('RUNNING')
+        import numpy as np
+
+        tmpFolder = tempfile.mkdtemp()
+        try:
+            path = shutil.copy(self.path, tmpFolder)
+            ba = sanpy.bAnalysis(path)
+            ba.spikeDetect(sanpy.bDetection().getDetectionDict('SA Node'))
+            hdfPath = os.path.join(tmpFolder, 'sanpy_recording_db.h5')
+            ba._saveHdf_pytables(hdfPath)
+
+            # analysis without raw data
+            baHandle = sanpy.bAnalysis(path, loadData=False)
+            baHandle._loadHdf_pytables(hdfPath, ba.uuid)
+            self.assertEqual(baHandle.numSpikes, ba.numSpikes)
+            self.assertEqual(len(baHandle.asDataFrame()), ba.numSpikes)
+            self.assertFalse(baHandle.fileLoader.isRawDataLoaded())
+
+            # raw data is loaded when it is used
+            self.assertTrue(np.array_equal(baHandle.fileLoader.getFilteredDeriv(0), ba.fileLoader.getFilteredDeriv(0)))
+            self.assertTrue(baHandle.fileLoader.isRawDataLoaded())
+        finally:
+            shutil.rmtree(tmpFolder)
+
+    def test_11_summarizeSpikes(self):
+        logger.info('RUNNING')
+        import numpy as np
+
+        ba = sanpy.bAnalysis('data/2021_07_20_0010.abf')
+        ba.spikeDetect(sanpy.bDetection().getDetectionDict('Fast Neuron'))
+        df = ba.asDataFrame()
+
+        # one row per (file, sweep, epoch)
+        dfSummary = sanpy.summarizeSpikes(df, ['peakVal', 'spikeFreq_hz'], skipFirst=['spikeFreq_hz'])
+        grouped = df.groupby(['file', 'sweep', 'epoch'])
+        self.assertEqual(len(dfSummary), grouped.ngroups)
+        np.testing.assert_allclose(dfSummary['peakVal_mean'], grouped['peakVal'].mean())
+        np.testing.assert_allclose(dfSummary['peakVal_sem'], grouped['peakVal'].sem(), equal_nan=True)
+        np.testing.assert_allclose(dfSummary['peakVal_last'], grouped['peakVal'].nth(-1))
+
+        # interval stats do not include the first spike in each group
+        spikeFreq = grouped['spikeFreq_hz'].apply(lambda x: x.iloc[1:].mean())
+        np.testing.assert_allclose(dfSummary['spikeFreq_hz_mean'], spikeFreq, equal_nan=True)
+        self.assertEqual(list(dfSummary['spikeFreq_hz_count']), list(grouped.size() - 1))
+
+    def test_12_asDataFrame_writable(self):
+        logger.info('RUNNING')
+        ba = sanpy.bAnalysis(self.path)
+        ba.spikeDetect(sanpy.bDetection().getDetectionDict('SA Node'))
+        thresholdSec = ba.getStat('thresholdSec')[0]
+
+        # the DataFrame is a copy, editing it does not change the analysis
+        df = ba.asDataFrame()
+        df.loc[0, 'thresholdSec'] = thresholdSec + 1
+        self.assertEqual(ba.getStat('thresholdSec')[0], thresholdSec)
+
+        ba.spikeDict.fillColumn('userType', 2)
+        self.assertEqual(ba.getStat('userType'), [2] * ba.numSpikes)
+
+    def test_13_pickle(self):
+        logger.info('RUNNING')
+        import pickle
+
+        # process pools on spawn platforms (macOS, Windows) pickle the bAnalysis
+        ba = sanpy.bAnalysis(self.path)
+        baCopy = pickle.loads(pickle.dumps(ba))
+        self.assertTrue(baCopy.fileLoader.isRawDataLoaded())
+
+        dDict = sanpy.bDetection().getDetectionDict('SA Node')
+        baCopy.spikeDetect(dDict)
+        self.assertEqual(baCopy.numSpikes, self.expectedNumSpikes)
+
+        # raw data that is not loaded yet is loaded after unpickling
+        baHandle = pickle.loads(pickle.dumps(sanpy.bAnalysis(self.path, loadData=False)))
+        self.assertEqual(len(baHandle.fileLoader.getSweepY(0)), len(ba.fileLoader.getSweepY(0)))
+
 if __name__ == '__main__':
     unittest.main()
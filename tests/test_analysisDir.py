@@ -1,4 +1,4 @@
-import os
+import os, shutil
 
 import sanpy
 from sanpy.sanpyLogger import get_logger
@@ -24,6 +24,104 @@ def test_file():
 
 	assert ad is not None
 	
+def _copyData(tmp_path):
+	"""Copy abf files in data/ to the pytest temporary folder."""
+	tmpPath = str(tmp_path)
+	for file in os.listdir('data'):
+		if file.endswith('.abf'):
+			shutil.copy(os.path.join('data', file), tmpPath)
+	return tmpPath
+
+def test_dir_parallel(tmp_path):
+	path = _copyData(tmp_path)
+	fileLoaderDict = sanpy.fileloaders.getFileLoaders()
+
+	progress = []
+	def progressCallback(numLoaded, numFiles, path, rowDict):
+		progress.append((numLoaded, numFiles, os.path.split(path)[1]))
+
+	# rows come back in file order
+	ad = sanpy.analysisDir(path=path, fileLoaderDict=fileLoaderDict, folderDepth=1,
+						numWorkers=4, progressCallback=progressCallback, useFolderIndex=False)
+	fileList = ad.getFileList()
+	assert [p[0] for p in progress] == list(range(1, len(fileList)+1))
+	assert [p[2] for p in progress] == [os.path.split(f)[1] for f in fileList]
+
+	adSerial = sanpy.analysisDir(path=path, fileLoaderDict=fileLoaderDict, folderDepth=1,
+						useFolderIndex=False)
+	assert ad.getDataFrame().equals(adSerial.getDataFrame())
+
+
+def test_dir_index(tmp_path):
+	path = _copyData(tmp_path)
+	fileLoaderDict = sanpy.fileloaders.getFileLoaders()
+
+	ad = sanpy.analysisDir(path=path, fileLoaderDict=fileLoaderDict, folderDepth=1,
+						useFolderIndex=True)
+	assert os.path.isfile(os.path.join(path, sanpy.folderIndex.indexFolder, sanpy.folderIndex.indexFile))
+
+	# reopen, rows are from the index
+	adIndexed = sanpy.analysisDir(path=path, fileLoaderDict=fileLoaderDict, folderDepth=1,
+						useFolderIndex=True)
+	assert adIndexed.getDataFrame().equals(ad.getDataFrame())
+
+	# deleted files are removed from the index
+	os.remove(os.path.join(path, '19114000.abf'))
+	adIndexed.syncDfWithPath()
+	assert '19114000.abf' not in adIndexed._folderIndex.getRelPaths()
+
+
+def test_pool(tmp_path):
+	path = _copyData(tmp_path)
+	fileLoaderDict = sanpy.fileloaders.getFileLoaders()
+	ad = sanpy.analysisDir(path=path, fileLoaderDict=fileLoaderDict, folderDepth=1,
+						useFolderIndex=False)
+	dDict = sanpy.bDetection().getDetectionDict('SA Node')
+	for rowIdx, filePath in enumerate(ad.getFileList()):
+		ba = ad.loadOneAnalysis(filePath)
+		ba.spikeDetect(dDict)
+		ad._df.at[rowIdx, '_ba'] = ba
+
+	masterDf = ad.pool_build()
+	assert masterDf['index'].tolist() == list(range(len(masterDf)))
+
+	# files loaded concurrently are pooled in file order
+	assert ad.pool_build(numWorkers=4).equals(masterDf)
+	fileNumbers = [rowIdx for rowIdx, oneDf in ad.pool_iter(numWorkers=4)]
+	assert fileNumbers == sorted(set(masterDf['File Number']))
+
+
+def test_pool_file(tmp_path):
+	path = _copyData(tmp_path)
+	fileLoaderDict = sanpy.fileloaders.getFileLoaders()
+	ad = sanpy.analysisDir(path=path, fileLoaderDict=fileLoaderDict, folderDepth=1,
+						useFolderIndex=False)
+	dDict = sanpy.bDetection().getDetectionDict('SA Node')
+	hdfPath = ad._getHdfFile()
+	for rowIdx, filePath in enumerate(ad.getFileList()):
+		ba = ad.loadOneAnalysis(filePath)
+		ba.spikeDetect(dDict)
+		ba._saveHdf_pytables(hdfPath)
+		ad._df.at[rowIdx, '_ba'] = ba
+		ad._df.at[rowIdx, 'uuid'] = ba.uuid
+
+	# saved analysis is pooled from the pool file, same as from each bAnalysis
+	# (widths are lists of dict with nan)
+	masterDf = ad.pool_build(usePoolFile=False).drop('widths', axis=1)
+	assert ad.pool_build().drop('widths', axis=1).equals(masterDf)
+	poolStamps = sanpy.h5Util.getAnalysisStamps(ad._getPoolFile())
+	assert poolStamps == sanpy.h5Util.getAnalysisStamps(hdfPath)
+
+	# only recordings saved again are extracted again
+	ba = ad._df.at[0, '_ba']
+	ba.spikeDetect(dDict)
+	assert ba.uuid not in ad.pool_refresh()
+	ba._saveHdf_pytables(hdfPath)
+	ad.pool_refresh()
+	newStamps = sanpy.h5Util.getAnalysisStamps(ad._getPoolFile())
+	assert [uuid for uuid in poolStamps if newStamps[uuid] != poolStamps[uuid]] == [ba.uuid]
+
+
 if __name__ == '__main__':
 	test_dir()
 	test_file()
@@ -0,0 +1,44 @@
+import os
+import shutil
+
+import pandas as pd
+
+import sanpy
+from sanpy.batch import runBatch
+
+import logging
+from sanpy.sanpyLogger import get_logger
+logger = get_logger(__name__, level=logging.DEBUG)
+
+def test_batch(tmp_path):
+    folder = str(tmp_path)
+    for file in ['19114001.abf', '2021_07_20_0010.abf']:
+        shutil.copy(os.path.join('data', file), folder)
+
+    results = runBatch(folder, 'SA Node', fileGlob='1911*', numWorkers=2)
+    assert results['analyzed'] == 1
+    assert results['failed'] == []
+    assert os.path.isfile(os.path.join(folder, 'sanpy_analysis', '19114001-summary.csv'))
+    dfPool = pd.read_csv(results['poolPath'])
+    assert len(dfPool) == results['numSpikes']
+
+    # saved to the folder database, opens like any saved analysis
+    ad = sanpy.analysisDir(folder, fileLoaderDict=sanpy.fileloaders.getFileLoaders())
+    rowIdx = ad.getDataFrame()['File'].tolist().index('19114001.abf')
+    ba = ad.loadOneAnalysis(os.path.join(folder, '19114001.abf'), ad.getDataFrame().at[rowIdx, 'uuid'])
+    assert ba.numSpikes == results['numSpikes']
+
+    # resume skips what is already analyzed with the same detection
+    results = runBatch(folder, 'SA Node', numWorkers=1)
+    assert results['skipped'] == 1
+    assert results['analyzed'] == 1
+
+def test_batch_workers(tmp_path):
+    import pytest
+    from sanpy.batch import main
+
+    # not a worker count, argparse exits with usage error 2
+    with pytest.raises(SystemExit) as e:
+        main([str(tmp_path), '--detection', 'SA Node', '--workers', '0'])
+    assert e.value.code == 2
+    assert runBatch(str(tmp_path), 'SA Node', numWorkers=-1) is None
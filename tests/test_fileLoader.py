@@ -27,6 +27,24 @@ def test_fileLoader_tif():
     # import matplotlib.pyplot as plt
     # plt.show()
 
+def test_fileLoader_tif_memoryMap(tmp_path):
+    import numpy as np
+    import tifffile
+
+    # multi channel czi line scan (frames, channels, height, width)
+    path = str(tmp_path / 'kymograph.tif')
+    image = np.random.default_rng(0).integers(0, 4000, size=(2000, 2, 1, 40), dtype=np.uint16)
+    tifffile.imwrite(path, image)
+
+    tifFile = fileLoader_tif(path)
+    mappedFile = fileLoader_tif(path, memoryMap=True)
+    assert isinstance(mappedFile.tifData, np.memmap)
+    assert np.array_equal(mappedFile.tifData, tifFile.tifData)
+
+    # line scans are summed in blocks
+    mappedFile.sumChunkBytes = 1000
+    assert np.array_equal(mappedFile._sumLines(mappedFile.tifData), np.sum(tifFile.tifData, axis=0))
+
 def _old_test_fileLoader_csv():
     # path = 'data/19114001.csv'
     # path = 'data/2021_07_20_0010.csv'
@@ -105,7 +123,118 @@ def test_fileLoader_abf():
         print('csvPath:', csvPath)
         df.to_csv(csvPath, index=False)
 
-    
+
+def test_fileLoader_filterCache():
+    path = os.path.join('data', '2021_07_20_0010.abf')
+    abfFile = fileLoader_abf(path)
+
+    abfFile._getDerivative()
+    _filteredDeriv = abfFile.getFilteredDeriv(1)
+
+    # same filter params, served from the cache
+    abfFile._getDerivative()
+    assert abfFile.getFilteredDeriv(1) is _filteredDeriv
+
+    # new filter params
+    abfFile._getDerivative(medianFilter=3)
+    assert abfFile.getFilteredDeriv(1) is not _filteredDeriv
+
+    # budget of one sweep evicts the least recently used
+    abfFile.setFilterCacheBudget(2 * _filteredDeriv.nbytes)
+    abfFile.getFilteredDeriv(2)
+    assert len(abfFile._filterCache) == 1
+
+    abfFile.invalidateFilterCache()
+    assert len(abfFile._filterCache) == 0
+
+def test_fileLoader_memoryMap():
+    import numpy as np
+
+    path = os.path.join('data', '2021_07_20_0010.abf')
+    abfFile = fileLoader_abf(path)
+    mappedFile = fileLoader_abf(path, memoryMap=True)
+
+    assert mappedFile.numSweeps == abfFile.numSweeps
+    assert np.array_equal(mappedFile.sweepX, abfFile.sweepX)
+    for _sweep in abfFile.sweepList:
+        assert np.array_equal(mappedFile.getSweepY(_sweep), abfFile.getSweepY(_sweep))
+        assert np.array_equal(mappedFile.getSweepC(_sweep), abfFile.getSweepC(_sweep))
+
+    # only the rows asked for are scaled
+    assert np.array_equal(mappedFile._sweepY[100:200, 3:5], abfFile._sweepY[100:200, 3:5])
+    assert not mappedFile.getSweepY(0).flags.writeable
+
+    # sweepC of a sweep is built once, rows are views of it
+    assert mappedFile._sweepC[100:200, 3].base is mappedFile.getSweepC(3).base
+
+def test_fileLoader_header():
+    path = os.path.join('data', '2021_07_20_0010.abf')
+
+    # header only does not load raw data
+    headerFile = fileLoader_abf(path, loadData=False)
+    assert headerFile._sweepY is None
+
+    header = fileLoader_abf.readHeader(path)
+    assert header == fileLoader_abf(path).getHeader()
+    assert header['Sweeps'] == 18
+    assert header['Epochs'] is not None
+
+def test_getFileLoaders_cached():
+    fileLoaderDict = sanpy.fileloaders.getFileLoaders()
+    assert fileLoaderDict['.abf']['constructor'] is fileLoader_abf
+
+    # found once per process, callers get a copy
+    fileLoaderDict.pop('.abf')
+    fileLoaderDict2 = sanpy.fileloaders.getFileLoaders()
+    assert '.abf' in fileLoaderDict2
+    assert fileLoaderDict2['.atf'] is sanpy.fileloaders.getFileLoaders()['.atf']
+
+def test_fileLoader_sidecar(tmp_path):
+    import shutil
+    import numpy as np
+    from sanpy.fileloaders.fileLoader_csv import fileLoader_text
+
+    path = str(tmp_path / '2021_07_20_0010.sanpy')
+    shutil.copy(os.path.join('data', '2021_07_20_0010.sanpy'), path)
+    textFile = fileLoader_text(path)
+
+    fileLoader_text.useSidecarCache = True
+    try:
+        fileLoader_text(path)  # writes the sidecar
+        cachedFile = fileLoader_text(path)
+        assert isinstance(cachedFile._sweepY, np.memmap)
+        assert np.array_equal(cachedFile._sweepY, textFile._sweepY)
+        assert cachedFile.getHeader() == textFile.getHeader()
+
+        # file changed, parse it again
+        os.utime(path, (0, 0))
+        assert not isinstance(fileLoader_text(path)._sweepY, np.memmap)
+    finally:
+        fileLoader_text.useSidecarCache = False
+
+def test_fileLoader_atf_sidecar(tmp_path):
+    import numpy as np
+    from sanpy.fileloaders.fileLoader_atf import fileLoader_atf
+
+    # small atf with 2 sweeps, 10 points per ms
+    path = str(tmp_path / 'sweeps.atf')
+    lines = ['ATF\t1.0', '1\t3', '"Signals="\t"IN 0"', '"Time (s)"\t"Trace #1 (mV)"\t"Trace #2 (mV)"']
+    for i in range(2000):
+        lines.append(f'{i/10000:.4f}\t{np.sin(i/50):.3f}\t{np.cos(i/50):.3f}')
+    with open(path, 'w') as f:
+        f.write('\n'.join(lines) + '\n')
+
+    fileLoader_atf.useSidecarCache = True
+    try:
+        atfFile = fileLoader_atf(path)  # writes the sidecar
+        cachedFile = fileLoader_atf(path)
+        assert isinstance(cachedFile._sweepY, np.memmap)
+        assert cachedFile.myFileType == atfFile.myFileType == 'atf'
+        assert cachedFile.numSweeps == 2
+        assert cachedFile.dataPointsPerMs == 10
+    finally:
+        fileLoader_atf.useSidecarCache = False
+
 def test_new_b_analysis():
     # test new version of bAnalysis using fileLoader
     # path = 'data/19114001.abf'
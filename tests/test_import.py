@@ -0,0 +1,49 @@
+import subprocess
+import sys
+
+import sanpy
+
+import logging
+from sanpy.sanpyLogger import get_logger
+logger = get_logger(__name__, level=logging.DEBUG)
+
+# loaded on first use, see _lazySubmodules in sanpy/__init__.py
+heavyModules = ['matplotlib', 'seaborn', 'requests', 'skimage', 'tifffile']
+
+def _coldImport(code : str) -> str:
+    """Run code in a new interpreter (nothing imported yet) and return its stdout."""
+    result = subprocess.run([sys.executable, '-c', code],
+                            capture_output=True, text=True, check=True)
+    return result.stdout
+
+def _coldImportSeconds(importStatement : str, numRuns : int = 3) -> float:
+    """Fastest of numRuns cold imports, in seconds."""
+    code = ('import time\n'
+            't = time.perf_counter()\n'
+            f'{importStatement}\n'
+            'print(time.perf_counter() - t)\n')
+    return min(float(_coldImport(code)) for _ in range(numRuns))
+
+def test_import_lazy():
+    code = ('import sys, sanpy\n'
+            f'print(",".join(m for m in {heavyModules!r} if m in sys.modules))\n')
+    assert _coldImport(code).strip() == ''
+
+    # regression check on cold-start time, against importing the lazy submodules up front
+    importSeconds = _coldImportSeconds('import sanpy')
+    eagerSeconds = _coldImportSeconds(
+        'import sanpy, ' + ', '.join('sanpy.' + m for m in sanpy._lazySubmodules))
+    logger.info(f'cold import sanpy took {importSeconds:.3f} s, {eagerSeconds:.3f} s with all submodules')
+
+    assert importSeconds < 0.9 * eagerSeconds
+
+def test_import_lazy_attributes():
+    # lazy attributes are the same objects as before
+    from sanpy.analysisDir import analysisDir
+    assert sanpy.analysisDir is analysisDir
+    assert 'bExport' in dir(sanpy)
+
+    code = ('import sys, sanpy\n'
+            'sanpy.bAnalysisPlot\n'
+            'print("matplotlib" in sys.modules)\n')
+    assert _coldImport(code).strip() == 'True'